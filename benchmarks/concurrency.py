@@ -0,0 +1,106 @@
+"""
+    Read throughput of the async pool as it grows.
+
+    Fills a scratch database with tasks and their logs, then has --clients
+    concurrent asyncio clients request status history windows of random
+    tasks through AsyncDatabase, with read pools of each --readers size.
+    A writer keeps logging status changes throughout, as a live server
+    would. Window queries spend their time in sqlite, which releases the
+    GIL, so throughput should follow the pool size up to the number of
+    cores. Exits 1 when the largest pool is not --min-speedup times as
+    fast as a pool of one.
+
+        python benchmarks/concurrency.py [--readers 1 2 4 8] [--clients 64]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
+
+from async_utils import AsyncDatabase  # noqa: E402
+from connection_utils import connect  # noqa: E402
+from database_utils import TaskManager  # noqa: E402
+from synthetic import STATUSES, mail, populate, scale  # noqa: E402
+
+AUTHOR = mail(0)
+
+
+async def run(path, readers, clients, duration, project_id, task_ids):
+    now = time.time()
+    async with AsyncDatabase(path, readers=readers) as db:
+        tasks = db.manager(TaskManager, AUTHOR, project_id)
+        # open every reader before timing
+        await asyncio.gather(*(tasks.fetch_task(task_ids[0]) for _ in range(readers * 2)))
+
+        stop = time.perf_counter() + duration
+        served = [0]
+        writes = [0]
+
+        async def client(seed):
+            rng = random.Random(seed)
+            while time.perf_counter() < stop:
+                start = now - rng.uniform(30, 365) * 86400
+                await tasks.task_history(rng.choice(task_ids), start, start + 30 * 86400)
+                served[0] += 1
+
+        async def writer():
+            rng = random.Random(-1)
+            while time.perf_counter() < stop:
+                await tasks.create_task_log(rng.choice(task_ids), rng.choice(STATUSES), "bench")
+                writes[0] += 1
+                await asyncio.sleep(0.01)
+
+        start = time.perf_counter()
+        await asyncio.gather(writer(), *(client(i) for i in range(clients)))
+        elapsed = time.perf_counter() - start
+    return served[0] / elapsed, writes[0] / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--readers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--logs", type=int, default=200000)
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--min-speedup", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "corem.db")
+        populate(
+            path,
+            scale(
+                accounts=1, projects=1, tasks=args.tasks, logs=args.logs // args.tasks, contacts=0
+            ),
+        )
+        connection = connect(path)
+        project_id, = connection.execute("SELECT id FROM PROJECTS;").fetchone()
+        task_ids = [row[0] for row in connection.execute("SELECT id FROM TASKS ORDER BY id;")]
+        connection.close()
+        print(
+            "{} clients, {:,} logs over {} tasks, {} cores".format(
+                args.clients, args.logs, args.tasks, os.cpu_count()
+            )
+        )
+        results = []
+        for readers in args.readers:
+            reads, writes = asyncio.run(
+                run(path, readers, args.clients, args.duration, project_id, task_ids)
+            )
+            results.append(reads)
+            print(
+                "{:>3} readers {:>9.0f} reads/s {:>6.0f} writes/s  {:>5.2f}x".format(
+                    readers, reads, writes, reads / results[0]
+                )
+            )
+    return 0 if results[-1] / results[0] >= args.min_speedup else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+    Load test of the HTTP/JSON API on localhost.
+
+    Starts `corem serve` on a scratch database (or targets --port of a
+    running server with --mail & --password), logs in, then has --clients
+    threads on keep-alive connections request project, task, task log and
+    listing URLs for --duration seconds, twice: plain requests, then
+    conditional ones sending back the ETags seen, which the server answers
+    304 from memory while nothing changes.
+
+        python benchmarks/load.py [--clients 16] [--duration 5]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src")
+sys.path.insert(0, SRC)
+
+from connection_utils import connect  # noqa: E402
+from synthetic import PASSWORD, mail, populate, scale  # noqa: E402
+
+MAIL = mail(0)
+
+
+def resource_urls(path):
+    """
+        Urls of every project, task & task log of a database
+    """
+    connection = connect(path)
+    urls = ["/projects?limit=50"]
+    for project_id, task_id in connection.execute("SELECT project_id, id FROM TASKS;"):
+        urls.append("/projects/{}/tasks/{}".format(project_id, task_id))
+        urls.append("/projects/{}/tasks/{}/logs".format(project_id, task_id))
+    for (project_id,) in connection.execute("SELECT id FROM PROJECTS;"):
+        urls += [
+            "/projects/{}".format(project_id),
+            "/projects/{}/summary".format(project_id),
+            "/projects/{}/tasks?limit=100".format(project_id),
+        ]
+    connection.close()
+    return urls
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def request(connection, method, url, body=None, headers=None):
+    connection.request(method, url, body, headers or {})
+    response = connection.getresponse()
+    return response.status, response.getheader("ETag"), response.read()
+
+
+def login(port, mail, password, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port)
+            status, _, body = request(
+                connection, "POST", "/session", json.dumps({"mail": mail, "password": password})
+            )
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+    if status != 200:
+        raise SystemExit("login failed: {} {}".format(status, body.decode()))
+    session = json.loads(body)
+    return {"X-Session-Id": session["session-id"], "X-Session-Key": session["session-key"]}
+
+
+def run(port, headers, urls, clients, duration, conditional):
+    etags = {}
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def client(seed):
+        rng = random.Random(seed)
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        seen, local = {}, {}
+        while time.perf_counter() < stop:
+            url = rng.choice(urls)
+            request_headers = dict(headers)
+            if conditional and url in etags:
+                request_headers["If-None-Match"] = etags[url]
+            start = time.perf_counter()
+            status, etag, _ = request(connection, "GET", url, headers=request_headers)
+            seen.setdefault(status, []).append(time.perf_counter() - start)
+            if etag:
+                local[url] = etag
+        connection.close()
+        with lock:
+            for status, times in seen.items():
+                statuses[status] = statuses.get(status, 0) + len(times)
+                latencies.extend(times)
+            etags.update(local)
+
+    if conditional:
+        # ETags as a client would have them from earlier visits
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        for url in urls:
+            etags[url] = request(connection, "GET", url, headers=headers)[1]
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    stop = start + duration
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return (
+        len(latencies) / elapsed,
+        latencies[len(latencies) // 2],
+        latencies[int(len(latencies) * 0.99)],
+        statuses,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, help="port of a running server")
+    parser.add_argument("--mail", default=MAIL)
+    parser.add_argument("--password", default=PASSWORD)
+    parser.add_argument("--urls", nargs="+", help="paths to request on a running server")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--connections", type=int, default=4, help="server read connections")
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--logs", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        server = None
+        port = args.port
+        urls = args.urls or ["/projects"]
+        if port is None:
+            path = os.path.join(scratch, "corem.db")
+            populate(
+                path,
+                scale(
+                    accounts=1,
+                    projects=args.projects,
+                    tasks=args.tasks,
+                    logs=args.logs,
+                    contacts=0,
+                ),
+            )
+            urls = resource_urls(path)
+            port = free_port()
+            server = subprocess.Popen(
+                [
+                    sys.executable,
+                    os.path.join(SRC, "cli.py"),
+                    "--db",
+                    path,
+                    "serve",
+                    "--port",
+                    str(port),
+                    "--connections",
+                    str(args.connections),
+                ],
+                stderr=subprocess.DEVNULL,
+            )
+        try:
+            headers = login(port, args.mail, args.password)
+            print("{} clients, {} urls on port {}".format(args.clients, len(urls), port))
+            for label, conditional in (("plain", False), ("conditional", True)):
+                rate, p50, p99, statuses = run(
+                    port, headers, urls, args.clients, args.duration, conditional
+                )
+                print(
+                    "{:<12} {:>8.0f} req/s  p50 {:>6.2f} ms  p99 {:>6.2f} ms  {}".format(
+                        label,
+                        rate,
+                        p50 * 1000,
+                        p99 * 1000,
+                        ", ".join("{} x{}".format(s, n) for s, n in sorted(statuses.items())),
+                    )
+                )
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
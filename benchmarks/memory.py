@@ -0,0 +1,94 @@
+"""
+    Memory of loading every task log for analysis.
+
+    Fills a scratch database with --rows task logs by 20 accounts over
+    --tasks tasks of one project, then loads them as regular dict-backed
+    dataclasses (the old representation), as slotted TaskLogStructures
+    through the row factory, and as columns through read_columns,
+    measuring each with tracemalloc. Exits 1 when columns
+    do not save at least --min-ratio over the old representation.
+    Load times include tracemalloc's overhead.
+
+        python benchmarks/memory.py [--rows 500000] [--min-ratio 3]
+"""
+import argparse
+import dataclasses
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
+
+from connection_utils import connect  # noqa: E402
+from column_utils import read_columns  # noqa: E402
+from database_utils import TaskLogStructure, read_structures  # noqa: E402
+from migrations import ensure_schema  # noqa: E402
+from synthetic import populate, scale  # noqa: E402
+
+# TaskLogStructure as it was before slots
+DictTaskLog = dataclasses.make_dataclass(
+    "DictTaskLog", [(f.name, f.type) for f in dataclasses.fields(TaskLogStructure)]
+)
+
+
+def measure(label, load):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return label, elapsed, retained, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--min-ratio", type=float, default=3.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "corem.db")
+        populate(
+            path,
+            scale(
+                accounts=20, projects=1, tasks=args.tasks, logs=args.rows // args.tasks, contacts=0
+            ),
+        )
+        connection = connect(path, profile="bulk-load")
+        ensure_schema(connection)
+        rows = connection.execute("SELECT count(*) FROM TASKLOGS;").fetchone()[0]
+        sql = "SELECT id, status, status_info, task_id, created_by, ts FROM TASKLOGS ORDER BY id;"
+
+        results = [
+            measure(
+                "dict dataclasses",
+                lambda: [DictTaskLog(*row) for row in connection.execute(sql)],
+            ),
+            measure(
+                "slotted structures",
+                lambda: read_structures(connection, TaskLogStructure, sql).fetchall(),
+            ),
+            measure("columns", lambda: read_columns(connection, "TASKLOGS")),
+        ]
+        connection.close()
+
+    baseline = results[0][2]
+    print("{:,} task logs".format(rows))
+    for label, elapsed, retained, peak in results:
+        print(
+            "{:<20} {:>9.1f} MiB retained {:>9.1f} MiB peak {:>6.2f}s  {:>5.1f}x".format(
+                label, retained / 2**20, peak / 2**20, elapsed, baseline / retained
+            )
+        )
+    return 0 if baseline / results[-1][2] >= args.min_ratio else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""
+    Startup time of the corem CLI.
+
+    Runs `cli.py --help` and `cli.py project list` in fresh interpreters
+    against a scratch database and compares the median wall time with a
+    budget, exiting 1 when a command is over it.
+
+        python benchmarks/startup.py [--runs 15] [--help-budget 0.15] [--list-budget 0.25]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src", "cli.py")
+
+
+def measure(command, runs, env):
+    """
+        Median wall time of running command runs times
+    """
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--help-budget", type=float, default=0.15)
+    parser.add_argument("--list-budget", type=float, default=0.25)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        env = dict(os.environ, COREM_DB=os.path.join(scratch, "corem.db"))
+        # migrate once so the listing measures a warm schema
+        subprocess.run([sys.executable, CLI, "migrate"], env=env, check=True, stdout=subprocess.DEVNULL)
+
+        interpreter = measure([sys.executable, "-c", "pass"], args.runs, env)
+        results = [
+            ("--help", measure([sys.executable, CLI, "--help"], args.runs, env), args.help_budget),
+            (
+                "project list",
+                measure([sys.executable, CLI, "project", "list"], args.runs, env),
+                args.list_budget,
+            ),
+        ]
+
+    print("python -c pass    {:.3f}s".format(interpreter))
+    over = False
+    for name, median, budget in results:
+        status = "ok" if median <= budget else "OVER BUDGET"
+        over = over or median > budget
+        print("{:<17} {:.3f}s  (budget {:.3f}s) {}".format(name, median, budget, status))
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""
+    Timings of every core manager operation on a synthetic database.
+
+    Generates a scratch crator.db of the given scale (see synthetic.py),
+    then times each operation through the managers, one call at a time,
+    the way the menus run them: listing projects, selecting a task, adding
+    a task and a task log, deleting a project, revoking an internal and
+    logging in.
+    Interactive menu methods are timed through the headless methods they
+    wrap, without the prompts. Results are printed and, with --out, saved
+    as JSON. --baseline compares the run with saved results, --compare
+    compares two saved results without running; either exits 1 when an
+    operation's median got slower by more than --threshold.
+
+        python benchmarks/suite.py [--projects 200 --tasks 50 ...] [--out run.json]
+        python benchmarks/suite.py --baseline base.json [--threshold 0.1]
+        python benchmarks/suite.py --compare base.json run.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
+
+from connection_utils import connect  # noqa: E402
+from database_utils import AccountManager, ProjectManager, TaskManager, Internals  # noqa: E402
+from migrations import ensure_schema  # noqa: E402
+from synthetic import PASSWORD, PRIORITIES, SCALE, STATUSES, populate  # noqa: E402
+
+RESULTS_FORMAT = 1
+
+
+class Workload:
+    """
+        Managers & ids the operations work on, opened like the menus open
+        them, with the interactive profile
+    """
+
+    def __init__(self, path, seed=7):
+        self.rng = random.Random(seed)
+        self.connection = connect(path)
+        ensure_schema(self.connection)
+        self.mails = [row[0] for row in self.connection.execute("SELECT mail FROM ACCOUNTS;")]
+        self.projects = [row[0] for row in self.connection.execute("SELECT id FROM PROJECTS;")]
+        self.task_ids = self.connection.execute("SELECT id, project_id FROM TASKS;").fetchall()
+        self.internals = [
+            row[0] for row in self.connection.execute("SELECT id FROM INTERNALS ORDER BY random();")
+        ]
+        self.author = self.mails[0]
+        self.project_manager = ProjectManager(self.connection, self.author)
+        self.task_managers = {}
+
+    def tasks(self, project_id):
+        manager = self.task_managers.get(project_id)
+        if manager is None:
+            manager = self.task_managers[project_id] = TaskManager(
+                self.connection, self.author, project_id
+            )
+        return manager
+
+    def project(self):
+        return self.rng.choice(self.projects)
+
+    def close(self):
+        self.connection.close()
+
+
+def list_projects(work):
+    # select_project shows the first page
+    next(work.project_manager.iter_projects(page_size=20))
+
+
+def select_task(work):
+    tasks = work.tasks(work.project())
+    page = next(tasks.iter_tasks(page_size=20))
+    tasks.fetch_task(work.rng.choice(page)["id"])
+
+
+def add_task(work):
+    work.tasks(work.project()).create_task(
+        work.rng.choice(PRIORITIES), "bench task", "", "01-01-2026", "31-12-2026", "open", "created"
+    )
+
+
+def add_task_log(work):
+    task_id, project_id = work.rng.choice(work.task_ids)
+    work.tasks(project_id).create_task_log(task_id, work.rng.choice(STATUSES), "bench")
+
+
+def revoke_internal(work):
+    project_id, = work.connection.execute(
+        "SELECT project_id FROM INTERNALS WHERE id = ?;", (work.internals[-1],)
+    ).fetchone()
+    Internals(project_id, work.author, work.connection).remove_internal(work.internals.pop())
+
+
+def delete_project(work):
+    work.project_manager.remove_project(work.projects.pop())
+
+
+def login(work):
+    if AccountManager(work.connection).authenticate(work.rng.choice(work.mails), PASSWORD) is None:
+        raise RuntimeError("login failed")
+
+
+# (name, operation, runs at most), destructive ones last
+OPERATIONS = [
+    ("list_projects", list_projects, None),
+    ("select_task", select_task, None),
+    ("add_task", add_task, None),
+    ("add_task_log", add_task_log, None),
+    ("revoke_internal", revoke_internal, None),
+    ("login", login, 20),
+    ("delete_project", delete_project, None),
+]
+
+
+def measure(work, operation, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        operation(work)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        "runs": runs,
+        "median_us": statistics.median(timings) * 1e6,
+        "p95_us": timings[min(runs - 1, int(runs * 0.95))] * 1e6,
+        "mean_us": statistics.fmean(timings) * 1e6,
+        "min_us": timings[0] * 1e6,
+    }
+
+
+def _revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scale, runs, only=None, seed=7):
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "crator.db")
+        started = time.perf_counter()
+        populate(path, scale, seed)
+        populated = time.perf_counter() - started
+
+        work = Workload(path, seed)
+        operations = {}
+        try:
+            for name, operation, most in OPERATIONS:
+                if only and name not in only:
+                    continue
+                limit = {
+                    "delete_project": len(work.projects) // 2,
+                    "revoke_internal": len(work.internals) // 2,
+                }.get(name, runs)
+                count = min(runs, most or runs, limit)
+                if count:
+                    operations[name] = measure(work, operation, count)
+        finally:
+            work.close()
+
+    return {
+        "format": RESULTS_FORMAT,
+        "created": time.time(),
+        "revision": _revision(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "scale": scale,
+        "populate_s": populated,
+        "operations": operations,
+    }
+
+
+def compare(baseline, current, threshold):
+    """
+        Prints median changes per operation, returns names slower than
+        baseline by more than threshold (0.1 is 10%)
+    """
+    if baseline.get("scale") != current.get("scale"):
+        print("warning: scales differ {} vs {}".format(baseline.get("scale"), current.get("scale")))
+    regressions = []
+    for name, now in current["operations"].items():
+        before = baseline["operations"].get(name)
+        if not before:
+            print("{:<16} {:>12} {:>12.1f} us  new".format(name, "", now["median_us"]))
+            continue
+        change = now["median_us"] / before["median_us"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "REGRESSION"
+            regressions.append(name)
+        print(
+            "{:<16} {:>9.1f} us {:>9.1f} us {:>+7.1%}  {}".format(
+                name, before["median_us"], now["median_us"], change, flag
+            )
+        )
+    return regressions
+
+
+def report(results):
+    print(
+        "{scale} populated in {populate_s:.1f}s, sqlite {sqlite}, python {python}".format(**results)
+    )
+    print("{:<16} {:>6} {:>12} {:>12} {:>12}".format("operation", "runs", "median", "p95", "min"))
+    for name, stats in results["operations"].items():
+        print(
+            "{:<16} {:>6} {:>9.1f} us {:>9.1f} us {:>9.1f} us".format(
+                name, stats["runs"], stats["median_us"], stats["p95_us"], stats["min_us"]
+            )
+        )
+
+
+def _load(path):
+    with open(path) as f:
+        results = json.load(f)
+    if results.get("format") != RESULTS_FORMAT:
+        raise SystemExit("{}: unsupported results format".format(path))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    for name, default in SCALE.items():
+        parser.add_argument("--" + name, type=int, default=default)
+    parser.add_argument("--runs", type=int, default=200, help="calls timed per operation")
+    parser.add_argument("--only", nargs="+", choices=[name for name, _, _ in OPERATIONS])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="save results as JSON")
+    parser.add_argument("--baseline", help="results to compare this run with")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "RESULTS"))
+    parser.add_argument("--threshold", type=float, default=0.1, help="tolerated slowdown")
+    args = parser.parse_args()
+
+    if args.compare:
+        baseline, current = map(_load, args.compare)
+    else:
+        scale = {name: getattr(args, name) for name in SCALE}
+        current = run(scale, args.runs, args.only, args.seed)
+        report(current)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(current, f, indent=2)
+        if not args.baseline:
+            return 0
+        baseline = _load(args.baseline)
+
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print("{} slower than {:.0%} over baseline".format(", ".join(regressions), args.threshold))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+    Synthetic databases the benchmarks run on.
+
+    A scale is a dict of SCALE's keys: accounts, projects, tasks per
+    project, logs per task and contacts per project, each contact being
+    one internal and one external. The same scale & seed always give the
+    same database.
+"""
+import random
+import time
+
+from core_utils import hash_password, random_salt
+from connection_utils import connect, transaction
+from migrations import ensure_schema
+
+STATUSES = ("open", "in progress", "blocked", "review", "done")
+
+PRIORITIES = ("low", "mid", "high")
+
+PASSWORD = "benchmark"
+
+SCALE = {
+    "accounts": 100,
+    "projects": 200,
+    "tasks": 50,
+    "logs": 10,
+    "contacts": 5,
+}
+
+
+def mail(i):
+    return "user{}@example.com".format(i)
+
+
+def scale(**sizes):
+    """
+        SCALE with the given sizes changed
+    """
+    unknown = set(sizes) - set(SCALE)
+    if unknown:
+        raise ValueError("Unknown sizes: {}".format(", ".join(sorted(unknown))))
+    return dict(SCALE, **sizes)
+
+
+def populate(path, scale, seed=7):
+    """
+        Scratch database of scale at path, every account shares PASSWORD
+        so only one scrypt hash is computed. Task logs are spread over the
+        past year.
+    """
+    rng = random.Random(seed)
+    connection = connect(path, profile="bulk-load")
+    ensure_schema(connection)
+    salt = random_salt()
+    key = hash_password(PASSWORD, salt)
+    mails = [mail(i) for i in range(scale["accounts"])]
+
+    with transaction(connection):
+        connection.executemany(
+            "INSERT INTO ACCOUNTS(mail, name, securitykey, salt) VALUES (?, ?, ?, ?);",
+            [(address, "user {}".format(i), key, salt) for i, address in enumerate(mails)],
+        )
+        now = time.time()
+        for p in range(scale["projects"]):
+            author = rng.choice(mails)
+            project_id = connection.execute(
+                """INSERT INTO PROJECTS(name, category, tags, description, start, end, created_by)
+                VALUES (?, ?, ?, ?, '01-01-2026', '31-12-2026', ?);""",
+                (
+                    "project {}".format(p),
+                    rng.choice(("ops", "research", "product")),
+                    "bench,p{}".format(p % 10),
+                    "synthetic project {}".format(p),
+                    author,
+                ),
+            ).lastrowid
+            first = None
+            for t in range(scale["tasks"]):
+                task_id = connection.execute(
+                    """INSERT INTO TASKS(priority, objective, description, start, end, status,
+                    status_info, dependent_on, project_id, created_by)
+                    VALUES (?, ?, '', '01-01-2026', '31-12-2026', ?, 'created', '-1', ?, ?);""",
+                    (
+                        rng.choice(PRIORITIES),
+                        "task {}".format(t),
+                        rng.choice(STATUSES),
+                        project_id,
+                        author,
+                    ),
+                ).lastrowid
+                first = first or task_id
+                connection.executemany(
+                    """INSERT INTO TASKLOGS(status, status_info, task_id, created_by, ts)
+                    VALUES (?, ?, ?, ?, ?);""",
+                    [
+                        (
+                            rng.choice(STATUSES),
+                            "step {}".format(i),
+                            task_id,
+                            rng.choice(mails),
+                            now - rng.uniform(0, 365 * 86400),
+                        )
+                        for i in range(scale["logs"])
+                    ],
+                )
+            for c in range(scale["contacts"]):
+                contact = ("contact {}".format(c), "c{}.p{}@example.com".format(c, p), 5550000 + c)
+                task_id = first + rng.randrange(scale["tasks"]) if first else None
+                connection.execute(
+                    """INSERT INTO INTERNALS(name, email, phone, task_id, project_id)
+                    VALUES (?, ?, ?, ?, ?);""",
+                    contact + (task_id, project_id),
+                )
+                connection.execute(
+                    "INSERT INTO EXTERNALS(name, email, phone, project_id) VALUES (?, ?, ?, ?);",
+                    contact + (project_id,),
+                )
+    connection.close()
@@ -0,0 +1,27 @@
+import pathlib
+
+from setuptools import setup
+
+# every module of src/ ships, so new modules cannot be left out. They stay
+# top-level modules on purpose: they import each other flat (import cli,
+# from database_utils import ...) so that src/ keeps running in place as
+# python main.py or python daemons.py, like it always has. Moving them into
+# a corem package means rewriting every import, and both ways of running
+# stop working.
+MODULES = sorted(
+    path.stem
+    for path in (pathlib.Path(__file__).parent / "src").glob("*.py")
+    if path.stem != "__init__"
+)
+
+setup(
+    name="corem",
+    version="0.1.0",
+    description="Project & task manager",
+    license="GPL-3.0",
+    package_dir={"": "src"},
+    py_modules=MODULES,
+    python_requires=">=3.10",
+    extras_require={"sync": ["pymongo"]},
+    entry_points={"console_scripts": ["corem=cli:main"]},
+)
@@ -0,0 +1,206 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from migrations import ensure_schema
+from connection_utils import DB_PATH, connect
+from database_utils import ProjectManager, TaskManager, Internals, Externals
+
+READERS = 4
+
+# Manager methods served by the read pool, writes go to the writer.
+# Interactive (input() driven) methods are not exposed.
+MANAGER_METHODS = {
+    ProjectManager: (
+        (
+            "fetch_project",
+            "list_projects",
+            "project_summary",
+            "projects_with_tags",
+            "tag_counts",
+            "list_files",
+        ),
+        (
+            "create_project",
+            "save_project",
+            "edit_project",
+            "remove_project",
+            "attach_file",
+            "remove_file",
+            # touches the blob's LRU entry
+            "file_path",
+        ),
+    ),
+    TaskManager: (
+        (
+            "fetch_task",
+            "list_tasks",
+            "dependencies_of",
+            "dependents_of",
+            "list_reminders",
+            "task_history",
+        ),
+        (
+            "create_task",
+            "save_task",
+            "edit_task",
+            "remove_task",
+            "create_task_log",
+            "create_reminder",
+            "reschedule_reminder",
+        ),
+    ),
+    Internals: (
+        ("list_internals",),
+        ("create_internal", "save_internal", "remove_internal"),
+    ),
+    Externals: (
+        ("list_externals",),
+        ("create_external", "save_external", "remove_external", "notify"),
+    ),
+}
+
+
+class _Worker(threading.local):
+    """
+        Connection & managers of one pool thread
+    """
+
+    connection = None
+    managers = None
+
+
+class AsyncDatabase:
+    """
+        asyncio access to the database for many concurrent clients.
+
+        Reads run on a bounded pool of threads, each with its own WAL
+        connection (query_only), so they proceed in parallel with each
+        other and with the writer. Writes are serialized on one thread
+        owning the only writable connection, so they never contend for
+        the write lock. sqlite releases the GIL while it works, and the
+        event loop only awaits futures.
+
+            async with AsyncDatabase(readers=8) as db:
+                tasks = db.manager(TaskManager, author, project_id)
+                task = await tasks.fetch_task(5)
+                await tasks.create_task_log(5, "done", "shipped")
+    """
+
+    def __init__(self, db_path=None, readers=READERS, profile="server"):
+        self.db_path = db_path or DB_PATH
+        self.readers = readers
+        self.profile = profile
+        if self.db_path == ":memory:":
+            raise ValueError("Pooled connections need a database file, not :memory:")
+        self._worker = _Worker()
+        self._opened = []
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(
+            1, thread_name_prefix="corem-writer", initializer=self._open, initargs=(False,)
+        )
+        # migrations run on the writer before any reader opens
+        self._writer.submit(lambda: None).result()
+        self._readers = ThreadPoolExecutor(
+            readers, thread_name_prefix="corem-reader", initializer=self._open, initargs=(True,)
+        )
+
+    def _open(self, read_only):
+        # closed from whichever thread calls close()
+        connection = connect(self.db_path, self.profile, check_same_thread=False)
+        ensure_schema(connection)
+        if read_only:
+            connection.execute("PRAGMA query_only = ON;")
+        self._worker.connection = connection
+        self._worker.managers = {}
+        with self._lock:
+            self._opened.append(connection)
+
+    def _call(self, fn, args):
+        return fn(self._worker.connection, *args)
+
+    async def read(self, fn, *args):
+        """
+            Runs fn(connection, *args) on a read connection
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self._readers, self._call, fn, args
+        )
+
+    async def write(self, fn, *args):
+        """
+            Runs fn(connection, *args) on the writer connection, in
+            submission order with other writes
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self._writer, self._call, fn, args
+        )
+
+    def manager(self, cls, *args):
+        """
+            Async proxy of a manager, args are those of cls after the connection
+        """
+        if cls not in MANAGER_METHODS:
+            raise ValueError("No async access to {}".format(cls.__name__))
+        return AsyncManager(self, cls, args)
+
+    def _manager(self, cls, args):
+        # one manager per thread & arguments, keeping its structure cache & graph
+        managers = self._worker.managers
+        manager = managers.get((cls, args))
+        if manager is None:
+            connection = self._worker.connection
+            if cls is Internals:
+                # Internals takes its connection last
+                manager = cls(*args, connection)
+            else:
+                manager = cls(connection, *args)
+            managers[(cls, args)] = manager
+        return manager
+
+    def close(self):
+        self._readers.shutdown()
+        self._writer.shutdown()
+        with self._lock:
+            for connection in self._opened:
+                connection.close()
+            self._opened.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+class AsyncManager:
+    """
+        Awaitable methods of a manager, reads on the pool & writes on the writer
+    """
+
+    def __init__(self, database, cls, args):
+        self._database = database
+        self._cls = cls
+        self._args = args
+        self._reads, self._writes = MANAGER_METHODS[cls]
+
+    def __getattr__(self, name):
+        if name in self._reads:
+            submit = self._database.read
+        elif name in self._writes:
+            submit = self._database.write
+        else:
+            raise AttributeError(
+                "{} has no async method {}".format(self._cls.__name__, name)
+            )
+
+        database, cls, args = self._database, self._cls, self._args
+
+        def call(connection, call_args, kwargs):
+            return getattr(database._manager(cls, args), name)(*call_args, **kwargs)
+
+        async def method(*call_args, **kwargs):
+            return await submit(call, call_args, kwargs)
+
+        method.__name__ = name
+        return method
@@ -0,0 +1,187 @@
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+import time
+
+from migrations import ensure_schema
+from connection_utils import DB_PATH, transaction
+
+BLOB_DIR = os.path.join(os.path.dirname(DB_PATH), "blobs")
+
+# Local cache budget in bytes, least recently used blobs are evicted past it
+CACHE_LIMIT = 1 << 30
+
+
+def file_digest(path):
+    """
+        Returns (sha256 hex digest, size) of a file, hashing through mmap
+        so large files are never copied into Python memory
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                digest.update(view)
+    return digest.hexdigest(), size
+
+
+class BlobStore:
+    """
+        Content-addressed file store under ~/.corem/blobs.
+
+        Files are kept once per sha256 digest however many projects attach
+        them, and indexed in BLOBS. The store is a size bounded LRU cache:
+        unreferenced blobs go first, and when a fetch callable
+        fetch(digest, destination) for a remote store is given, referenced
+        blobs are evicted too and fetched again on next use.
+    """
+
+    def __init__(self, connection, root=BLOB_DIR, limit=CACHE_LIMIT, fetch=None):
+        self._conn = connection
+        self.root = root
+        self.limit = limit
+        self.fetch = fetch
+        ensure_schema(connection)
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _copy(self, source, digest):
+        """
+            Copies into the store via temp file & rename, so readers never
+            see a partial blob. copyfile uses sendfile where the OS has it.
+        """
+        target = self._path(digest)
+        os.makedirs(os.path.dirname(target), 0o755, exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(target))
+        os.close(fd)
+        try:
+            shutil.copyfile(source, temp)
+            os.replace(temp, target)
+        except BaseException:
+            os.remove(temp)
+            raise
+        return target
+
+    def put(self, path):
+        """
+            Adds a file to the store, returns its digest.
+            Content already stored is not copied again. Call evict once
+            the blob is referenced, else it is the first to go.
+        """
+        digest, size = file_digest(path)
+        if not os.path.exists(self._path(digest)):
+            self._copy(path, digest)
+
+        with transaction(self._conn):
+            self._conn.execute(
+                """INSERT INTO BLOBS(hash, size, cached, last_used) VALUES (?, ?, 1, ?)
+                ON CONFLICT(hash) DO UPDATE SET cached = 1, last_used = excluded.last_used;""",
+                (digest, size, time.time()),
+            )
+        return digest
+
+    def path(self, digest):
+        """
+            Local path of a blob, fetched from the remote store if evicted.
+            Raises FileNotFoundError when it is neither local nor fetchable.
+        """
+        row = self._conn.execute(
+            "SELECT size FROM BLOBS WHERE hash = ?;", (digest,)
+        ).fetchone()
+        if not row:
+            raise FileNotFoundError("Unknown blob {}".format(digest))
+
+        target = self._path(digest)
+        if not os.path.exists(target):
+            if not self.fetch:
+                raise FileNotFoundError("Blob {} is not cached locally".format(digest))
+            self._fetch(digest, target)
+
+        with transaction(self._conn):
+            self._conn.execute(
+                "UPDATE BLOBS SET cached = 1, last_used = ? WHERE hash = ?;",
+                (time.time(), digest),
+            )
+        self.evict(keep=(digest,))
+        return target
+
+    def _fetch(self, digest, target):
+        os.makedirs(os.path.dirname(target), 0o755, exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(target))
+        os.close(fd)
+        try:
+            self.fetch(digest, temp)
+            if file_digest(temp)[0] != digest:
+                raise ValueError("Fetched blob does not match {}".format(digest))
+            os.replace(temp, target)
+        except BaseException:
+            os.remove(temp)
+            raise
+
+    def cached_size(self):
+        return self._conn.execute(
+            "SELECT coalesce(sum(size), 0) FROM BLOBS WHERE cached = 1;"
+        ).fetchone()[0]
+
+    def evict(self, limit=None, keep=()):
+        """
+            Evicts least recently used blobs until the local cache fits in limit,
+            except those in keep. Returns the evicted digests.
+        """
+        limit = self.limit if limit is None else limit
+        total = self.cached_size()
+        if total <= limit:
+            return []
+
+        candidates = self._conn.execute(
+            """SELECT hash, size, in_use FROM (
+              SELECT b.hash, b.size, b.last_used,
+                EXISTS(SELECT 1 FROM PROJECT_FILES f WHERE f.hash = b.hash) AS in_use
+              FROM BLOBS b WHERE b.cached = 1
+            ) ORDER BY in_use, last_used;"""
+        ).fetchall()
+
+        evicted = []
+        with transaction(self._conn):
+            for digest, size, in_use in candidates:
+                if total <= limit:
+                    break
+                # referenced blobs only go when they can be fetched again
+                if digest in keep or (in_use and self.fetch is None):
+                    continue
+
+                if in_use:
+                    self._conn.execute("UPDATE BLOBS SET cached = 0 WHERE hash = ?;", (digest,))
+                else:
+                    self._conn.execute("DELETE FROM BLOBS WHERE hash = ?;", (digest,))
+                try:
+                    os.remove(self._path(digest))
+                except FileNotFoundError:
+                    pass
+                total -= size
+                evicted.append(digest)
+        return evicted
+
+    def collect(self):
+        """
+            Deletes blobs no project file refers to, returns their digests
+        """
+        digests = [
+            row[0]
+            for row in self._conn.execute(
+                """SELECT hash FROM BLOBS b
+                WHERE NOT EXISTS(SELECT 1 FROM PROJECT_FILES f WHERE f.hash = b.hash);"""
+            )
+        ]
+        with transaction(self._conn):
+            self._conn.executemany("DELETE FROM BLOBS WHERE hash = ?;", [(d,) for d in digests])
+        for digest in digests:
+            try:
+                os.remove(self._path(digest))
+            except FileNotFoundError:
+                pass
+        return digests
@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+# Structures held per connection, 0 disables caching
+CACHE_SIZE = int(os.environ.get("COREM_CACHE_SIZE", 1024))
+
+# Seconds commits of other connections may go unnoticed, 0 checks on every read
+CACHE_STALENESS = float(os.environ.get("COREM_CACHE_STALENESS", 0))
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+    size: int = 0
+    maxsize: int = CACHE_SIZE
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __str__(self):
+        return "{} hits, {} misses ({:.0%}), {} evicted, {} flushes, {}/{} cached".format(
+            self.hits,
+            self.misses,
+            self.hit_rate,
+            self.evictions,
+            self.invalidations,
+            self.size,
+            self.maxsize,
+        )
+
+
+class StructureCache:
+    """
+        Identity map of ProjectStructure / TaskStructure by (kind, id) for
+        one connection, least recently used entries go first when full.
+
+        Managers update or drop entries when they write. Any other write is
+        noticed before the next read and flushes the whole map: writes on
+        this connection by comparing total_changes, commits of other
+        connections & processes by PRAGMA data_version, checked at most
+        once per staleness seconds. Nothing read inside an open transaction
+        is cached, as it may yet roll back.
+    """
+
+    def __init__(self, connection, maxsize=CACHE_SIZE, staleness=CACHE_STALENESS):
+        self._conn = connection
+        self._cursor = connection.cursor()
+        self.maxsize = maxsize
+        self.staleness = staleness
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = CacheStats(maxsize=maxsize)
+        self._changes = None
+        self._data_version = None
+        self._checked = float("-inf")
+
+    def validate(self):
+        """
+            Flushes entries if the database changed behind the managers' back
+        """
+        changes = self._conn.total_changes
+        data_version = self._data_version
+        now = time.monotonic()
+        if now - self._checked >= self.staleness:
+            data_version = self._cursor.execute("PRAGMA data_version;").fetchone()[0]
+            self._checked = now
+        with self._lock:
+            if (changes, data_version) != (self._changes, self._data_version):
+                if self._entries:
+                    self._entries.clear()
+                    self._stats.invalidations += 1
+                self._changes, self._data_version = changes, data_version
+
+    def get(self, kind, key):
+        """
+            Cached structure or None, counted as a hit or a miss
+        """
+        if not self.maxsize:
+            return None
+        self.validate()
+        with self._lock:
+            value = self._entries.get((kind, key))
+            if value is None:
+                self._stats.misses += 1
+                return None
+            self._entries.move_to_end((kind, key))
+            self._stats.hits += 1
+            return value
+
+    def put(self, kind, key, value):
+        """
+            Caches a structure just read, unless a transaction is open
+        """
+        if not self.maxsize or self._conn.in_transaction:
+            return value
+        with self._lock:
+            self._entries[(kind, key)] = value
+            self._entries.move_to_end((kind, key))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats.evictions += 1
+        return value
+
+    def wrote(self, kind, key, value=None):
+        """
+            Records a committed write of a manager: caches value (drops the
+            entry when None) and accepts the write as known. Call validate()
+            before writing, so earlier foreign writes are not accepted too.
+        """
+        with self._lock:
+            self._entries.pop((kind, key), None)
+            if self._conn.in_transaction:
+                # part of an enclosing transaction, flushed on the next read
+                return
+            self._changes = self._conn.total_changes
+        if value is not None:
+            self.put(kind, key, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stats.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return CacheStats(**dict(vars(self._stats), size=len(self._entries)))
+
+
+def structure_cache(connection):
+    """
+        The connection's StructureCache, shared by all managers using it.
+        Plain sqlite3 connections take no attributes, each caller then gets
+        a cache of its own.
+    """
+    cache = getattr(connection, "structures", None)
+    if cache is None:
+        cache = StructureCache(connection)
+        try:
+            connection.structures = cache
+        except AttributeError:
+            pass
+    return cache
@@ -0,0 +1,492 @@
+"""
+    corem command line.
+
+    Only argparse is imported up front, every command imports what it uses
+    and opens the database itself, so `corem --help` and simple listings
+    start about as fast as the interpreter. Run without a command for the
+    interactive menus.
+"""
+import argparse
+import os
+import sys
+
+
+def _connect(args):
+    from connection_utils import connect
+    from migrations import ensure_schema
+
+    connection = connect(args.db)
+    ensure_schema(connection)
+    return connection
+
+
+def _author(args):
+    if args.author:
+        return args.author
+    if os.environ.get("COREM_AUTHOR"):
+        return os.environ["COREM_AUTHOR"]
+
+    import json
+    from database_utils import session_file
+
+    try:
+        with open(session_file(args.db)) as f:
+            return json.load(f)["session-id"]
+    except (OSError, ValueError, KeyError):
+        raise ValueError("No author, pass --author, set COREM_AUTHOR or login first")
+
+
+def _print_rows(args, columns, rows):
+    if args.json:
+        import json
+
+        for row in rows:
+            print(json.dumps(dict(zip(columns, row))))
+        return
+    for row in rows:
+        print("\t".join("" if value is None else str(value) for value in row))
+
+
+def _listing(args, table, allowed, columns, filters):
+    from itertools import islice
+    from paging_utils import keyset_pages, iter_rows
+
+    connection = _connect(args)
+    rows = iter_rows(
+        keyset_pages(
+            connection,
+            table,
+            allowed,
+            columns,
+            filters,
+            page_size=min(args.limit, 500) if args.limit else 500,
+        )
+    )
+    if args.limit:
+        rows = islice(rows, args.limit)
+    _print_rows(args, columns, (tuple(row)[: len(columns)] for row in rows))
+
+
+def project_list(args):
+    from paging_utils import PROJECT_COLUMNS
+
+    _listing(
+        args,
+        "PROJECTS",
+        PROJECT_COLUMNS,
+        ("id", "name", "category", "start", "end", "created_by"),
+        {"category": args.category, "created_by": args.created_by},
+    )
+
+
+def project_add(args):
+    from database_utils import ProjectManager
+
+    project = ProjectManager(_connect(args), _author(args)).create_project(
+        args.name, args.category, args.tags, args.description, args.start, args.end
+    )
+    print(project.key)
+
+
+def project_show(args):
+    from summary_utils import read_summary
+
+    summary = read_summary(_connect(args), args.project)
+    if not summary:
+        raise ValueError("No project with id: {}".format(args.project))
+    print("tasks\t{}\nlogs\t{}\noverdue\t{}".format(summary.tasks, summary.logs, summary.overdue))
+    for status, count in sorted(summary.by_status.items()):
+        print("status:{}\t{}".format(status, count))
+    for priority, count in sorted(summary.by_priority.items()):
+        print("priority:{}\t{}".format(priority, count))
+
+
+def project_delete(args):
+    from database_utils import ProjectManager
+
+    ProjectManager(_connect(args), _author(args)).remove_project(args.project)
+
+
+def task_list(args):
+    from paging_utils import TASK_COLUMNS
+
+    _listing(
+        args,
+        "TASKS",
+        TASK_COLUMNS,
+        ("id", "priority", "objective", "start", "end", "status"),
+        {"project_id": args.project, "status": args.status, "priority": args.priority},
+    )
+
+
+def task_add(args):
+    from database_utils import TaskManager
+
+    task = TaskManager(_connect(args), _author(args), args.project).create_task(
+        args.priority,
+        args.objective,
+        args.description,
+        args.start,
+        args.end,
+        args.status,
+        args.status_info,
+        args.depends_on,
+    )
+    print(task.key)
+
+
+def log_add(args):
+    from database_utils import TaskManager
+
+    connection = _connect(args)
+    row = connection.execute("SELECT project_id FROM TASKS WHERE id = ?;", (args.task,)).fetchone()
+    if not row:
+        raise ValueError("No task with id: {}".format(args.task))
+    log = TaskManager(connection, _author(args), row[0]).create_task_log(
+        args.task, args.status, args.info
+    )
+    print(log.key)
+
+
+def log_history(args):
+    from history_utils import status_changes
+
+    changes = status_changes(
+        _connect(args),
+        args.project,
+        args.task,
+        args.since,
+        args.until,
+        args.status,
+        args.limit,
+    )
+    _print_rows(
+        args,
+        ("ts", "project_id", "task_id", "log_id", "status", "status_info", "created_by"),
+        (
+            (c.ts, c.project_id, c.task_id, c.log_id, c.status, c.status_info, c.created_by)
+            for c in changes
+        ),
+    )
+
+
+def log_rollup(args):
+    from history_utils import status_rollups
+
+    _print_rows(
+        args,
+        ("period", "status", "count"),
+        status_rollups(_connect(args), args.project, args.since, args.until, args.period),
+    )
+
+
+def log_compact(args):
+    from history_utils import compact_logs
+
+    print("{} logs compacted".format(compact_logs(_connect(args), args.before, args.project)))
+
+
+def search_command(args):
+    from search_utils import search, SCOPES
+
+    hits = search(
+        _connect(args), args.query, args.scope or SCOPES, args.project, args.limit
+    )
+    _print_rows(
+        args,
+        ("scope", "key", "project_id", "title", "snippet"),
+        ((hit.scope, hit.key, hit.project_id, hit.title, hit.snippet) for hit in hits),
+    )
+
+
+def import_tasks_command(args):
+    from import_utils import import_tasks
+
+    report = import_tasks(_connect(args), _author(args), args.project, args.path)
+    print(report)
+    for line_no, reason in report.rejected:
+        print("line {}: {}".format(line_no, reason), file=sys.stderr)
+
+
+def import_accounts_command(args):
+    from import_utils import provision_accounts
+
+    report = provision_accounts(
+        _connect(args), args.path, workers=args.workers, target=args.target
+    )
+    print(report)
+    for line_no, reason in report.rejected:
+        print("line {}: {}".format(line_no, reason), file=sys.stderr)
+
+
+def report_command(args):
+    from report_utils import REPORT_DIR, write_reports
+
+    written, skipped = write_reports(
+        args.db, args.out or REPORT_DIR, args.projects or None, args.force, args.workers
+    )
+    print("{} written, {} unchanged".format(len(written), len(skipped)))
+
+
+def sync_command(args):
+    from sync_utils import SyncEngine, mongo_collection
+
+    print(SyncEngine(_connect(args), mongo_collection()).sync())
+
+
+def mail_send(args):
+    import asyncio
+    from mail_utils import MailWorker
+
+    worker = MailWorker(args.db)
+    try:
+        print("{} mails attempted".format(asyncio.run(worker.drain())))
+    finally:
+        worker.close()
+
+
+def reminders_run(args):
+    import logging
+    from daemons import ReminderDaemon
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    try:
+        ReminderDaemon(args.db).run()
+    except KeyboardInterrupt:
+        pass
+
+
+def serve_command(args):
+    import logging
+    from net_utils import serve
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    try:
+        serve(args.db, args.host, args.port, args.connections)
+    except KeyboardInterrupt:
+        pass
+
+
+def _histograms(title, histograms, top):
+    print("{:<10} {:>8} {:>10} {:>9} {:>9} {:>9}  {}".format(
+        "total ms", "count", "mean ms", "p50", "p95", "p99", title
+    ))
+    ranked = sorted(histograms.items(), key=lambda item: item[1].total, reverse=True)
+    for name, h in ranked[:top]:
+        print("{:<10.1f} {:>8} {:>10.3f} {:>9.3f} {:>9.3f} {:>9.3f}  {}".format(
+            h.total * 1000,
+            h.count,
+            h.total / h.count * 1000,
+            h.percentile(50) * 1000,
+            h.percentile(95) * 1000,
+            h.percentile(99) * 1000,
+            name[:120],
+        ))
+
+
+def stats_command(args):
+    import instrument_utils
+
+    if args.reset:
+        instrument_utils.reset()
+        print("Stats cleared")
+        return
+
+    stats = instrument_utils.load()
+    if instrument_utils.enabled():
+        stats.merge(instrument_utils.snapshot())
+    if args.json:
+        import json
+
+        print(json.dumps(stats.to_dict()))
+        return
+    if not stats.counters:
+        print("No stats yet, run commands with --instrument or COREM_INSTRUMENT=1")
+        return
+
+    for name, value in sorted(stats.counters.items()):
+        print("{:<22} {}".format(name, value))
+    print()
+    _histograms("operation", stats.operations, args.top)
+    print()
+    _histograms("statement", stats.statements, args.top)
+    print("\nSlow statements are logged to {}".format(instrument_utils.SLOW_LOG_PATH))
+
+
+def migrate_command(args):
+    from connection_utils import connect
+    from migrations import migrate
+
+    applied = migrate(connect(args.db))
+    print("Applied {}".format(", ".join(map(str, applied))) if applied else "Up to date")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="corem", description="Project & task manager")
+    parser.add_argument("--db", default=os.environ.get("COREM_DB"), help="database path")
+    parser.add_argument("--author", help="acting account (default COREM_AUTHOR or session)")
+    parser.add_argument("--json", action="store_true", help="print json lines")
+    parser.add_argument(
+        "--instrument", action="store_true", help="record statement & operation stats"
+    )
+    commands = parser.add_subparsers(dest="command", metavar="command")
+
+    # listings also take --json after the command
+    listing = argparse.ArgumentParser(add_help=False)
+    listing.add_argument("--json", action="store_true", default=argparse.SUPPRESS)
+
+    project = commands.add_parser("project", help="projects").add_subparsers(
+        dest="action", metavar="action", required=True
+    )
+    p = project.add_parser("list", parents=[listing], help="list projects")
+    p.add_argument("--category")
+    p.add_argument("--created-by")
+    p.add_argument("--limit", type=int, default=0)
+    p.set_defaults(handler=project_list)
+    p = project.add_parser("add", help="create a project, prints its id")
+    p.add_argument("name")
+    p.add_argument("--category", required=True)
+    p.add_argument("--tags", required=True)
+    p.add_argument("--description", required=True)
+    p.add_argument("--start", required=True, help="dd-mm-yyyy")
+    p.add_argument("--end", default="-1", help="dd-mm-yyyy")
+    p.set_defaults(handler=project_add)
+    p = project.add_parser("show", help="project summary")
+    p.add_argument("project", type=int)
+    p.set_defaults(handler=project_show)
+    p = project.add_parser("delete", help="delete a project with its tasks")
+    p.add_argument("project", type=int)
+    p.set_defaults(handler=project_delete)
+
+    task = commands.add_parser("task", help="tasks").add_subparsers(
+        dest="action", metavar="action", required=True
+    )
+    p = task.add_parser("list", parents=[listing], help="list tasks of a project")
+    p.add_argument("project", type=int)
+    p.add_argument("--status")
+    p.add_argument("--priority")
+    p.add_argument("--limit", type=int, default=0)
+    p.set_defaults(handler=task_list)
+    p = task.add_parser("add", help="create a task, prints its id")
+    p.add_argument("project", type=int)
+    p.add_argument("objective")
+    p.add_argument("--priority", required=True)
+    p.add_argument("--description", default="")
+    p.add_argument("--start", required=True, help="dd-mm-yyyy")
+    p.add_argument("--end", default="-1", help="dd-mm-yyyy")
+    p.add_argument("--status", default="open")
+    p.add_argument("--status-info", default="created")
+    p.add_argument("--depends-on", default="-1", help="comma separated task ids")
+    p.set_defaults(handler=task_add)
+
+    log = commands.add_parser("log", help="task logs").add_subparsers(
+        dest="action", metavar="action", required=True
+    )
+    p = log.add_parser("add", help="log task status, prints log id")
+    p.add_argument("task", type=int)
+    p.add_argument("status")
+    p.add_argument("info")
+    p.set_defaults(handler=log_add)
+    p = log.add_parser("history", parents=[listing], help="status changes in time order")
+    p.add_argument("--project", type=int)
+    p.add_argument("--task", type=int)
+    p.add_argument("--since", help="dd-mm-yyyy (UTC)")
+    p.add_argument("--until", help="dd-mm-yyyy (UTC), exclusive")
+    p.add_argument("--status", action="append")
+    p.add_argument("--limit", type=int)
+    p.set_defaults(handler=log_history)
+    p = log.add_parser("rollup", parents=[listing], help="status changes per period")
+    p.add_argument("project", type=int)
+    p.add_argument("--period", choices=("day", "week", "month"), default="day")
+    p.add_argument("--since", help="dd-mm-yyyy (UTC)")
+    p.add_argument("--until", help="dd-mm-yyyy (UTC), exclusive")
+    p.set_defaults(handler=log_rollup)
+    p = log.add_parser("compact", help="drop raw logs older than a date, rollups keep them")
+    p.add_argument("before", help="dd-mm-yyyy (UTC)")
+    p.add_argument("--project", type=int)
+    p.set_defaults(handler=log_compact)
+
+    p = commands.add_parser("search", parents=[listing], help="full-text search")
+    p.add_argument("query")
+    p.add_argument("--scope", action="append", choices=("projects", "tasks", "logs"))
+    p.add_argument("--project", type=int)
+    p.add_argument("--limit", type=int, default=20)
+    p.set_defaults(handler=search_command)
+
+    imports = commands.add_parser("import", help="bulk imports").add_subparsers(
+        dest="action", metavar="action", required=True
+    )
+    p = imports.add_parser("tasks", help="import tasks from csv/jsonl")
+    p.add_argument("project", type=int)
+    p.add_argument("path")
+    p.set_defaults(handler=import_tasks_command)
+    p = imports.add_parser("accounts", help="provision accounts from csv/jsonl")
+    p.add_argument("path")
+    p.add_argument("--workers", type=int)
+    p.add_argument("--target", type=float, default=0.1, help="seconds per password hash")
+    p.set_defaults(handler=import_accounts_command)
+
+    p = commands.add_parser("report", help="write HTML reports of changed projects")
+    p.add_argument("projects", type=int, nargs="*")
+    p.add_argument("--out")
+    p.add_argument("--force", action="store_true")
+    p.add_argument("--workers", type=int)
+    p.set_defaults(handler=report_command)
+
+    p = commands.add_parser("sync", help="push & pull changes with COREM_SYNC_URI")
+    p.set_defaults(handler=sync_command)
+
+    p = commands.add_parser("mail", help="outbound mail").add_subparsers(
+        dest="action", metavar="action", required=True
+    )
+    p.add_parser("send", help="send queued mail").set_defaults(handler=mail_send)
+
+    p = commands.add_parser("reminders", help="run the reminder daemon")
+    p.set_defaults(handler=reminders_run)
+
+    p = commands.add_parser("serve", help="serve the HTTP/JSON API")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8080)
+    p.add_argument("--connections", type=int, default=4, help="read connections")
+    p.set_defaults(handler=serve_command)
+
+    p = commands.add_parser("stats", parents=[listing], help="show recorded stats")
+    p.add_argument("--top", type=int, default=20, help="rows per table")
+    p.add_argument("--reset", action="store_true", help="clear stats & slow-query log")
+    p.set_defaults(handler=stats_command)
+
+    p = commands.add_parser("migrate", help="apply schema migrations")
+    p.set_defaults(handler=migrate_command)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.instrument:
+        import instrument_utils
+
+        instrument_utils.enable()
+    if not args.command:
+        import main as interactive
+
+        interactive.run(args.db)
+        return 0
+
+    try:
+        args.handler(args)
+    except (ValueError, PermissionError, OSError) as e:
+        print("corem: {}".format(e), file=sys.stderr)
+        return 1
+    except Exception as e:
+        # sqlite3 is loaded by then, it is only imported here to keep startup lazy
+        import sqlite3
+
+        if not isinstance(e, sqlite3.Error):
+            raise
+        print("corem: {}".format(e), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+from array import array
+from collections import Counter
+
+from migrations import ensure_schema
+from paging_utils import TASK_COLUMNS, TASKLOG_COLUMNS
+
+FETCH_SIZE = 10000
+
+# Tables open to columnar reads with array typecodes of their numeric columns
+COLUMNAR_TABLES = {
+    "TASKS": (TASK_COLUMNS, {"id": "q", "project_id": "q"}),
+    "TASKLOGS": (TASKLOG_COLUMNS, {"id": "q", "task_id": "q", "ts": "d"}),
+}
+
+
+class Categorical:
+    """
+        Dictionary-encoded text column: each distinct value is stored once
+        in categories and rows hold its index in a compact array of codes.
+        Status, priority, author & dates repeat heavily, so a few million
+        rows cost little more than 4 bytes each.
+    """
+
+    __slots__ = ("codes", "categories", "_lookup")
+
+    def __init__(self):
+        self.codes = array("I")
+        self.categories = []
+        self._lookup = {}
+
+    def extend(self, values):
+        lookup = self._lookup
+        categories = self.categories
+        codes = []
+        for value in values:
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(categories)
+                categories.append(value)
+            codes.append(code)
+        self.codes.extend(codes)
+
+    def freeze(self):
+        """
+            Drops the encoding dictionary once loading is done
+        """
+        self._lookup = None
+        return self
+
+    def counts(self):
+        """
+            {value: number of rows}
+        """
+        categories = self.categories
+        return {categories[code]: count for code, count in Counter(self.codes).items()}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        return self.categories[self.codes[index]]
+
+    def __iter__(self):
+        categories = self.categories
+        return (categories[code] for code in self.codes)
+
+
+def read_columns(connection, table, columns=None, filters=None, fetch_size=FETCH_SIZE):
+    """
+        Reads whole columns of TASKS or TASKLOGS for analysis, returns
+        {column: array or Categorical} in id order. Filters are
+        equality matches. Rows are fetched fetch_size at a time and
+        appended column by column, no per-row objects are kept.
+    """
+    if table not in COLUMNAR_TABLES:
+        raise ValueError(
+            "Unknown table {}, choose from {}".format(table, ", ".join(COLUMNAR_TABLES))
+        )
+    allowed, numeric = COLUMNAR_TABLES[table]
+    columns = tuple(columns or allowed)
+    filters = {name: value for name, value in (filters or {}).items() if value is not None}
+    for name in columns + tuple(filters):
+        if name not in allowed:
+            raise ValueError(
+                "Unknown column {}, choose from {}".format(name, ", ".join(allowed))
+            )
+
+    ensure_schema(connection)
+    result = {
+        name: array(numeric[name]) if name in numeric else Categorical() for name in columns
+    }
+    sinks = [result[name] for name in columns]
+
+    cursor = connection.execute(
+        "SELECT {} FROM {}{} ORDER BY id;".format(
+            ", ".join(columns),
+            table,
+            " WHERE " + " AND ".join("{} = ?".format(name) for name in filters)
+            if filters
+            else "",
+        ),
+        list(filters.values()),
+    )
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        for sink, values in zip(sinks, zip(*rows)):
+            sink.extend(values)
+
+    for sink in sinks:
+        if isinstance(sink, Categorical):
+            sink.freeze()
+    return result
@@ -0,0 +1,133 @@
+import itertools
+import os
+import pathlib
+import sqlite3
+from contextlib import contextmanager
+
+DB_PATH = os.path.join(str(pathlib.Path.home()), ".corem", "crator.db")
+
+# Tuning profiles, cache_size is in KiB when negative, mmap_size in bytes.
+PROFILES = {
+    "interactive": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16384,
+        "mmap_size": 64 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    "bulk-load": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -262144,
+        "mmap_size": 1024 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 30000,
+    },
+    "server": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 10000,
+    },
+}
+
+DEFAULT_PROFILE = "interactive"
+
+# Connections record statement stats when set, see instrument_utils.enable()
+INSTRUMENT = os.environ.get("COREM_INSTRUMENT", "") in ("1", "yes", "true")
+
+
+class TunedConnection(sqlite3.Connection):
+    """
+        sqlite3 connection remembering the tuning profile applied to it,
+        and holding the StructureCache its managers share
+    """
+
+    profile = None
+    structures = None
+
+
+def profile_settings(profile):
+    if profile not in PROFILES:
+        raise ValueError(
+            "Unknown profile {}, choose from {}".format(profile, ", ".join(PROFILES))
+        )
+    return PROFILES[profile]
+
+
+def apply_profile(connection, profile=DEFAULT_PROFILE):
+    """
+        Applies pragmas of a named profile to an open connection
+    """
+    for pragma, value in profile_settings(profile).items():
+        connection.execute("PRAGMA {} = {};".format(pragma, value))
+
+    if isinstance(connection, TunedConnection):
+        connection.profile = profile
+
+
+def connect(path=None, profile=DEFAULT_PROFILE, **kwargs):
+    """
+        Opens crator.db (or given path) with pragmas of the named profile
+    """
+    profile_settings(profile)
+
+    path = path or DB_PATH
+    if path != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(path)), 0o755, exist_ok=True)
+
+    if INSTRUMENT:
+        from instrument_utils import InstrumentedConnection, enable
+
+        enable()
+        kwargs.setdefault("factory", InstrumentedConnection)
+    kwargs.setdefault("factory", TunedConnection)
+
+    connection = sqlite3.connect(path, **kwargs)
+    connection.execute("PRAGMA foreign_keys = ON;")
+    apply_profile(connection, profile)
+    return connection
+
+
+def active_settings(connection):
+    """
+        Reads back pragma values currently in effect on a connection
+    """
+    settings = {"profile": getattr(connection, "profile", None)}
+    for pragma in PROFILES[DEFAULT_PROFILE]:
+        row = connection.execute("PRAGMA {};".format(pragma)).fetchone()
+        settings[pragma] = row[0] if row else None
+    return settings
+
+
+_savepoints = itertools.count()
+
+
+@contextmanager
+def transaction(connection):
+    """
+        Unit of work: statements inside the block commit together or not at all.
+        Nested blocks become savepoints of the enclosing transaction.
+    """
+    if connection.in_transaction:
+        name = "UOW_{}".format(next(_savepoints))
+        connection.execute("SAVEPOINT {};".format(name))
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK TO {};".format(name))
+            connection.execute("RELEASE {};".format(name))
+            raise
+        connection.execute("RELEASE {};".format(name))
+        return
+
+    connection.execute("BEGIN IMMEDIATE;")
+    try:
+        yield connection
+    except BaseException:
+        connection.rollback()
+        raise
+    connection.commit()
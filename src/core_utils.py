@@ -1,6 +1,17 @@
+import hmac
 import re
 import os
-from hashlib import sha3_512
+import secrets
+import time
+from hashlib import sha3_512, scrypt
+
+# scrypt cost, n is overridable with COREM_KDF_N or calibrate_kdf
+KDF_N = int(os.environ.get("COREM_KDF_N", 2 ** 14))
+KDF_R = 8
+KDF_P = 1
+
+# hashlib.scrypt takes maxmem as a C int, scrypt itself needs about 128 * n * r bytes
+MAX_MEM = 2 ** 31 - 1
 
 
 def is_invalid_email(mail):
@@ -19,9 +30,91 @@ def secure_hash(key, salt):
     return hash.hexdigest()
 
 
+def session_key():
+    """
+        Random key of a new session, stored only as secure_hash(key, mail)
+    """
+    return secrets.token_urlsafe(32)
+
+
+def hash_password(pass_phrase, salt, n=None, r=KDF_R, p=KDF_P):
+    """
+        scrypt key of a password, stored as scrypt$n$r$p$hexdigest
+    """
+    n = n or KDF_N
+    key = scrypt(
+        pass_phrase.encode(),
+        salt=salt.encode(),
+        n=n,
+        r=r,
+        p=p,
+        maxmem=min(MAX_MEM, 256 * n * r),
+        dklen=64,
+    )
+    return "scrypt${}${}${}${}".format(n, r, p, key.hex())
+
+
+def verify_password(pass_phrase, salt, stored):
+    """
+        Returns (matches, needs rehash). Legacy sha3 keys and scrypt keys
+        of a lower cost than KDF_N need rehashing.
+    """
+    if not stored.startswith("scrypt$"):
+        return hmac.compare_digest(stored, secure_hash(pass_phrase, salt)), True
+
+    _, n, r, p, _ = stored.split("$")
+    matches = hmac.compare_digest(hash_password(pass_phrase, salt, int(n), int(r), int(p)), stored)
+    return matches, int(n) < KDF_N
+
+
+def calibrate_kdf(target=0.1, r=KDF_R, p=KDF_P, limit=2 ** 20):
+    """
+        Largest power of two scrypt n whose hash takes about target seconds
+        on this machine, never below 2 ** 14
+    """
+    n = 2 ** 12
+    while n < limit:
+        started = time.perf_counter()
+        hash_password("calibration", "salt", n, r, p)
+        elapsed = time.perf_counter() - started
+        # cost is linear in n, stop when doubling would overshoot more than now
+        if elapsed * 2 - target > target - elapsed:
+            break
+        n *= 2
+    return max(n, 2 ** 14)
+
+
 def console_input(xs):
     replies = []
     for i in xs:
         za = input(i).strip()
         replies.append(za)
     return replies
+
+
+def parse_tags(text):
+    """
+        Splits comma separated tags into unique, lowercased names keeping order
+    """
+    tags = []
+    for tag in str(text or "").split(","):
+        tag = tag.strip().lower()
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def write_tags(cursor, project_id, tags):
+    """
+        Replaces PROJECT_TAGS links of a project with the parsed tags
+    """
+    names = parse_tags(tags)
+    cursor.execute("DELETE FROM PROJECT_TAGS WHERE project_id = ?;", (project_id,))
+    cursor.executemany(
+        "INSERT OR IGNORE INTO TAGS(name) VALUES (?);", [(name,) for name in names]
+    )
+    cursor.executemany(
+        """INSERT OR IGNORE INTO PROJECT_TAGS(tag_id, project_id)
+        SELECT id, ? FROM TAGS WHERE name = ?;""",
+        [(project_id, name) for name in names],
+    )
@@ -0,0 +1,315 @@
+import heapq
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import subprocess
+import threading
+import time
+
+from migrations import ensure_schema
+from connection_utils import DB_PATH, connect, transaction
+
+REMINDER_CHANNELS = ("notify", "log", "mail")
+
+# Reminders due within this many seconds are held in memory
+HORIZON = 3600.0
+
+logger = logging.getLogger("corem.reminders")
+
+
+def wake_socket(db_path=None):
+    """
+        Socket a daemon of the database at db_path (crator.db by default)
+        listens on for reminders scheduled by other processes
+    """
+    return os.path.abspath(db_path or DB_PATH) + ".reminders"
+
+
+def signal_daemon(connection, reminder_id):
+    """
+        Tells the daemon of connection's database, if one runs, that
+        reminder_id was scheduled or moved
+    """
+    path = connection.execute("PRAGMA database_list;").fetchone()[2]
+    if path and hasattr(socket, "AF_UNIX"):
+        _send(wake_socket(path), reminder_id)
+
+
+def _send(path, reminder_id):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+        sock.setblocking(False)
+        try:
+            sock.sendto(str(int(reminder_id)).encode(), path)
+        except OSError:
+            # no daemon listening, it loads the reminder when it starts
+            pass
+
+
+def log_reminder(connection, reminder):
+    logger.info(
+        "Reminder for task %s: %s", reminder["TASK_ID"], reminder["MESSAGE"]
+    )
+
+
+def notify_reminder(connection, reminder):
+    """
+        Desktop notification through notify-send, logged where it is missing
+    """
+    if not shutil.which("notify-send"):
+        log_reminder(connection, reminder)
+        return
+    subprocess.run(
+        ["notify-send", "Task {} reminder".format(reminder["TASK_ID"]), reminder["MESSAGE"]],
+        check=True,
+        timeout=10,
+    )
+
+
+def mail_reminder(connection, reminder):
+    """
+        Queues the reminder to MAIL_QUEUE, the mail worker sends it
+    """
+    from mail_utils import enqueue_mail
+
+    enqueue_mail(
+        connection,
+        [reminder["RECIPIENT"] or reminder["CREATED_BY"]],
+        "Task {} reminder".format(reminder["TASK_ID"]),
+        reminder["MESSAGE"],
+    )
+
+
+DEFAULT_CALLBACKS = {
+    "notify": notify_reminder,
+    "log": log_reminder,
+    "mail": mail_reminder,
+}
+
+
+class ReminderDaemon:
+    """
+        Fires due REMINDERS through per-channel callbacks.
+
+        Only reminders due within the horizon are kept, as (due, id) in a
+        heap, the rest stay in the database until their window comes up.
+        The daemon sleeps on a condition until the next deadline or the
+        end of the horizon, nothing is polled in between. wake() cuts the
+        sleep short, TaskManager.create_reminder and reschedule_reminder
+        call it from other processes through signal_daemon and the
+        wake_socket of the database.
+    """
+
+    def __init__(self, db_path=None, callbacks=None, horizon=HORIZON):
+        self.db_path = db_path or DB_PATH
+        self.callbacks = dict(DEFAULT_CALLBACKS, **(callbacks or {}))
+        self.horizon = horizon
+        self.fired = 0
+        self._heap = []
+        self._window_end = 0.0
+        self._last_id = 0
+        self._data_version = None
+        self._touched = set()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+        self._listener = None
+        self._conn = None
+
+    def _load(self, start, end, newer=None):
+        """
+            Pushes pending reminders due in [start, end) onto the heap,
+            or those added up to id newer since the last load due before end
+        """
+        if newer:
+            rows = self._conn.execute(
+                "SELECT id, due FROM REMINDERS WHERE id > ? AND id <= ? AND fired IS NULL AND due < ?;",
+                (self._last_id, newer, end),
+            ).fetchall()
+        else:
+            rows = self._conn.execute(
+                "SELECT id, due FROM REMINDERS WHERE fired IS NULL AND due >= ? AND due < ? AND id <= ?;",
+                (start, end, self._last_id),
+            ).fetchall()
+        for reminder_id, due in rows:
+            heapq.heappush(self._heap, (due, reminder_id))
+
+    def _refresh(self, now):
+        if self._touched:
+            touched = sorted(self._touched)
+            self._touched.clear()
+            rows = self._conn.execute(
+                """SELECT id, due FROM REMINDERS
+                WHERE id IN ({}) AND id <= ? AND fired IS NULL AND due < ?;""".format(
+                    ", ".join("?" * len(touched))
+                ),
+                touched + [self._last_id, self._window_end],
+            ).fetchall()
+            # reminders moved since they were loaded, new ones are loaded below,
+            # an entry left at the old due time is dropped when it comes up
+            for reminder_id, due in rows:
+                heapq.heappush(self._heap, (due, reminder_id))
+
+        version = self._conn.execute("PRAGMA data_version;").fetchone()[0]
+        if version != self._data_version:
+            self._data_version = version
+            last_id = self._conn.execute("SELECT coalesce(max(id), 0) FROM REMINDERS;").fetchone()[0]
+            if last_id > self._last_id:
+                self._load(None, self._window_end, newer=last_id)
+                self._last_id = last_id
+
+        if now >= self._window_end:
+            start = self._window_end or float("-inf")
+            self._window_end = now + self.horizon
+            self._load(start, self._window_end)
+
+    def _fire(self, now):
+        due_ids = []
+        while self._heap and self._heap[0][0] <= now:
+            due_ids.append(heapq.heappop(self._heap)[1])
+        if not due_ids:
+            return
+
+        cursor = self._conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        rows = cursor.execute(
+            "SELECT * FROM REMINDERS WHERE id IN ({}) AND fired IS NULL;".format(
+                ", ".join("?" * len(due_ids))
+            ),
+            due_ids,
+        ).fetchall()
+
+        results = []
+        for reminder in rows:
+            if reminder["DUE"] > now:
+                # moved later since it was loaded
+                if reminder["DUE"] < self._window_end:
+                    heapq.heappush(self._heap, (reminder["DUE"], reminder["ID"]))
+                continue
+
+            callback = self.callbacks.get(reminder["CHANNEL"], log_reminder)
+            try:
+                callback(self._conn, reminder)
+                error = None
+            except Exception as e:
+                logger.warning("Reminder %s failed: %s", reminder["ID"], e)
+                error = "{}: {}".format(type(e).__name__, e)
+            results.append((time.time(), error, reminder["ID"]))
+
+        with transaction(self._conn):
+            self._conn.executemany(
+                "UPDATE REMINDERS SET fired = ?, last_error = ? WHERE id = ?;", results
+            )
+        self.fired += len(results)
+
+    def pending(self):
+        """
+            Number of reminders held in memory
+        """
+        return len(self._heap)
+
+    def wake(self, *reminder_ids):
+        """
+            Makes the daemon look for new reminders now, reminder_ids
+            scheduled or moved are looked up whatever their id
+        """
+        with self._cond:
+            self._data_version = None
+            self._touched.update(reminder_ids)
+            self._cond.notify()
+
+    def _listen(self):
+        """
+            Binds wake_socket, None where unix sockets are unavailable
+        """
+        if not hasattr(socket, "AF_UNIX"):
+            return None
+        path = wake_socket(self.db_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            # left behind by a daemon that did not stop cleanly
+            if os.path.exists(path):
+                os.unlink(path)
+            sock.bind(path)
+        except OSError as e:
+            sock.close()
+            logger.warning(
+                "Cannot listen on %s (%s), reminders of other processes wait "
+                "for the next deadline", path, e,
+            )
+            return None
+
+        def receive():
+            with sock:
+                while not self._stopped:
+                    data = sock.recv(64)
+                    ids = [int(data)] if data.strip().isdigit() else []
+                    self.wake(*ids)
+
+        self._listener = threading.Thread(target=receive, name="corem-reminders-wake", daemon=True)
+        self._listener.start()
+        return path
+
+    def run(self):
+        """
+            Fires reminders until stop() is called, blocking the caller
+        """
+        self._conn = connect(self.db_path)
+        ensure_schema(self._conn)
+        listening = self._listen()
+        self._heap = []
+        self._window_end = 0.0
+        self._last_id = self._conn.execute(
+            "SELECT coalesce(max(id), 0) FROM REMINDERS;"
+        ).fetchone()[0]
+        self._data_version = self._conn.execute("PRAGMA data_version;").fetchone()[0]
+
+        try:
+            with self._cond:
+                while not self._stopped:
+                    now = time.time()
+                    self._refresh(now)
+                    self._fire(now)
+
+                    timeout = self._window_end - now
+                    if self._heap:
+                        timeout = min(timeout, self._heap[0][0] - time.time())
+                    if timeout > 0:
+                        self._cond.wait(timeout)
+        finally:
+            self._stopped = True
+            if listening:
+                # unblocks the listener's recv
+                _send(listening, 0)
+                os.unlink(listening)
+                self._listener.join()
+                self._listener = None
+            self._conn.close()
+            self._conn = None
+
+    def start(self):
+        """
+            Runs the daemon on a background thread
+        """
+        self._stopped = False
+        self._thread = threading.Thread(target=self.run, name="corem-reminders", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    daemon = ReminderDaemon()
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
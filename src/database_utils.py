@@ -1,19 +1,106 @@
-import pymongo
-import pathlib
 import os
+import time
 from getpass import getpass
-from dataclasses import dataclass
+from dataclasses import dataclass, astuple, replace
+from datetime import datetime
 import json
 
-from core_utils import is_invalid_email, random_salt, secure_hash, console_input
+from core_utils import (
+    is_invalid_email,
+    random_salt,
+    secure_hash,
+    session_key,
+    hash_password,
+    verify_password,
+    console_input,
+    parse_tags,
+    write_tags,
+)
+from migrations import ensure_schema
+from connection_utils import DB_PATH, transaction
+from paging_utils import (
+    PAGE_SIZE,
+    PROJECT_COLUMNS,
+    TASK_COLUMNS,
+    INTERNAL_COLUMNS,
+    EXTERNAL_COLUMNS,
+    keyset_pages,
+)
+from graph_utils import DependencyGraph, parse_dependencies
+from summary_utils import read_summary
+from history_utils import status_changes
+from cache_utils import structure_cache
+
+
+def session_file(db_path=None):
+    """
+        session.data next to the database at db_path (crator.db by default)
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(db_path or DB_PATH)), "session.data")
+
+
+SESSION_PATH = session_file()
+
+# Seconds a session lasts from login
+SESSION_TTL = 7 * 86400
+
+
+_factories = {}
+
+
+def structure_factory(structure):
+    """
+        sqlite3 row_factory building given *Structure straight from each row
+    """
+    factory = _factories.get(structure)
+    if factory is None:
+        factory = _factories[structure] = lambda cursor, row: structure(*row)
+    return factory
+
+
+def read_structures(connection, structure, sql, params=()):
+    """
+        Executes sql on a fresh cursor yielding *Structures, whose fields
+        must match the selected columns in order
+    """
+    cursor = connection.cursor()
+    cursor.row_factory = structure_factory(structure)
+    return cursor.execute(sql, params)
+
+
+def _report(error):
+    print("[!] {}".format(error))
+
+
+def _choose(pages, prompt):
+    """
+        Prints listing page by page, returns chosen id or None.
+        Rows are (id, label, detail).
+    """
+    shown = set()
+    x = "n"
+    for page in pages:
+        for row in page:
+            print("{}. {} - {}".format(row[0], row[1], row[2]))
+            shown.add(row[0])
+
+        x = input("{} (n for next page): ".format(prompt)).strip()
+        if x != "n":
+            break
 
-home_dir = str(pathlib.Path.home())
+    if not shown:
+        print("No records found\n")
+        return None
 
-if not os.path.exists(home_dir + "/.corem"):
-    os.makedirs(home_dir + "/.corem", 0o755)
+    if x == "n":
+        x = input("{}: ".format(prompt)).strip()
 
+    if not x.isdigit() or int(x) not in shown:
+        return None
+    return int(x)
 
-@dataclass
+
+@dataclass(slots=True)
 class AccountStructure:
     name: str
     mail: str
@@ -22,27 +109,44 @@ class AccountStructure:
 
 
 class AccountManager:
-    """ 
+    """
         Managing account locally and with remote service
     """
 
-    def __init__(self, connection):
+    def __init__(self, connection, session_path=None):
         self.is_authorized = False
+        self.session_key = None
+        self.session_path = session_path or SESSION_PATH
         self._conn = connection
         self._cursor = connection.cursor()
-        self._cursor.execute(
-            """
-        
-        CREATE TABLE IF NOT EXISTS ACCOUNTS (
-         MAIL           TEXT  PRIMARY KEY   NOT NULL,
-         NAME           TEXT                NOT NULL,
-         SECURITYKEY      TEXT                NOT NULL,
-         SALT           TEXT                NOT NULL);
-
-         """
-        )
+        ensure_schema(connection)
+
+    def create_account(self, mail, name, pass_phrase):
+        """
+            Creates new account without prompting, returns AccountStructure
+        """
+        mail = mail.strip().lower()
+        name = name.strip()
+
+        if (not name) or (not mail) or (not pass_phrase):
+            raise ValueError("Name, mail & password are mandatory.")
+
+        if is_invalid_email(mail):
+            raise ValueError("Unsupported email format")
+
+        salt = random_salt()
+        secure_key = hash_password(pass_phrase, salt)
+
+        with transaction(self._conn):
+            self._cursor.execute(
+                """
+                INSERT INTO ACCOUNTS(mail, name, securitykey, salt)
+                VALUES(?, ?, ?, ?); """,
+                (mail, name, secure_key, salt),
+            )
 
-        self._conn.commit()
+        self.account_data = AccountStructure(name, mail, secure_key, salt)
+        return self.account_data
 
     def new_account(self):
         """
@@ -57,34 +161,58 @@ class AccountManager:
             print("[!] Passwords do not match!!")
             return
 
-        if (not name) or (not mail) or (not pass_phrase):
-            print("[!] Name, mail & password are mandatory.")
+        try:
+            return self.create_account(mail, name, pass_phrase)
+        except ValueError as e:
+            _report(e)
+
+    def publish_account(self, collection=None):
+        """
+            Syncs local changes, the account included, with the remote
+            store and applies changes made elsewhere
+        """
+        if not self.is_authorized:
+            print("[!] Please login first!")
             return
 
-        if is_invalid_email(mail):
-            print("[!] Unsupported email format")
+        # pymongo is only needed once an account is published
+        from sync_utils import SyncEngine, mongo_collection
+
+        try:
+            report = SyncEngine(self._conn, collection or mongo_collection()).sync()
+        except Exception as e:
+            _report(e)
             return
 
-        salt = random_salt()
-        secure_key = secure_hash(pass_phrase, salt)
+        print("[*] {}".format(report))
+        return report
 
-        self._cursor.execute(
-            """
-            INSERT INTO ACCOUNTS(mail, name, securitykey, salt)
-            VALUES(?, ?, ?, ?); """,
-            (mail, name, secure_key, salt),
-        )
+    def change_account(self, name, pass_phrase):
+        """
+            Updates name & password of logged in account without prompting
+        """
+        if not self.is_authorized:
+            raise PermissionError("Please login first!")
 
-        self._conn.commit()
+        if (not name) or (not pass_phrase):
+            raise ValueError("Name and passwords are mandatory")
 
-        self.account_data = AccountStructure(name, mail, secure_key, salt)
+        salt = random_salt()
+        secure_key = hash_password(pass_phrase, salt)
+        with transaction(self._conn):
+            self._cursor.execute(
+                """UPDATE ACCOUNTS SET name = ?, securitykey = ?, salt = ? WHERE mail = ? """,
+                (name, secure_key, salt, self.account_data.mail),
+            )
 
-    def publish_account(self):
-        pass
+        self.account_data = AccountStructure(
+            name, self.account_data.mail, secure_key, salt
+        )
+        return self.account_data
 
     def update_account(self):
 
-        """ 
+        """
             User can update name & password.
             Mail id is freezed.
         """
@@ -101,18 +229,22 @@ class AccountManager:
             print("[!] Passwords do not match.")
             return
 
-        if (not name) or (not cpass):
-            print("[!] Name and passwords are mandatory")
-            return
+        try:
+            self.change_account(name, pass_phrase)
+        except ValueError as e:
+            _report(e)
 
-        salt = random_salt()
-        secure_key = secure_hash(pass_phrase, salt)
-        self._cursor.execute(
-            """UPDATE ACCOUNTS SET name = ?, securitykey = ?, salt = ? WHERE mail = ? """,
-            (name, secure_key, salt, self.account_data.mail),
-        )
+    def remove_account(self):
+        """
+            Deletes logged in account without prompting
+        """
+        if not self.is_authorized:
+            raise PermissionError("Please login first!")
 
-        self._conn.commit()
+        with transaction(self._conn):
+            self._cursor.execute(
+                """DELETE FROM ACCOUNTS WHERE mail = ? """, (self.account_data.mail,)
+            )
 
     def delete_account(self):
         """
@@ -123,31 +255,112 @@ class AccountManager:
             print("[!] Please login first!")
             return
 
-        self._cursor.execute(
-            """DELETE FROM ACCOUNTSWHERE mail = ? """, (self.account_data.mail,)
-        )
+        self.remove_account()
+
+    def authenticate(self, mail, pass_phrase):
+        """
+            Verifies credentials without prompting or touching session data.
+            Returns AccountStructure or None for invalid credentials.
+        """
+        mail = mail.strip().lower()
+        user = self._cursor.execute(
+            "Select * from ACCOUNTS WHERE mail = ?", (mail,)
+        ).fetchone()
+
+        if not user:
+            return None
+
+        matches, outdated = verify_password(pass_phrase, user[3], user[2])
+        if not matches:
+            return None
+
+        if outdated:
+            # legacy sha3 or cheaper scrypt keys are upgraded on login
+            salt = random_salt()
+            secure_key = hash_password(pass_phrase, salt)
+            with transaction(self._conn):
+                self._cursor.execute(
+                    "UPDATE ACCOUNTS SET securitykey = ?, salt = ? WHERE mail = ?;",
+                    (secure_key, salt, mail),
+                )
+            user = (user[0], user[1], secure_key, salt)
+
+        self.account_data = AccountStructure(user[1], user[0], user[2], user[3])
+        self.is_authorized = True
+        return self.account_data
+
+    def open_session(self, ttl=SESSION_TTL):
+        """
+            Starts a session of the logged in account, returns its session
+            data. The key is random and only its hash is stored in SESSIONS.
+        """
+        if not self.is_authorized:
+            raise PermissionError("Please login first!")
+
+        mail = self.account_data.mail
+        key = session_key()
+        now = time.time()
+        with transaction(self._conn):
+            self._cursor.execute("DELETE FROM SESSIONS WHERE EXPIRES <= ?;", (now,))
+            self._cursor.execute(
+                "INSERT INTO SESSIONS(KEY, MAIL, CREATED, EXPIRES) VALUES (?, ?, ?, ?);",
+                (secure_hash(key, mail), mail, now, now + ttl),
+            )
+        self.session_key = key
+        return {
+            "session-type": "local",
+            "session-id": mail,
+            "session-key": key,
+            "expires": now + ttl,
+        }
+
+    def resume_session(self, mail, key):
+        """
+            Logs in with the data of an open session without prompting.
+            Returns AccountStructure or None for unknown, expired or
+            revoked sessions.
+        """
+        mail = mail.strip().lower()
+        user = self._cursor.execute(
+            """SELECT a.* FROM SESSIONS s JOIN ACCOUNTS a ON a.MAIL = s.MAIL
+            WHERE s.KEY = ? AND s.MAIL = ? AND s.EXPIRES > ?;""",
+            (secure_hash(key, mail), mail, time.time()),
+        ).fetchone()
+        if not user:
+            return None
+
+        self.account_data = AccountStructure(user[1], user[0], user[2], user[3])
+        self.is_authorized = True
+        self.session_key = key
+        return self.account_data
 
-        self._conn.commit()
+    def close_session(self, mail, key):
+        """
+            Revokes a session, returns whether it was open
+        """
+        mail = mail.strip().lower()
+        with transaction(self._conn):
+            revoked = self._cursor.execute(
+                "DELETE FROM SESSIONS WHERE KEY = ? AND MAIL = ?;", (secure_hash(key, mail), mail)
+            ).rowcount
+        if key == self.session_key:
+            self.session_key = None
+        return revoked > 0
 
     def login(self):
         """
             Logs user in and maintains session
         """
         try:
-            with open(home_dir + "/.corem/session.data", "r") as f:
+            with open(self.session_path, "r") as f:
                 data = json.load(f)
-            if data["session-type"] == "local":
-                user = self._cursor.execute(
-                    "Select * from ACCOUNTS WHERE mail = ?", (data["session-id"],)
-                ).fetchone()
-                if data["session-key"] == secure_hash(data["session-id"], user[1]):
-                    self.account_data = AccountStructure(
-                        user[0], user[1], user[2], user[3]
-                    )
-                    self.is_authorized = True
-                    return data["session-id"]
+            if data["session-type"] == "local" and self.resume_session(
+                data["session-id"], data["session-key"]
+            ):
+                return self.account_data.mail
         except:
-            print("No local or remote session found, falling back to login mode.")
+            pass
+        print("No local or remote session found, falling back to login mode.")
 
         mail = input("Enter email: ").strip().lower()
         password = getpass("Enter passphrase: ").strip()
@@ -156,35 +369,30 @@ class AccountManager:
             print("[!] email and password is required.")
             return None
 
-        user = self._cursor.execute(
-            "Select * from ACCOUNTS WHERE mail = ?", (mail,)
-        ).fetchone()
-        if user[2] == secure_hash(password, user[3]):
-            data = {
-                "session-type": "local",
-                "session-id": mail,
-                "session-key": secure_hash(mail, user[1]),
-            }
-            with open(home_dir + "/.corem/session.data", "w") as f:
-                json.dump(data, f)
-
-            self.account_data = AccountStructure(user[0], user[1], user[2], user[3])
-            self.is_authorized = True
-            return mail
-        else:
+        account = self.authenticate(mail, password)
+        if not account:
             print("[!] Invalid credentials.")
             return None
 
+        data = self.open_session()
+        os.makedirs(os.path.dirname(self.session_path), 0o755, exist_ok=True)
+        with open(self.session_path, "w") as f:
+            json.dump(data, f)
+
+        return mail
+
     def sign_out(self):
         """
-            Sign out user and clear session data
+            Sign out user, revoke the session and clear session data
         """
+        if self.session_key is not None:
+            self.close_session(self.account_data.mail, self.session_key)
         self.is_authorized = False
-        os.remove(home_dir + "/.corem/session.data")
+        os.remove(self.session_path)
         del self.account_data
 
 
-@dataclass
+@dataclass(slots=True)
 class ProjectStructure:
     key: int
     name: str
@@ -196,65 +404,188 @@ class ProjectStructure:
     author: str
 
 
+@dataclass(slots=True)
+class ProjectFileStructure:
+    key: int
+    project_id: int
+    task_id: int
+    name: str
+    hash: str
+    author: str
+
+
+ATTACHMENT_TYPES = (".md", ".html", ".pdf")
+
+
 class ProjectManager:
     """
-        Project class manages project and consist of properties:- 
-            project name, 
-            category, 
-            tags, 
-            description,  
-            start & end date. 
-        
+        Project class manages project and consist of properties:-
+            project name,
+            category,
+            tags,
+            description,
+            start & end date.
+
         Detailed-docs can also be added allowing .md and .html and .pdf descriptions.
+        Attached files live once in the content-addressed blob store however
+        many projects & tasks they are attached to.
     """
 
-    def __init__(self, connection, author):
+    def __init__(self, connection, author, blobs=None):
         self.author = author
         self._conn = connection
         self._cursor = connection.cursor()
-        self._cursor.execute(
-            """
-        
-        CREATE TABLE IF NOT EXISTS PROJECTS (
-         ID            INTEGER   PRIMARY KEY AUTOINCREMENT   NOT NULL ,
-         NAME           TEXT                        NOT NULL,
-         CATEGORY       TEXT                        NOT NULL,
-         TAGS           TEXT                        NOT NULL,
-         DESCRIPTION    TEXT                        NOT NULL,
-         START          TEXT                        NOT NULL,
-         END            TEXT                        NOT NULL,
-         CREATED_BY      TEXT                        NOT NULL
-         );
-
-         """
-        )
+        ensure_schema(connection)
+        self._blobs = blobs
+        self.cache = structure_cache(connection)
 
-        self._conn.commit()
+    @property
+    def blobs(self):
+        if self._blobs is None:
+            from blob_utils import BlobStore
 
-    def project_summary(self):
-        pass
+            self._blobs = BlobStore(self._conn)
+        return self._blobs
+
+    def project_summary(self, project_id):
+        """
+            Task counts by status & priority, overdue tasks and log volume,
+            read from summary maintained on every task & log write
+        """
+        return read_summary(self._conn, int(project_id))
+
+    def fetch_project(self, project_id):
+        """
+            Returns ProjectStructure for given id or None, shared with
+            every other reader of the connection until it is written
+        """
+        project_id = int(project_id)
+        project = self.cache.get("project", project_id)
+        if project:
+            return project
+
+        project = read_structures(
+            self._conn, ProjectStructure, "Select * from Projects where id=?;", (project_id,)
+        ).fetchone()
+        if not project:
+            return None
+        return self.cache.put("project", project_id, project)
+
+    def list_projects(self):
+        return read_structures(self._conn, ProjectStructure, "Select * from Projects;").fetchall()
+
+    def iter_projects(
+        self,
+        columns=("id", "name", "description"),
+        author=None,
+        category=None,
+        order_by="id",
+        descending=False,
+        page_size=PAGE_SIZE,
+    ):
+        """
+            Yields pages of projects with only the requested columns
+        """
+        return keyset_pages(
+            self._conn,
+            "PROJECTS",
+            PROJECT_COLUMNS,
+            columns,
+            {"created_by": author, "category": category},
+            order_by,
+            descending,
+            page_size,
+        )
 
     def select_project(self):
         print("Select Project: ")
-        i = 0
-        for row in self._cursor.execute("Select * from Projects;"):
-            print("{}. {} - {}".format(row[0], row[1], row[4]))
-            i += 1
-
-        if i < 1:
+        x = _choose(self.iter_projects(page_size=20), "Enter Project id")
+        if not x:
             return None
-            
-        x = input("Enter Project id: ").strip()
-        if not x or int(x) > i:
-            return
 
-       
         print("Project with id: {} selected.".format(x))
         return int(x)
 
+    def create_project(self, name, category, tags, description, start, end):
+        """
+            Creates project without prompting, returns ProjectStructure
+        """
+        if (
+            (not name)
+            or (not category)
+            or (not tags)
+            or (not description)
+            or (not start)
+            or (not end)
+        ):
+            raise ValueError("Insufficient fields!!")
+
+        self.cache.validate()
+        with transaction(self._conn):
+            self._cursor.execute(
+                """
+                INSERT INTO PROJECTS(name, category, tags, description, start, end, created_by)
+                VALUES(?, ?, ?, ?, ?, ?, ?); """,
+                (name, category, tags, description, start, end, self.author),
+            )
+            self._write_tags(self._cursor.lastrowid, tags)
+
+            project_data = ProjectStructure(
+                self._cursor.lastrowid,
+                name,
+                category,
+                tags,
+                description,
+                start,
+                end,
+                self.author,
+            )
+        self.cache.wrote("project", project_data.key, project_data)
+        return project_data
+
+    def _write_tags(self, project_id, tags):
+        write_tags(self._cursor, project_id, tags)
+
+    def projects_with_tags(self, tags, match="all"):
+        """
+            Returns ProjectStructures tagged with all (or any) of given tags
+        """
+        if match not in ("all", "any"):
+            raise ValueError("match should be all or any")
+
+        names = parse_tags(tags) if isinstance(tags, str) else parse_tags(",".join(tags))
+        if not names:
+            return []
+
+        return read_structures(
+            self._conn,
+            ProjectStructure,
+            """SELECT p.* FROM TAGS t
+            JOIN PROJECT_TAGS pt ON pt.tag_id = t.id
+            JOIN PROJECTS p ON p.id = pt.project_id
+            WHERE t.name IN ({})
+            GROUP BY p.id HAVING count(*) >= ?
+            ORDER BY p.id;""".format(", ".join("?" * len(names))),
+            names + [len(names) if match == "all" else 1],
+        ).fetchall()
+
+    def tag_counts(self):
+        """
+            Returns [(tag, number of projects)] most used first
+        """
+        return self._cursor.execute(
+            """SELECT t.name, count(*) FROM TAGS t
+            JOIN PROJECT_TAGS pt ON pt.tag_id = t.id
+            GROUP BY t.id ORDER BY count(*) DESC, t.name;"""
+        ).fetchall()
+
+    def save_project(self, project):
+        """
+            Inserts a ProjectStructure (key is ignored), returns the stored copy
+        """
+        return self.create_project(*astuple(project)[1:7])
 
     def new_project(self):
-        # TODO : Add files support
         name = input("Enter project name: ").strip()
         category = input("Enter project category: ").strip()
         tags = input("Enter tags separated by comma(,): ").strip()
@@ -264,96 +595,171 @@ class ProjectManager:
             "Enter end date (as dd-mm-yyyy) (use -1 for leaving blank): "
         ).strip()
 
-        if (
-            (not name)
-            or (not category)
-            or (not tags)
-            or (not description)
-            or (not start)
-            or (not end)
-        ):
-            print("[!] Insufficient fields!!")
+        try:
+            project_data = self.create_project(name, category, tags, description, start, end)
+        except ValueError as e:
+            _report(e)
             return None
 
-        self._cursor.execute(
-            """
-            INSERT INTO PROJECTS(name, category, tags, description, start, end, created_by)
-            VALUES(?, ?, ?, ?, ?, ?, ?); """,
-            (name, category, tags, description, start, end, self.author),
-        )
-
-        project_data = ProjectStructure(
-            self._cursor.lastrowid,
-            name,
-            category,
-            tags,
-            description,
-            start,
-            end,
-            self.author,
-        )
-
-        self._conn.commit()
+        if input("Attach files (.md, .html, .pdf)? y/N: ").strip() in ("y", "yes"):
+            self.add_files(project_data.key)
         return project_data
 
-    def add_files(self):
-        pass
+    def attach_file(self, project_id, path, task_id=None, name=None):
+        """
+            Attaches a .md, .html or .pdf file to a project (or one of its tasks)
+            without prompting, returns ProjectFileStructure
+        """
+        name = name or os.path.basename(path)
+        if os.path.splitext(name)[1].lower() not in ATTACHMENT_TYPES:
+            raise ValueError(
+                "Only {} files can be attached".format(", ".join(ATTACHMENT_TYPES))
+            )
+        if not self.fetch_project(project_id):
+            raise ValueError("No project with id: {}".format(project_id))
+        if task_id is not None and not self._cursor.execute(
+            "SELECT 1 FROM TASKS WHERE id = ? AND project_id = ?;",
+            (int(task_id), int(project_id)),
+        ).fetchone():
+            raise ValueError("No task {} in project {}".format(task_id, project_id))
+
+        digest = self.blobs.put(path)
+        with transaction(self._conn):
+            self._cursor.execute(
+                """INSERT INTO PROJECT_FILES(project_id, task_id, name, hash, created_by)
+                VALUES (?, ?, ?, ?, ?);""",
+                (int(project_id), task_id, name, digest, self.author),
+            )
+            file_data = ProjectFileStructure(
+                self._cursor.lastrowid, int(project_id), task_id, name, digest, self.author
+            )
+        self.blobs.evict(keep=(digest,))
+        return file_data
 
-    def delete_project(self, x):
-        # print("Select Project to delete: ")
-        # i = 0
+    def list_files(self, project_id, task_id=None):
+        """
+            Returns ProjectFileStructures of a project, or only of one task
+        """
+        if task_id is None:
+            sql, params = "project_id = ?", (int(project_id),)
+        else:
+            sql, params = "project_id = ? AND task_id = ?", (int(project_id), int(task_id))
+        return read_structures(
+            self._conn,
+            ProjectFileStructure,
+            "SELECT * FROM PROJECT_FILES WHERE {} ORDER BY id;".format(sql),
+            params,
+        ).fetchall()
+
+    def file_path(self, file_id):
+        """
+            Local path to the content of an attached file
+        """
+        row = self._cursor.execute(
+            "SELECT hash FROM PROJECT_FILES WHERE id = ?;", (int(file_id),)
+        ).fetchone()
+        if not row:
+            raise ValueError("No file with id: {}".format(file_id))
+        return self.blobs.path(row[0])
 
-        # for row in self._cursor.execute("Select * from Projects;"):
-        #     print("{}. {} - {}".format(row[0], row[1], row[4]))
-        #     i += 1
+    def remove_file(self, file_id):
+        """
+            Detaches a file, its blob stays until evicted or collected
+        """
+        with transaction(self._conn):
+            self._cursor.execute(
+                "DELETE FROM PROJECT_FILES WHERE id = ?;", (int(file_id),)
+            )
 
-        # x = input("Enter Project No to delete: ").strip()
-        # if not x or int(x) > i:
-        #     return
+    def add_files(self, x):
+        """
+            Attach files to a project, or one of its tasks
+        """
+        paths = input("Enter file paths separated by comma(,): ").strip()
+        task_id = input("Enter task id (or return for the whole project): ").strip()
+
+        attached = []
+        for path in paths.split(","):
+            path = os.path.expanduser(path.strip())
+            if not path:
+                continue
+            try:
+                attached.append(self.attach_file(x, path, int(task_id) if task_id else None))
+            except (OSError, ValueError) as e:
+                _report(e)
+        return attached
+
+    def remove_project(self, project_id):
+        """
+            Deletes project with related tasks and contacts without prompting
+        """
+        # Tasks, task logs, internals & externals go with it via ON DELETE CASCADE
+        with transaction(self._conn):
+            self._cursor.execute(
+                "DELETE FROM PROJECTS WHERE id=? ;", (int(project_id),)
+            )
+        # cascaded tasks may be cached too
+        self.cache.clear()
 
+    def delete_project(self, x):
         conf = input(
             "Are you sure you want to delete the project? (All related tasks will also be deleted) y/N:"
         ).strip()
 
-        if conf != "y" or conf != "yes":
+        if conf not in ("y", "yes"):
             return
 
-        self._cursor.execute("DELETE FROM PROJECTS WHERE id=? ;", x)
-        self._cursor.execute("DELETE FROM TASKS WHERE project_id=? ;", x)
-        self._cursor.execute("DELETE FROM INTERNALS WHERE project_id=? ;", x)
-        self._cursor.execute("DELETE FROM EXTERNALS WHERE project_id=? ;", x)
-        # self._cursor.execute("DELETE FROM REMINDERS WHERE id=? ;", x)
+        self.remove_project(x)
+
+    def edit_project(
+        self,
+        project_id,
+        name=None,
+        category=None,
+        tags=None,
+        description=None,
+        start=None,
+        end=None,
+    ):
+        """
+            Updates project details without prompting, blank fields are kept.
+            Returns updated ProjectStructure.
+        """
+        current = self.fetch_project(project_id)
+        if not current:
+            raise ValueError("No project with id: {}".format(project_id))
+
+        project_data = replace(
+            current,
+            name=name or current.name,
+            category=category or current.category,
+            tags=tags or current.tags,
+            description=description or current.description,
+            start=start or current.start,
+            end=end or current.end,
+        )
 
-        self._conn.commit()
+        with transaction(self._conn):
+            self._cursor.execute(
+                """UPDATE PROJECTS SET name = ?, category = ?, tags = ?, description = ?, start = ?, end = ? WHERE id = ? ;""",
+                (
+                    project_data.name,
+                    project_data.category,
+                    project_data.tags,
+                    project_data.description,
+                    project_data.start,
+                    project_data.end,
+                    project_data.key,
+                ),
+            )
+            self._write_tags(project_data.key, project_data.tags)
+        self.cache.wrote("project", project_data.key, project_data)
+        return project_data
 
     def update_project(self, x):
         """
             Allow updating project details
         """
-
-        # print("Select Project to update: ")
-        # i = 0
-        # print("ID. NAME  -  DESCRIPTION")
-        # for row in self._cursor.execute("Select * from Projects;"):
-        #     print("{}. {} - {}".format(row[0], row[1], row[4]))
-        #     i += 1
-
-        # x = input("Enter Project id to update: ").strip()
-
-        # if (not x) or int(x) > i:
-        #     return
-
-        project = self._cursor("Select * from Projects where id=?", x).fetchone()
-        project_data = ProjectStructure(
-            project[0],
-            project[1],
-            project[2],
-            project[3],
-            project[4],
-            project[5],
-            project[6],
-            project[7],
-        )
         name = input("Enter project's new name: ").strip()
         category = input("Enter project category: ").strip()
         tags = input("Enter tags separated by comma(,): ").strip()
@@ -363,33 +769,13 @@ class ProjectManager:
             "Enter end date (as dd-mm-yyyy) (use -1 for leaving blank): "
         ).strip()
 
-        if not name:
-            name = project_data.name
-
-        if not category:
-            category = project_data.category
-
-        if not tags:
-            tags = project_data.tags
-
-        if not description:
-            description = project_data.description
-
-        if not start:
-            start = project_data.start
-
-        if not end:
-            end = project_data.end
-
-        self._cursor.execute(
-            """UPDATE PROJECTS SET name = ?, category = ?, tags = ?, description = ?, start = ?, end = ? WHERE id = ? ;""",
-            (name, category, tags, description, start, end, x),
-        )
-
-        self._conn.commit()
+        try:
+            return self.edit_project(x, name, category, tags, description, start, end)
+        except ValueError as e:
+            _report(e)
 
 
-@dataclass
+@dataclass(slots=True)
 class TaskStructure:
     key: int
     priority: str
@@ -404,18 +790,49 @@ class TaskStructure:
     author: str
 
 
-@dataclass
+@dataclass(slots=True)
 class TaskLogStructure:
     key: int
     status: str
     status_info: str
     task_id: int
     created_by: str
+    ts: float
+
+
+@dataclass(slots=True)
+class ReminderStructure:
+    key: int
+    task_id: int
+    due: float
+    message: str
+    channel: str
+    recipient: str
+    author: str
+    fired: float = None
+    last_error: str = None
+
+
+def validate_task_fields(priority, objective, start, status, status_info, dependent_on):
+    """
+        Raises ValueError if mandatory task fields are missing
+    """
+    if (
+        (not priority)
+        or (not objective)
+        or (not start)
+        or (not status)
+        or (not status_info)
+        or (not dependent_on)
+    ):
+        raise ValueError(
+            "Please provide priority, objective, start date, current status & status description & dependent tasks."
+        )
 
 
 class TaskManager:
     """
-        A Task is an activity which needs to be completed. 
+        A Task is an activity which needs to be completed.
         A task has:
             - task-id
             - priority
@@ -435,73 +852,205 @@ class TaskManager:
         self._conn = connection
         self._cursor = connection.cursor()
         self.task = None
-        self._cursor.execute(
-            """
-        
-        CREATE TABLE IF NOT EXISTS TASKS (
-         ID            INTEGER   PRIMARY KEY  AUTOINCREMENT  NOT NULL,
-         PRIORITY       TEXT                        NOT NULL,
-         OBJECTIVE      TEXT                        NOT NULL,
-         DESCRIPTION    TEXT                        NOT NULL,
-         START          TEXT                        NOT NULL,
-         END            TEXT                        NOT NULL,
-         STATUS         TEXT                        NOT NULL,
-         STATUS_INFO    TEXT                        NOT NULL, 
-         DEPENDENT_ON   TEXT                        NOT NULL,
-         PROJECT_ID     INTEGER                     NOT NULL,       
-         CREATED_BY      TEXT                        NOT NULL
-         ); """
-         
-         )
-
-        self._cursor.execute("""
-        CREATE TABLE IF NOT EXISTS TASKLOGS (
-         ID            INTEGER   PRIMARY KEY  AUTOINCREMENT  NOT NULL,
-         STATUS         TEXT                        NOT NULL,
-         STATUS_INFO    TEXT                        NOT NULL,
-         TASK_ID        INTEGER                        NOT NULL,       
-         CREATED_BY     TEXT                        NOT NULL
-         );
-         """
-        )
-
-        self._conn.commit()
+        self._graph = None
+        ensure_schema(connection)
+        self.cache = structure_cache(connection)
 
+    def dependency_graph(self, refresh=False):
+        """
+            Dependency graph of project's tasks, built once and then kept
+            current by create_task, edit_task & remove_task
+        """
+        if self._graph is None or refresh:
+            self._graph = DependencyGraph.from_project(self._conn, self.project_id)
+        return self._graph
 
-    def _select_task(self):
-        print("Select Project: ")
-        i = 0
-        for row in self._cursor.execute("Select * from Tasks where project_id=?;",(self.project_id, )):
-            print("{}. {} - {}".format(row[0], row[1], row[4]))
-            i += 1
+    def dependencies_of(self, task_id):
+        """
+            Tasks given task depends on, as TaskStructures
+        """
+        return read_structures(
+            self._conn,
+            TaskStructure,
+            """SELECT t.* FROM TASK_DEPENDENCIES d JOIN TASKS t ON t.ID = d.DEPENDS_ON
+            WHERE d.TASK_ID = ?;""",
+            (int(task_id),),
+        ).fetchall()
+
+    def dependents_of(self, task_id):
+        """
+            Tasks depending on given task, as TaskStructures
+        """
+        return read_structures(
+            self._conn,
+            TaskStructure,
+            """SELECT t.* FROM TASK_DEPENDENCIES d JOIN TASKS t ON t.ID = d.TASK_ID
+            WHERE d.DEPENDS_ON = ?;""",
+            (int(task_id),),
+        ).fetchall()
+
+    def fetch_task(self, task_id):
+        """
+            Returns TaskStructure for given id or None, shared with
+            every other reader of the connection until it is written
+        """
+        task_id = int(task_id)
+        task = self.cache.get("task", task_id)
+        if task:
+            return task
 
-        if i<1:
-            print("No records found\n")
+        task = read_structures(
+            self._conn, TaskStructure, "Select * from Tasks where id=?;", (task_id,)
+        ).fetchone()
+        if not task:
             return None
-        
-        x = input("Enter Task id: ").strip()
-        if not x or int(x) > i:
+        return self.cache.put("task", task_id, task)
+
+    def list_tasks(self):
+        return read_structures(
+            self._conn,
+            TaskStructure,
+            "Select * from Tasks where project_id=?;", (self.project_id,)
+        ).fetchall()
+
+    def iter_tasks(
+        self,
+        columns=("id", "objective", "status"),
+        status=None,
+        priority=None,
+        author=None,
+        order_by="id",
+        descending=False,
+        page_size=PAGE_SIZE,
+    ):
+        """
+            Yields pages of project's tasks with only the requested columns
+        """
+        return keyset_pages(
+            self._conn,
+            "TASKS",
+            TASK_COLUMNS,
+            columns,
+            {
+                "project_id": self.project_id,
+                "status": status,
+                "priority": priority,
+                "created_by": author,
+            },
+            order_by,
+            descending,
+            page_size,
+        )
+
+    def _select_task(self):
+        print("Select Task: ")
+        x = _choose(self.iter_tasks(page_size=20), "Enter Task id")
+        if not x:
             return None
 
-        row = self._cursor.execute("Select * from Tasks where id=?;",(int(x))).fetchone()
         print("Task with id: {} selected.".format(x))
-        self.task = TaskStructure(
-            row[0],
-            row[1],
-            row[2],
-            row[3],
-            row[4],
-            row[5],
-            row[6],
-            row[7],
-            row[8],
-            row[9],
-            row[10],
-        )
+        self.task = self.fetch_task(x)
         return int(x)
 
+    def _check_dependencies(self, dependencies, task_id=None):
+        """
+            Raises ValueError unless every dependency is a task of this
+            project, and for an existing task_id, depending on them keeps
+            the graph acyclic
+        """
+        if dependencies:
+            known = {
+                row[0]
+                for row in self._cursor.execute(
+                    "SELECT ID FROM TASKS WHERE PROJECT_ID = ? AND ID IN ({});".format(
+                        ", ".join("?" * len(dependencies))
+                    ),
+                    [self.project_id] + sorted(dependencies),
+                )
+            }
+            unknown = sorted(dependencies - known)
+            if unknown:
+                raise ValueError(
+                    "No task with id {} in this project".format(", ".join(map(str, unknown)))
+                )
+
+        if task_id is not None:
+            cycle = self.dependency_graph().would_cycle(task_id, dependencies)
+            if cycle:
+                raise ValueError(
+                    "Dependency cycle: {}".format(" -> ".join(str(node) for node in cycle))
+                )
+
+    def create_task(
+        self,
+        priority,
+        objective,
+        description,
+        start,
+        end,
+        status,
+        status_info,
+        dependent_on="-1",
+    ):
+        """
+            Adds task to project without prompting, returns TaskStructure
+        """
+        validate_task_fields(priority, objective, start, status, status_info, dependent_on)
+        dependencies = parse_dependencies(dependent_on)
+
+        self.cache.validate()
+        with transaction(self._conn):
+            if not self._cursor.execute(
+                "SELECT 1 FROM PROJECTS WHERE ID = ?;", (self.project_id,)
+            ).fetchone():
+                raise ValueError("No project with id: {}".format(self.project_id))
+            # a new task has no dependents yet, so existing dependencies cannot cycle
+            self._check_dependencies(dependencies)
+            self._cursor.execute(
+                """
+                 INSERT INTO TASKS(priority, objective, description, start, end, status, status_info,dependent_on, project_id, created_by)
+                VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?); """,
+                (
+                    priority,
+                    objective,
+                    description,
+                    start,
+                    end,
+                    status,
+                    status_info,
+                    dependent_on,
+                    self.project_id,
+                    self.author,
+                ),
+            )
+
+            self.task = TaskStructure(
+                self._cursor.lastrowid,
+                priority,
+                objective,
+                description,
+                start,
+                end,
+                status,
+                status_info,
+                dependent_on,
+                self.project_id,
+                self.author,
+            )
+        self.cache.wrote("task", self.task.key, self.task)
+
+        if self._graph is not None:
+            self._graph.set_task(self.task.key, dependencies, start, end)
+        return self.task
+
+    def save_task(self, task):
+        """
+            Inserts a TaskStructure into current project (key, project_id & author are ignored)
+        """
+        return self.create_task(*astuple(task)[1:9])
+
     def add_task(self):
-        """ 
+        """
             Add task to projects
         """
 
@@ -518,52 +1067,56 @@ class TaskManager:
 
         fields = console_input(statements)
 
-        if (
-            (not fields[0])
-            or (not fields[1])
-            or (not fields[3])
-            or (not fields[5])
-            or (not fields[6])
-            or (not fields[7])
-        ):
-            print(
-                "[!] Please provide priority, objective, start date, current status & status description & dependent tasks."
-            )
+        try:
+            return self.create_task(*fields)
+        except ValueError as e:
+            _report(e)
             return None
 
-        self._cursor.execute(
-            """ 
-             INSERT INTO TASKS(priority, objective, description, start, end, status, status_info,dependent_on, project_id, created_by)
-            VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?); """,
-            (
-                fields[0],
-                fields[1],
-                fields[2],
-                fields[3],
-                fields[4],
-                fields[5],
-                fields[6],
-                fields[7],
-                self.project_id,
-                self.author,
-            ),
-        )
+    def create_task_log(self, task_id, status, status_info):
+        """
+            Logs task status without prompting, returns TaskLogStructure
+        """
+        if (not status) or (not status_info):
+            raise ValueError("Please provide status and status description.")
+
+        ts = time.time()
+        self.cache.validate()
+        with transaction(self._conn):
+            if not self._cursor.execute(
+                "SELECT 1 FROM TASKS WHERE ID = ? AND PROJECT_ID = ?;", (task_id, self.project_id)
+            ).fetchone():
+                raise ValueError("No task with id: {}".format(task_id))
+            self._cursor.execute(
+                """
+                INSERT INTO TASKLOGS (status, status_info, task_id, created_by, ts)
+                VALUES(?, ?, ?, ?, ?);
+             """,
+                (status, status_info, task_id, self.author, ts),
+            )
 
-        self.task = TaskStructure(
-            self._cursor.lastrowid,
-            fields[0],
-            fields[1],
-            fields[2],
-            fields[3],
-            fields[4],
-            fields[5],
-            fields[6],
-            fields[7],
-            self.project_id,
-            self.author
-        )
+            log = TaskLogStructure(
+                self._cursor.lastrowid, status, status_info, task_id, self.author, ts
+            )
+
+            self._cursor.execute(
+                """UPDATE TASKS SET status = ?, status_info = ? WHERE id = ? ;""",
+                (status, status_info, task_id),
+            )
 
-        self._conn.commit()
+        if self.task and self.task.key == task_id:
+            self.task = replace(self.task, status=status, status_info=status_info)
+        self.cache.wrote("task", int(task_id))
+        return log
+
+    def task_history(self, task_id=None, start=None, end=None):
+        """
+            Status changes of a task, or of the whole project, in [start, end)
+            in time order, as StatusChanges
+        """
+        if task_id is None:
+            return status_changes(self._conn, self.project_id, start=start, end=end)
+        return status_changes(self._conn, task_id=int(task_id), start=start, end=end)
 
     def add_task_log(self):
         if not self.task:
@@ -572,31 +1125,111 @@ class TaskManager:
         if not self.task:
             return
 
-        statements = ["Enter current status: ", "Enter status description"]
+        statements = ["Enter current status: ", "Enter status description: "]
         fields = console_input(statements)
 
-        if (not fields[0]) or (not fields[1]):
-            print("[!] Please provide status and status description.")
+        try:
+            return self.create_task_log(self.task.key, fields[0], fields[1])
+        except ValueError as e:
+            _report(e)
             return None
 
-        self._cursor.execute(
-            """
-            INSERT INTO TASKLOGS (status, status_info, task_id, created_by)
-            VALUES(?, ?, ?, ?);
-         """,
-            (fields[0], fields[1], self.task.key, self.author),
-        )
+    def create_reminder(self, task_id, due, message, channel="notify", recipient=None):
+        """
+            Schedules a reminder without prompting, returns ReminderStructure.
+            due is a datetime or unix timestamp, mail goes to the author
+            unless a recipient is given.
+        """
+        from daemons import REMINDER_CHANNELS, signal_daemon
 
-        self._cursor.execute(
-            """UPDATE TASKS SET status = ?, status_info = ? WHERE id = ? ;""",
-            (fields[0], fields[1], self.task.key),
+        if channel not in REMINDER_CHANNELS:
+            raise ValueError(
+                "Unknown channel {}, choose from {}".format(channel, ", ".join(REMINDER_CHANNELS))
+            )
+        if not message:
+            raise ValueError("Please provide reminder message.")
+        if recipient and is_invalid_email(recipient):
+            raise ValueError("Unsupported email format")
+        if not self._cursor.execute(
+            "SELECT 1 FROM TASKS WHERE id = ? AND project_id = ?;",
+            (int(task_id), self.project_id),
+        ).fetchone():
+            raise ValueError("No task with id: {}".format(task_id))
+
+        due = due.timestamp() if isinstance(due, datetime) else float(due)
+        with transaction(self._conn):
+            self._cursor.execute(
+                """INSERT INTO REMINDERS(task_id, due, message, channel, recipient, created_by)
+                VALUES (?, ?, ?, ?, ?, ?);""",
+                (int(task_id), due, message, channel, recipient, self.author),
+            )
+        reminder = ReminderStructure(
+            self._cursor.lastrowid, int(task_id), due, message, channel, recipient, self.author
         )
+        signal_daemon(self._conn, reminder.key)
+        return reminder
+
+    def reschedule_reminder(self, reminder_id, due):
+        """
+            Moves a pending reminder of this project to due, a datetime or
+            unix timestamp
+        """
+        from daemons import signal_daemon
+
+        due = due.timestamp() if isinstance(due, datetime) else float(due)
+        with transaction(self._conn):
+            self._cursor.execute(
+                """UPDATE REMINDERS SET due = ? WHERE id = ? AND fired IS NULL
+                AND task_id IN (SELECT id FROM TASKS WHERE project_id = ?);""",
+                (due, int(reminder_id), self.project_id),
+            )
+            if not self._cursor.rowcount:
+                raise ValueError("No pending reminder with id: {}".format(reminder_id))
+        signal_daemon(self._conn, reminder_id)
 
-        self._conn.commit()
+    def list_reminders(self, task_id):
+        return read_structures(
+            self._conn,
+            ReminderStructure,
+            "SELECT * FROM REMINDERS WHERE task_id = ? ORDER BY due;", (int(task_id),)
+        ).fetchall()
 
     def add_reminder(self):
-        # Beta feature:- uses daemon to show desktop notification.
-        pass
+        """
+            Schedule a reminder on a task, fired by the reminder daemon
+            (python daemons.py) as desktop notification, log entry or mail
+        """
+        if not self.task:
+            self._select_task()
+
+        if not self.task:
+            return
+
+        when = input("Remind at (as dd-mm-yyyy HH:MM): ").strip()
+        message = input("Enter reminder message: ").strip()
+        channel = input("Notify by (notify, log, mail) [notify]: ").strip() or "notify"
+
+        try:
+            due = datetime.strptime(when, "%d-%m-%Y %H:%M")
+            return self.create_reminder(self.task.key, due, message, channel)
+        except ValueError as e:
+            _report(e)
+            return None
+
+    def remove_task(self, task_id):
+        """
+            Deletes task and related logs without prompting
+        """
+        self.cache.validate()
+        with transaction(self._conn):
+            self._cursor.execute(""" DELETE FROM TASKS WHERE id=? ;""", (task_id,))
+        self.cache.wrote("task", int(task_id))
+
+        if self._graph is not None:
+            self._graph.remove_task(task_id)
+
+        if self.task and self.task.key == task_id:
+            self.task = None
 
     def delete_task(self):
         """
@@ -605,21 +1238,48 @@ class TaskManager:
 
         if not self.task:
             self._select_task()
-        
+
         if not self.task:
             return
 
-        self._cursor.execute(""" DELETE FROM TASKS WHERE id=? ;""", (self.task.key,))
-        self._cursor.execute(
-            """ DELETE FROM TASKLOGS WHERE task_id = ?;""", (self.task.key,)
-        )
-        self._conn.commit()
+        self.remove_task(self.task.key)
+
+    def edit_task(self, task_id, priority, end, dependent_on):
+        """
+            Updates priority, end date & dependencies without prompting.
+            Returns updated TaskStructure.
+        """
+        if (not priority) or (not end) or (not dependent_on):
+            raise ValueError("Please provide priority, end date, & dependent tasks.")
+
+        current = self.fetch_task(task_id)
+        if not current or int(current.project_id) != int(self.project_id):
+            raise ValueError("No task with id: {}".format(task_id))
+
+        dependencies = parse_dependencies(dependent_on)
+        graph = self.dependency_graph()
+
+        task = replace(current, priority=priority, end=end, dependent_on=dependent_on)
+        with transaction(self._conn):
+            self._check_dependencies(dependencies, task.key)
+            self._cursor.execute(
+                """
+                 UPDATE TASKS set priority=?, end=?, dependent_on=? Where id=?; """,
+                (priority, end, dependent_on, task.key),
+            )
+        self.cache.wrote("task", task.key, task)
+
+        graph.set_task(task.key, dependencies, task.start, task.end)
+
+        if self.task and self.task.key == task.key:
+            self.task = task
+        return task
 
     def update_task(self):
         """
-            Update certain data about tasks 
+            Update certain data about tasks
         """
-        
+
         if not self.task:
             self._select_task()
 
@@ -634,25 +1294,14 @@ class TaskManager:
 
         fields = console_input(statements)
 
-        if (not fields[0]) or (not fields[1]) or (not fields[2]):
-            print("[!] Please provide priority, end date, & dependent tasks.")
+        try:
+            return self.edit_task(self.task.key, *fields)
+        except ValueError as e:
+            _report(e)
             return None
 
-        self._cursor.execute(
-            """ 
-             UPDATE TASKS set priority=?, end=?, dependent_on=? Where id=?
-            VALUES(?, ?, ?, ?); """,
-            (fields[0], fields[1], fields[2], self.task.key),
-        )
-
-        self._conn.commit()
-
-        self.task.priority = fields[0]
-        self.task.end = fields[1]
-        self.task.dependent_on = fields[2]
 
-
-@dataclass
+@dataclass(slots=True)
 class InternalsStructure:
     key: int
     name: str
@@ -673,22 +1322,43 @@ class Internals:
         self.author = author
         self._conn = connection
         self._cursor = connection.cursor()
-        self._cursor.execute(
-            """
-        
-        CREATE TABLE IF NOT EXISTS INTERNALS (
-         ID       INTEGER    PRIMARY KEY  AUTOINCREMENT  NOT NULL,
-         NAME      TEXT                                  NOT NULL,
-         EMAIL     TEXT                                  NOT NULL,
-         PHONE    INTEGER                                        ,
-         TASK_ID  INTEGER                                        ,
-         PROJECT_ID INTEGER                              NOT NULL,
-        );
-        
+        ensure_schema(connection)
+
+    def list_internals(self):
+        return read_structures(
+            self._conn,
+            InternalsStructure,
+            "Select * from Internals where project_id=?;", (self.project_id,)
+        ).fetchall()
+
+    def create_internal(self, name, email, phone, task_id=None, project_id=None):
         """
+            Adds internal contact without prompting, returns InternalsStructure.
+            Defaults to current project.
+        """
+        project_id = project_id or self.project_id
+
+        if (not name) or (not email) or (not phone) or (not project_id):
+            raise ValueError("Please provide neccessary details")
+
+        task_id = task_id or None
+
+        with transaction(self._conn):
+            self._cursor.execute(
+                """
+                INSERT into INTERNALS (name, email, phone, task_id, project_id)
+                VALUES (?, ?, ?, ?, ?);
+            """,
+                (name, email, phone, task_id, project_id),
+            )
+
+        self.internal = InternalsStructure(
+            self._cursor.lastrowid, name, email, phone, task_id, project_id,
         )
+        return self.internal
 
-        self._conn.commit()
+    def save_internal(self, internal):
+        return self.create_internal(*astuple(internal)[1:])
 
     def add(self):
         statements = [
@@ -701,61 +1371,47 @@ class Internals:
 
         fields = console_input(statements)
 
-        if (not fields[0]) or (not fields[1]) or (not fields[2]) or (not fields[4]):
-            print("[!] Please provide neccessary details")
+        try:
+            return self.create_internal(*fields)
+        except ValueError as e:
+            _report(e)
             return None
 
-        self._cursor.execute(
-            """ 
-            INSERT into INTERNALS (name, email, phone, task_id, project_id)
-            VALUES (?, ?, ?, ?, ?);
-        """,
-            (fields[0], fields[1], fields[2], fields[3], fields[4]),
-        )
-
-        self._conn.commit()
+    def remove_internal(self, internal_id):
+        with transaction(self._conn):
+            self._cursor.execute(
+                """ DELETE FROM INTERNALS WHERE id=?;""", (int(internal_id), )
+            )
 
-        self.internal = InternalsStructure(
-            self._cursor.lastrowid,
-            fields[0],
-            fields[1],
-            fields[2],
-            fields[3],
-            fields[4],
+    def iter_internals(
+        self, columns=("id", "name", "email"), task_id=None, page_size=PAGE_SIZE
+    ):
+        return keyset_pages(
+            self._conn,
+            "INTERNALS",
+            INTERNAL_COLUMNS,
+            columns,
+            {"project_id": self.project_id, "task_id": task_id},
+            page_size=page_size,
         )
 
     def revoke(self):
         print("Select Internal to revoke: ")
-        i = 0
-
-        for row in self._cursor.execute("Select * from Internals where project_id=?;", (self.project_id,)):
-            print("{}. {} - {}".format(row[0], row[1], row[2]))
-            i += 1
-        
-        if i<1:
-            print("No records found\n")
-            return
-        
-        x = input("Enter Internal id to revoke: ").strip()
-
-        if not x or int(x) > i:
+        x = _choose(self.iter_internals(page_size=20), "Enter Internal id to revoke")
+        if not x:
             return
 
         conf = input(
             "Are you sure you want to revoke the access? (All related tasks will also be deleted) y/N:"
         ).strip()
 
-        if conf != "y" or conf != "yes":
+        if conf not in ("y", "yes"):
             return
-            
-        self._cursor.execute(
-            """ DELETE FROM INTERNALS WHERE id=?;""", (int(x), )
-        )
 
-        self._conn.commit()
+        self.remove_internal(x)
 
 
-@dataclass
+@dataclass(slots=True)
 class ExternalsStructure:
     key: int
     name: str
@@ -765,7 +1421,7 @@ class ExternalsStructure:
 
 
 class Externals:
-    """    
+    """
         Manage external contacts to a project (indirect contributors to the project.)
     """
 
@@ -774,25 +1430,100 @@ class Externals:
         self.author = author
         self._conn = connection
         self._cursor = connection.cursor()
-        self._cursor.execute(
-            """
-        
-        CREATE TABLE IF NOT EXISTS EXTERNALS (
-         ID       INTEGER    PRIMARY KEY  AUTOINCREMENT  NOT NULL,
-         NAME      TEXT                                  NOT NULL,
-         EMAIL     TEXT                                  NOT NULL,
-         PHONE    INTEGER                                        ,
-         PROJECT_ID INTEGER                              NOT NULL,
-        );
-        
+        ensure_schema(connection)
+
+    def notify(self, subject, body, external_ids=None, internals=False):
         """
-        )
+            Queues mail to given externals (all of the project by default),
+            plus internals when set, without prompting. Returns number queued.
+        """
+        from mail_utils import enqueue_mail, enqueue_project_mail
+
+        if (not subject) or (not body):
+            raise ValueError("Subject and message are mandatory")
 
-        self._conn.commit()
+        if external_ids is None:
+            return enqueue_project_mail(
+                self._conn, self.project_id, subject, body, self.author, internals=internals
+            )
+
+        external_ids = [int(key) for key in external_ids]
+        if not external_ids and not internals:
+            raise ValueError("Select at least one external or include internals")
+
+        recipients = []
+        if external_ids:
+            recipients = [
+                row[0]
+                for row in self._cursor.execute(
+                    "SELECT email FROM EXTERNALS WHERE project_id = ? AND id IN ({});".format(
+                        ", ".join("?" * len(external_ids))
+                    ),
+                    [self.project_id] + external_ids,
+                ).fetchall()
+            ]
+        if internals:
+            internal = Internals(self.project_id, self.author, self._conn)
+            recipients += [contact.email for contact in internal.list_internals()]
+        return enqueue_mail(
+            self._conn, recipients, subject, body, self.project_id, self.author
+        )
 
     def make_contact(self):
-        # TODO: Add mailing service here
-        pass
+        """
+            Mail externals of the project, mail is queued & sent in background
+        """
+        ids = input("Enter external ids separated by comma(,) (or return for all): ").strip()
+        internals = input("Include internals? y/N: ").strip() in ("y", "yes")
+        subject = input("Enter subject: ").strip()
+        body = input("Enter message: ").strip()
+
+        try:
+            count = self.notify(
+                subject,
+                body,
+                [key for key in ids.split(",") if key.strip()] if ids else None,
+                internals,
+            )
+        except ValueError as e:
+            _report(e)
+            return 0
+
+        print("[*] {} mails queued.".format(count))
+        return count
+
+    def list_externals(self):
+        return read_structures(
+            self._conn,
+            ExternalsStructure,
+            "Select * from Externals where project_id=?;", (self.project_id,)
+        ).fetchall()
+
+    def create_external(self, name, email, phone, project_id=None):
+        """
+            Adds external contact without prompting, returns ExternalsStructure.
+            Defaults to current project.
+        """
+        project_id = project_id or self.project_id
+
+        if (not name) or (not email) or (not phone) or (not project_id):
+            raise ValueError("Please provide neccessary details")
+
+        with transaction(self._conn):
+            self._cursor.execute(
+                """
+                INSERT into EXTERNALS (name, email, phone, project_id)
+                VALUES (?, ?, ?, ?);
+            """,
+                (name, email, phone, project_id),
+            )
+
+        return ExternalsStructure(
+            self._cursor.lastrowid, name, email, phone, project_id
+        )
+
+    def save_external(self, external):
+        return self.create_external(*astuple(external)[1:])
 
     def add_external(self):
         statements = [
@@ -804,49 +1535,42 @@ class Externals:
 
         fields = console_input(statements)
 
-        if (not fields[0]) or (not fields[1]) or (not fields[2]) or (not fields[3]):
-            print("[!] Please provide neccessary details")
+        try:
+            return self.create_external(*fields)
+        except ValueError as e:
+            _report(e)
             return None
 
-        self._cursor.execute(
-            """ 
-            INSERT into EXTERNALS (name, email, phone, project_id)
-            VALUES (?, ?, ?, ?);
-        """,
-            (fields[0], fields[1], fields[2], fields[3]),
-        )
-
-        self._conn.commit()
+    def remove_external(self, external_id):
+        with transaction(self._conn):
+            self._cursor.execute(
+                """ DELETE FROM EXTERNALS WHERE id=?;""", (int(external_id),)
+            )
 
+    def iter_externals(self, columns=("id", "name", "email"), page_size=PAGE_SIZE):
+        return keyset_pages(
+            self._conn,
+            "EXTERNALS",
+            EXTERNAL_COLUMNS,
+            columns,
+            {"project_id": self.project_id},
+            page_size=page_size,
+        )
 
     def revoke_access(self):
         print("Select External to revoke: ")
-        i = 0
-
-        for row in self._cursor.execute("Select * from Externals where project_id=?;", (self.project_id,)):
-            print("{}. {} - {}".format(row[0], row[1], row[2]))
-            i += 1
-
-        if i<1:
-            print("No records found\n")
-            return
-
-        x = input("Enter External id to revoke: ").strip()
-
-        if not x or int(x) > i:
+        x = _choose(self.iter_externals(page_size=20), "Enter External id to revoke")
+        if not x:
             return
 
         conf = input(
             "Are you sure you want to revoke the access? (All related tasks will also be deleted) y/N:"
         ).strip()
 
-        if conf != "y" or conf != "yes":
+        if conf not in ("y", "yes"):
             return
-            
-        self._cursor.execute(
-            """ DELETE FROM EXTERNALS WHERE id=?;""", (x)
-        )
-        self._conn.commit()
+
+        self.remove_external(x)
 
 
 # Unknown why this class was created ??
@@ -0,0 +1,313 @@
+from collections import deque
+from datetime import date
+from functools import lru_cache
+
+
+def parse_dependencies(text, strict=True):
+    """
+        Parses DEPENDENT_ON text ("3,7" or "-1") into a set of task ids.
+        Invalid ids raise ValueError unless strict is False, then they are skipped.
+    """
+    ids = set()
+    for token in str(text or "").split(","):
+        token = token.strip()
+        if not token or token == "-1":
+            continue
+        if not token.isdigit():
+            if strict:
+                raise ValueError("Invalid task id in dependencies: {}".format(token))
+            continue
+        ids.add(int(token))
+    return ids
+
+
+@lru_cache(maxsize=4096)
+def parse_date(text):
+    """
+        Parses dd-mm-yyyy dates, returns None for blank, -1 or unknown formats
+    """
+    parts = str(text).strip().split("-")
+    if len(parts) != 3 or not all(part.isdigit() for part in parts):
+        return None
+    try:
+        return date(int(parts[2]), int(parts[1]), int(parts[0]))
+    except ValueError:
+        return None
+
+
+def duration(start, end):
+    """
+        Task duration in days from START & END, 0 if either is unknown
+    """
+    start, end = parse_date(start), parse_date(end)
+    if not start or not end:
+        return 0
+    return max((end - start).days, 0)
+
+
+class DependencyGraph:
+    """
+        In-memory graph of task dependencies of a project.
+        Edges point from a task to the tasks it depends on.
+        Earliest finish times are memoized and only invalidated downstream
+        of a changed task, so critical path queries stay incremental.
+    """
+
+    def __init__(self):
+        self._depends_on = {}
+        self._dependents = {}
+        self._duration = {}
+        self._finish = {}
+        # set_task refuses cycles, so only loaded data needs checking once
+        self._acyclic = True
+
+    @classmethod
+    def from_tasks(cls, rows):
+        """
+            Builds graph from (id, dependent_on, start, end) rows
+        """
+        graph = cls()
+        for task_id, dependent_on, start, end in rows:
+            graph._add_node(task_id)
+            graph._duration[task_id] = duration(start, end)
+            for dependency in parse_dependencies(dependent_on, strict=False):
+                graph._add_node(dependency)
+                graph._depends_on[task_id].add(dependency)
+                graph._dependents[dependency].add(task_id)
+        graph._acyclic = False
+        return graph
+
+    @classmethod
+    def from_project(cls, connection, project_id):
+        """
+            Builds graph of a project from TASKS and TASK_DEPENDENCIES edges
+        """
+        graph = cls()
+        for task_id, start, end in connection.execute(
+            "SELECT ID, START, END FROM TASKS WHERE PROJECT_ID = ?;", (project_id,)
+        ):
+            graph._add_node(task_id)
+            graph._duration[task_id] = duration(start, end)
+
+        for task_id, dependency in connection.execute(
+            """
+            SELECT d.TASK_ID, d.DEPENDS_ON FROM TASKS t
+            JOIN TASK_DEPENDENCIES d ON d.TASK_ID = t.ID
+            WHERE t.PROJECT_ID = ?;
+            """,
+            (project_id,),
+        ):
+            graph._add_node(task_id)
+            graph._add_node(dependency)
+            graph._depends_on[task_id].add(dependency)
+            graph._dependents[dependency].add(task_id)
+
+        graph._acyclic = False
+        return graph
+
+    def __contains__(self, task_id):
+        return task_id in self._depends_on
+
+    def __len__(self):
+        return len(self._depends_on)
+
+    def _add_node(self, task_id):
+        if task_id not in self._depends_on:
+            self._depends_on[task_id] = set()
+            self._dependents[task_id] = set()
+            self._duration.setdefault(task_id, 0)
+
+    def _invalidate(self, task_id):
+        stack = [task_id]
+        while stack:
+            node = stack.pop()
+            if self._finish.pop(node, None) is None and node != task_id:
+                # not memoized, so nothing downstream of it is either
+                continue
+            stack.extend(self._dependents.get(node, ()))
+
+    def find_path(self, source, target):
+        """
+            Returns dependency path source -> ... -> target or None
+        """
+        parents = {source: None}
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            if node == target:
+                path = []
+                while node is not None:
+                    path.append(node)
+                    node = parents[node]
+                return path[::-1]
+            for dependency in self._depends_on.get(node, ()):
+                if dependency not in parents:
+                    parents[dependency] = node
+                    queue.append(dependency)
+        return None
+
+    def would_cycle(self, task_id, depends_on):
+        """
+            Returns the cycle (as list of ids) that making task_id depend on
+            depends_on would create, or None
+        """
+        for dependency in depends_on:
+            if dependency == task_id:
+                return [task_id, task_id]
+            path = self.find_path(dependency, task_id)
+            if path:
+                return [task_id] + path
+        return None
+
+    def set_task(self, task_id, depends_on=(), start=None, end=None):
+        """
+            Adds or updates a task, raises ValueError if it would create a cycle
+        """
+        depends_on = set(depends_on)
+        cycle = self.would_cycle(task_id, depends_on)
+        if cycle:
+            raise ValueError(
+                "Dependency cycle: {}".format(" -> ".join(str(node) for node in cycle))
+            )
+
+        self._add_node(task_id)
+        for dependency in self._depends_on[task_id] - depends_on:
+            self._dependents[dependency].discard(task_id)
+        for dependency in depends_on - self._depends_on[task_id]:
+            self._add_node(dependency)
+            self._dependents[dependency].add(task_id)
+        self._depends_on[task_id] = depends_on
+
+        if start is not None or end is not None:
+            self._duration[task_id] = duration(start, end)
+        self._invalidate(task_id)
+
+    def remove_task(self, task_id):
+        if task_id not in self._depends_on:
+            return
+        self._invalidate(task_id)
+        for dependency in self._depends_on.pop(task_id):
+            self._dependents[dependency].discard(task_id)
+        for dependent in self._dependents.pop(task_id):
+            self._depends_on[dependent].discard(task_id)
+        del self._duration[task_id]
+
+    def _walk(self, task_id, edges):
+        seen = set()
+        stack = list(edges.get(task_id, ()))
+        while stack:
+            node = stack.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            stack.extend(edges.get(node, ()))
+        return seen
+
+    def blocked_by(self, task_id, transitive=False):
+        """
+            Tasks that must finish before task_id
+        """
+        if transitive:
+            return self._walk(task_id, self._depends_on)
+        return set(self._depends_on.get(task_id, ()))
+
+    def unblocks(self, task_id, transitive=False):
+        """
+            Tasks waiting on task_id
+        """
+        if transitive:
+            return self._walk(task_id, self._dependents)
+        return set(self._dependents.get(task_id, ()))
+
+    def topological_order(self):
+        """
+            Task ids with every dependency before its dependents (Kahn's algorithm)
+        """
+        pending = {node: len(deps) for node, deps in self._depends_on.items()}
+        queue = deque(sorted(node for node, count in pending.items() if not count))
+        order = []
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for dependent in self._dependents[node]:
+                pending[dependent] -= 1
+                if not pending[dependent]:
+                    queue.append(dependent)
+
+        if len(order) != len(pending):
+            raise ValueError("Dependency graph has cycles: {}".format(self.find_cycle()))
+        return order
+
+    def find_cycle(self):
+        """
+            Returns one dependency cycle as list of ids, or None
+        """
+        state = {}
+        for root in self._depends_on:
+            if root in state:
+                continue
+            state[root] = 1
+            stack = [(root, iter(self._depends_on[root]))]
+            while stack:
+                node, dependencies = stack[-1]
+                for dependency in dependencies:
+                    if state.get(dependency) == 1:
+                        cycle = [entry[0] for entry in stack]
+                        return cycle[cycle.index(dependency):] + [dependency]
+                    if dependency not in state:
+                        state[dependency] = 1
+                        stack.append((dependency, iter(self._depends_on[dependency])))
+                        break
+                else:
+                    state[node] = 2
+                    stack.pop()
+        return None
+
+    def _earliest_finish(self, task_id):
+        if task_id in self._finish:
+            return self._finish[task_id][0]
+
+        stack = [task_id]
+        while stack:
+            node = stack[-1]
+            missing = [
+                dependency
+                for dependency in self._depends_on[node]
+                if dependency not in self._finish
+            ]
+            if missing:
+                stack.extend(missing)
+                continue
+
+            stack.pop()
+            if node in self._finish:
+                continue
+            before, previous = 0, None
+            for dependency in self._depends_on[node]:
+                if self._finish[dependency][0] >= before:
+                    before, previous = self._finish[dependency][0], dependency
+            self._finish[node] = (before + self._duration[node], previous)
+
+        return self._finish[task_id][0]
+
+    def critical_path(self):
+        """
+            Returns (length in days, [task ids]) of the longest dependency chain
+        """
+        if not self._acyclic:
+            cycle = self.find_cycle()
+            if cycle:
+                raise ValueError("Dependency graph has cycles: {}".format(cycle))
+            self._acyclic = True
+
+        best, last = 0, None
+        for node in self._depends_on:
+            finish = self._earliest_finish(node)
+            if last is None or finish > best:
+                best, last = finish, node
+
+        path = []
+        while last is not None:
+            path.append(last)
+            last = self._finish[last][1]
+        return best, path[::-1]
@@ -0,0 +1,149 @@
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from migrations import ensure_schema
+from connection_utils import transaction
+from graph_utils import parse_date
+
+PERIODS = {
+    "day": "DAY",
+    # weeks start on monday
+    "week": "date(DAY, '-6 days', 'weekday 1')",
+    "month": "strftime('%Y-%m-01', DAY)",
+}
+
+COMPACT_BATCH = 5000
+
+
+@dataclass(slots=True)
+class StatusChange:
+    ts: float
+    project_id: int
+    task_id: int
+    log_id: int
+    status: str
+    status_info: str
+    created_by: str
+
+
+def to_timestamp(value):
+    """
+        Unix time of a datetime, a date or dd-mm-yyyy (midnight UTC) or a number
+    """
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        parsed = parse_date(value)
+        if parsed is None:
+            raise ValueError("Unsupported date {}, use dd-mm-yyyy".format(value))
+        value = parsed
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return datetime(value.year, value.month, value.day, tzinfo=timezone.utc).timestamp()
+
+
+def _day(value):
+    if value is None:
+        return None
+    return datetime.fromtimestamp(to_timestamp(value), timezone.utc).date().isoformat()
+
+
+def status_changes(
+    connection,
+    project_id=None,
+    task_id=None,
+    start=None,
+    end=None,
+    statuses=None,
+    limit=None,
+):
+    """
+        Task logs in [start, end) in time order, of one task or project or
+        all of them. Each task's window is a range scan of the
+        (TASK_ID, TS) index, so cost follows the logs returned.
+    """
+    ensure_schema(connection)
+    conditions, params = [], []
+    for sql, value in (
+        ("t.PROJECT_ID = ?", project_id),
+        ("l.TASK_ID = ?", task_id),
+        ("l.TS >= ?", to_timestamp(start)),
+        ("l.TS < ?", to_timestamp(end)),
+    ):
+        if value is not None:
+            conditions.append(sql)
+            params.append(value)
+    if statuses:
+        conditions.append("l.STATUS IN ({})".format(", ".join("?" * len(statuses))))
+        params.extend(statuses)
+
+    sql = """SELECT l.TS, t.PROJECT_ID, l.TASK_ID, l.ID, l.STATUS, l.STATUS_INFO, l.CREATED_BY
+        FROM TASKS t JOIN TASKLOGS l ON l.TASK_ID = t.ID{}
+        ORDER BY l.TS, l.ID""".format(" WHERE " + " AND ".join(conditions) if conditions else "")
+    if limit:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    return [StatusChange(*row) for row in connection.execute(sql + ";", params)]
+
+
+def status_rollups(connection, project_id, start=None, end=None, period="day"):
+    """
+        Status transition counts of a project per day, week or month in
+        [start, end), as [(period start yyyy-mm-dd, status, count)].
+        Read from TASKLOG_ROLLUPS, which keeps counting compacted logs.
+    """
+    if period not in PERIODS:
+        raise ValueError("Unknown period {}, choose from {}".format(period, ", ".join(PERIODS)))
+    ensure_schema(connection)
+
+    conditions, params = ["PROJECT_ID = ?"], [int(project_id)]
+    for sql, value in (("DAY >= ?", _day(start)), ("DAY < ?", _day(end))):
+        if value is not None:
+            conditions.append(sql)
+            params.append(value)
+
+    return connection.execute(
+        """SELECT {0} AS PERIOD, STATUS, sum(COUNT) FROM TASKLOG_ROLLUPS
+        WHERE {1} GROUP BY PERIOD, STATUS ORDER BY PERIOD, STATUS;""".format(
+            PERIODS[period], " AND ".join(conditions)
+        ),
+        params,
+    ).fetchall()
+
+
+def compact_logs(connection, before, project_id=None, batch_size=COMPACT_BATCH):
+    """
+        Deletes raw logs older than before, returns how many went. Their
+        counts stay in TASKLOG_ROLLUPS, PROJECT_SUMMARY.LOGS goes down as
+        it counts raw logs. Compaction is local housekeeping, so it is kept
+        out of the CHANGES log and other nodes keep their copies.
+        Runs in batches, each its own transaction, so writers are not
+        blocked for long.
+    """
+    ensure_schema(connection)
+    before = to_timestamp(before)
+    if before is None or before > time.time():
+        raise ValueError("Compaction cut-off must be in the past")
+
+    if project_id is None:
+        select = "SELECT ID FROM TASKLOGS WHERE TS < ? LIMIT ?"
+        params = (before, batch_size)
+    else:
+        select = """SELECT l.ID FROM TASKS t JOIN TASKLOGS l ON l.TASK_ID = t.ID
+            WHERE t.PROJECT_ID = ? AND l.TS < ? LIMIT ?"""
+        params = (int(project_id), before, batch_size)
+
+    total = 0
+    while True:
+        with transaction(connection):
+            connection.execute("UPDATE SYNC_STATE SET VALUE = '1' WHERE KEY = 'applying';")
+            try:
+                deleted = connection.execute(
+                    "DELETE FROM TASKLOGS WHERE ID IN ({});".format(select), params
+                ).rowcount
+            finally:
+                connection.execute("UPDATE SYNC_STATE SET VALUE = '0' WHERE KEY = 'applying';")
+        total += deleted
+        if deleted < batch_size:
+            return total
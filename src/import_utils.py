@@ -0,0 +1,245 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from core_utils import is_invalid_email, random_salt, hash_password, calibrate_kdf
+from database_utils import validate_task_fields
+from graph_utils import parse_dependencies
+from migrations import ensure_schema
+from connection_utils import transaction
+
+TASK_FIELDS = [
+    "priority",
+    "objective",
+    "description",
+    "start",
+    "end",
+    "status",
+    "status_info",
+    "dependent_on",
+]
+
+
+@dataclass
+class ImportReport:
+    imported: int = 0
+    rejected: list = field(default_factory=list)
+    elapsed: float = 0.0
+    kind: str = "tasks"
+
+    @property
+    def rate(self):
+        """
+            Imported rows per second
+        """
+        if not self.elapsed:
+            return 0.0
+        return self.imported / self.elapsed
+
+    def __str__(self):
+        return "Imported {0} {4} ({1} rejected) in {2:.2f}s, {3:.0f} {4}/s".format(
+            self.imported, len(self.rejected), self.elapsed, self.rate, self.kind
+        )
+
+
+def _detect_format(path):
+    if path.lower().endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    return "csv"
+
+
+def read_rows(path, fmt=None):
+    """
+        Streams (line number, row dict) from a csv file with header or jsonl file.
+        Unparsable jsonl lines yield an error string instead of a dict.
+    """
+    fmt = fmt or _detect_format(path)
+
+    with open(path, newline="") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+            return
+
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_no, "Invalid json: {}".format(e)
+                continue
+            if not isinstance(row, dict):
+                yield line_no, "Expected json object"
+                continue
+            yield line_no, row
+
+
+def _task_values(row, known):
+    """
+        Validated column values of a row, its dependencies must be among
+        known task ids of the project
+    """
+    values = []
+    for name in TASK_FIELDS:
+        value = row.get(name)
+        if value is None:
+            value = "-1" if name == "dependent_on" else ""
+        values.append(str(value).strip())
+
+    validate_task_fields(
+        values[0], values[1], values[3], values[5], values[6], values[7]
+    )
+    unknown = sorted(parse_dependencies(values[7]) - known)
+    if unknown:
+        raise ValueError(
+            "No task with id {} in this project".format(", ".join(map(str, unknown)))
+        )
+    return values
+
+
+def _write_chunk(connection, chunk):
+    with transaction(connection):
+        connection.executemany(
+            """
+             INSERT INTO TASKS(priority, objective, description, start, end, status, status_info,dependent_on, project_id, created_by)
+            VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?); """,
+            chunk,
+        )
+
+
+def import_tasks(connection, author, project_id, path, fmt=None, chunk_size=5000):
+    """
+        Bulk imports tasks into a project from csv (with header) or jsonl.
+        Rows are validated like TaskManager.add_task and written with
+        executemany, committing once per chunk_size rows.
+        Returns ImportReport listing rejected rows as (line, reason).
+    """
+    ensure_schema(connection)
+
+    if not connection.execute(
+        "Select id from Projects where id=?;", (project_id,)
+    ).fetchone():
+        raise ValueError("No project with id: {}".format(project_id))
+
+    # rows may depend on tasks already in the project, new ones have no
+    # dependents so they cannot close a cycle
+    known = {
+        row[0]
+        for row in connection.execute("SELECT id FROM TASKS WHERE project_id = ?;", (project_id,))
+    }
+    report = ImportReport()
+    chunk = []
+    started = time.perf_counter()
+
+    for line_no, row in read_rows(path, fmt):
+        if isinstance(row, str):
+            report.rejected.append((line_no, row))
+            continue
+
+        try:
+            values = _task_values(row, known)
+        except ValueError as e:
+            report.rejected.append((line_no, str(e)))
+            continue
+
+        chunk.append(values + [project_id, author])
+
+        if len(chunk) >= chunk_size:
+            _write_chunk(connection, chunk)
+            report.imported += len(chunk)
+            chunk = []
+
+    if chunk:
+        _write_chunk(connection, chunk)
+        report.imported += len(chunk)
+
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def _hash_account(account):
+    mail, name, pass_phrase, n = account
+    salt = random_salt()
+    return mail, name, hash_password(pass_phrase, salt, n), salt
+
+
+def _write_accounts(connection, pool, batch, n, workers, report):
+    existing = {
+        row[0]
+        for row in connection.execute(
+            "SELECT mail FROM ACCOUNTS WHERE mail IN ({});".format(", ".join("?" * len(batch))),
+            [account[1] for account in batch],
+        )
+    }
+    accounts = []
+    for line_no, mail, name, pass_phrase in batch:
+        if mail in existing:
+            report.rejected.append((line_no, "Account already exists"))
+        else:
+            accounts.append((mail, name, pass_phrase, n))
+
+    rows = list(
+        pool.map(_hash_account, accounts, chunksize=max(1, len(accounts) // (workers * 4)))
+    )
+    with transaction(connection):
+        connection.executemany(
+            "INSERT INTO ACCOUNTS(mail, name, securitykey, salt) VALUES (?, ?, ?, ?);",
+            rows,
+        )
+    report.imported += len(rows)
+
+
+def provision_accounts(
+    connection, path, fmt=None, workers=None, target=0.1, n=None, batch_size=500
+):
+    """
+        Bulk creates accounts from csv (with header) or jsonl rows of
+        mail, name & password. Passwords are hashed with scrypt across a
+        process pool, its cost calibrated to target seconds per hash on
+        this machine unless n is given. Accounts are committed once per
+        batch_size rows. Returns ImportReport of accounts.
+    """
+    ensure_schema(connection)
+    workers = workers or os.cpu_count() or 1
+    n = n or calibrate_kdf(target)
+
+    report = ImportReport(kind="accounts")
+    seen = set()
+    batch = []
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(workers) as pool:
+        for line_no, row in read_rows(path, fmt):
+            if isinstance(row, str):
+                report.rejected.append((line_no, row))
+                continue
+
+            mail = str(row.get("mail") or "").strip().lower()
+            name = str(row.get("name") or "").strip()
+            pass_phrase = str(row.get("password") or "")
+            if (not name) or (not mail) or (not pass_phrase):
+                report.rejected.append((line_no, "Name, mail & password are mandatory."))
+                continue
+            if is_invalid_email(mail):
+                report.rejected.append((line_no, "Unsupported email format"))
+                continue
+            if mail in seen:
+                report.rejected.append((line_no, "Duplicate account in file"))
+                continue
+            seen.add(mail)
+
+            batch.append((line_no, mail, name, pass_phrase))
+            if len(batch) >= batch_size:
+                _write_accounts(connection, pool, batch, n, workers, report)
+                batch = []
+
+        if batch:
+            _write_accounts(connection, pool, batch, n, workers, report)
+
+    report.elapsed = time.perf_counter() - started
+    return report
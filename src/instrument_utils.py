@@ -0,0 +1,402 @@
+import atexit
+import functools
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import weakref
+
+import connection_utils
+from connection_utils import DB_PATH, TunedConnection
+
+# Statements slower than this many milliseconds go to the slow-query log
+SLOW_MS = float(os.environ.get("COREM_SLOW_MS", 100))
+
+STATS_PATH = os.path.join(os.path.dirname(DB_PATH), "stats.json")
+SLOW_LOG_PATH = os.path.join(os.path.dirname(DB_PATH), "slow-queries.log")
+
+# The progress handler runs every this many VM instructions
+PROGRESS_STEP = 1000
+
+# Histogram buckets are powers of BASE microseconds
+BASE = 2 ** 0.5
+
+STATS_FORMAT = 1
+
+MANAGERS = ("AccountManager", "ProjectManager", "TaskManager", "Internals", "Externals")
+
+_space = re.compile(r"\s+")
+
+# literals & numbered names (savepoints) would split one statement into many
+_number = re.compile(r"\b\d+\b")
+
+# statements whose plan is worth explaining
+_explainable = re.compile(r"\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b", re.I)
+
+
+class Histogram:
+    """
+        Latency distribution in buckets growing by BASE from 1us, so any
+        percentile is known to within ~41% at fixed memory
+    """
+
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        bucket = max(0, math.ceil(math.log(max(seconds, 1e-6) * 1e6, BASE)))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """
+            Upper bound of the bucket holding the q-th (0-100) percentile, in seconds
+        """
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(BASE ** bucket / 1e6, self.max)
+        return self.max
+
+    def merge(self, other):
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def to_dict(self):
+        return {
+            "buckets": {str(bucket): count for bucket, count in self.buckets.items()},
+            "count": self.count,
+            "total": self.total,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.buckets = {int(bucket): count for bucket, count in data["buckets"].items()}
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        histogram.max = data["max"]
+        return histogram
+
+
+class Stats:
+    """
+        Counters & latency histograms of statements (by normalized SQL) and
+        operations (by Manager.method)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.statements = {}
+        self.operations = {}
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def _record(self, histograms, name, seconds):
+        with self._lock:
+            histogram = histograms.get(name)
+            if histogram is None:
+                histogram = histograms[name] = Histogram()
+            histogram.record(seconds)
+
+    def statement(self, sql, seconds):
+        self._record(self.statements, sql, seconds)
+
+    def operation(self, name, seconds):
+        self._record(self.operations, name, seconds)
+
+    def merge(self, other):
+        with self._lock:
+            for name, n in other.counters.items():
+                self.counters[name] = self.counters.get(name, 0) + n
+            for mine, theirs in (
+                (self.statements, other.statements),
+                (self.operations, other.operations),
+            ):
+                for name, histogram in theirs.items():
+                    mine.setdefault(name, Histogram()).merge(histogram)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "format": STATS_FORMAT,
+                "counters": dict(self.counters),
+                "statements": {k: v.to_dict() for k, v in self.statements.items()},
+                "operations": {k: v.to_dict() for k, v in self.operations.items()},
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.counters = dict(data.get("counters", {}))
+        stats.statements = {k: Histogram.from_dict(v) for k, v in data.get("statements", {}).items()}
+        stats.operations = {k: Histogram.from_dict(v) for k, v in data.get("operations", {}).items()}
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.statements.clear()
+            self.operations.clear()
+
+
+STATS = Stats()
+
+_connections = weakref.WeakSet()
+_enabled = False
+_enable_lock = threading.Lock()
+
+
+def normalize(sql):
+    return _number.sub("N", _space.sub(" ", sql).strip())
+
+
+def log_slow(connection, sql, params, seconds):
+    """
+        Appends the statement, its duration & EXPLAIN QUERY PLAN to the
+        slow-query log as a JSON line
+    """
+    STATS.count("slow_statements")
+    plan = None
+    if params is not None and _explainable.match(sql):
+        try:
+            # a plain cursor, so explaining is not timed itself
+            plan = [
+                row[-1]
+                for row in sqlite3.Cursor(connection).execute("EXPLAIN QUERY PLAN " + sql, params)
+            ]
+        except sqlite3.Error as e:
+            plan = ["unavailable: {}".format(e)]
+    entry = {
+        "ts": time.time(),
+        "ms": round(seconds * 1000, 3),
+        "sql": _space.sub(" ", sql).strip(),
+        "plan": plan,
+    }
+    try:
+        os.makedirs(os.path.dirname(SLOW_LOG_PATH), 0o755, exist_ok=True)
+        with open(SLOW_LOG_PATH, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError:
+        pass
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+        Cursor timing each statement up to its first row & counting rows fetched
+    """
+
+    def _timed(self, method, sql, params, explain):
+        start = time.perf_counter()
+        try:
+            return method(sql, params) if params is not None else method(sql)
+        finally:
+            elapsed = time.perf_counter() - start
+            STATS.statement(normalize(sql), elapsed)
+            if elapsed * 1000 >= SLOW_MS:
+                log_slow(self.connection, sql, params if explain else None, elapsed)
+
+    def execute(self, sql, parameters=()):
+        return self._timed(super().execute, sql, parameters, True)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(super().executemany, sql, seq_of_parameters, False)
+
+    def executescript(self, sql_script):
+        return self._timed(super().executescript, sql_script, None, False)
+
+    def __next__(self):
+        row = super().__next__()
+        STATS.count("rows_read")
+        return row
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            STATS.count("rows_read")
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        STATS.count("rows_read", len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        STATS.count("rows_read", len(rows))
+        return rows
+
+
+class InstrumentedConnection(TunedConnection):
+    """
+        TunedConnection recording into STATS: statements through its
+        cursors are timed, the trace hook counts every statement run
+        (trigger steps included) & commits, the progress hook counts VM
+        work in steps of PROGRESS_STEP instructions. connect() only uses
+        it once instrumentation is enabled.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._folded = None
+        self.set_trace_callback(self._trace)
+        self.set_progress_handler(self._progress, PROGRESS_STEP)
+        _connections.add(self)
+        STATS.count("connections")
+
+    @staticmethod
+    def _trace(sql):
+        STATS.count("statements")
+        if sql.startswith(("COMMIT", "END", "commit", "end")):
+            STATS.count("commits")
+
+    @staticmethod
+    def _progress():
+        STATS.count("vm_steps", PROGRESS_STEP)
+        return 0
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def fold_cache_stats(self):
+        """
+            Adds what the StructureCache counted since the last fold
+        """
+        if self.structures is None:
+            return
+        stats = self.structures.stats()
+        last = self._folded
+        for name in ("hits", "misses", "evictions", "invalidations"):
+            STATS.count("cache_" + name, getattr(stats, name) - (getattr(last, name) if last else 0))
+        self._folded = stats
+
+    def close(self):
+        self.fold_cache_stats()
+        super().close()
+
+
+def timed(name, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            STATS.operation(name, time.perf_counter() - start)
+
+    wrapper.timed = True
+    return wrapper
+
+
+def instrument_managers():
+    """
+        Wraps public methods of the managers to time them as operations
+    """
+    import database_utils
+
+    for class_name in MANAGERS:
+        cls = getattr(database_utils, class_name)
+        for name, member in list(vars(cls).items()):
+            if name.startswith("_") or not callable(member) or getattr(member, "timed", False):
+                continue
+            setattr(cls, name, timed("{}.{}".format(class_name, name), member))
+
+
+def enable():
+    """
+        Turns instrumentation on for this process: connections opened from
+        now on are instrumented, managers are timed and stats are saved to
+        STATS_PATH at exit. Nothing is wrapped until this is called.
+    """
+    global _enabled
+    with _enable_lock:
+        if _enabled:
+            return
+        _enabled = True
+        connection_utils.INSTRUMENT = True
+        instrument_managers()
+        atexit.register(save)
+
+
+def enabled():
+    return _enabled
+
+
+def snapshot():
+    """
+        Stats of this process so far, cache counters of open connections included
+    """
+    for connection in list(_connections):
+        try:
+            connection.fold_cache_stats()
+        except sqlite3.ProgrammingError:
+            pass
+    return STATS
+
+
+def load(path=None):
+    try:
+        with open(path or STATS_PATH) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return Stats()
+    if data.get("format") != STATS_FORMAT:
+        return Stats()
+    return Stats.from_dict(data)
+
+
+def save(path=None):
+    """
+        Merges this process' stats into the stats file & starts counting afresh
+    """
+    path = path or STATS_PATH
+    snapshot()
+    if not (STATS.counters or STATS.statements or STATS.operations):
+        return
+    total = load(path)
+    total.merge(STATS)
+    os.makedirs(os.path.dirname(path), 0o755, exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(total.to_dict(), f)
+    os.replace(path + ".tmp", path)
+    STATS.reset()
+
+
+def reset(path=None):
+    STATS.reset()
+    for target in (path or STATS_PATH, SLOW_LOG_PATH):
+        try:
+            os.remove(target)
+        except FileNotFoundError:
+            pass
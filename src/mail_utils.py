@@ -0,0 +1,364 @@
+import asyncio
+import os
+import queue
+import random
+import smtplib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from email.message import EmailMessage
+
+from migrations import ensure_schema
+from connection_utils import DB_PATH, connect, transaction
+
+MAX_ATTEMPTS = 5
+
+# Seconds before the first retry, doubled on every further attempt
+BACKOFF = 30.0
+
+MAX_BACKOFF = 3600.0
+
+
+@dataclass
+class SmtpSettings:
+    host: str = "localhost"
+    port: int = 25
+    username: str = None
+    password: str = None
+    starttls: bool = False
+    sender: str = "corem@localhost"
+    timeout: float = 30.0
+
+    @classmethod
+    def from_env(cls):
+        """
+            Reads COREM_SMTP_HOST, _PORT, _USER, _PASSWORD, _STARTTLS & _SENDER
+        """
+        return cls(
+            host=os.environ.get("COREM_SMTP_HOST", cls.host),
+            port=int(os.environ.get("COREM_SMTP_PORT", cls.port)),
+            username=os.environ.get("COREM_SMTP_USER"),
+            password=os.environ.get("COREM_SMTP_PASSWORD"),
+            starttls=os.environ.get("COREM_SMTP_STARTTLS", "") in ("1", "yes", "true"),
+            sender=os.environ.get("COREM_SMTP_SENDER", cls.sender),
+        )
+
+
+def enqueue_mail(connection, recipients, subject, body, project_id=None, reply_to=None):
+    """
+        Queues one message per recipient, returns number queued
+    """
+    ensure_schema(connection)
+    now = time.time()
+    rows = [
+        (project_id, recipient, subject, body, reply_to, now, now)
+        for recipient in dict.fromkeys(r.strip().lower() for r in recipients if r.strip())
+    ]
+    with transaction(connection):
+        connection.executemany(
+            """INSERT INTO MAIL_QUEUE(project_id, recipient, subject, body, reply_to, next_attempt, created)
+            VALUES (?, ?, ?, ?, ?, ?, ?);""",
+            rows,
+        )
+    return len(rows)
+
+
+def enqueue_project_mail(
+    connection, project_id, subject, body, reply_to=None, internals=True, externals=True
+):
+    """
+        Queues a message to every internal and/or external contact of a
+        project in a single INSERT ... SELECT, returns number queued
+    """
+    ensure_schema(connection)
+    sources = []
+    if internals:
+        sources.append("SELECT email FROM INTERNALS WHERE project_id = :project")
+    if externals:
+        sources.append("SELECT email FROM EXTERNALS WHERE project_id = :project")
+    if not sources:
+        return 0
+
+    with transaction(connection):
+        cursor = connection.execute(
+            """INSERT INTO MAIL_QUEUE(project_id, recipient, subject, body, reply_to, next_attempt, created)
+            SELECT :project, recipient, :subject, :body, :reply_to, :now, :now FROM (
+              SELECT DISTINCT lower(trim(email)) AS recipient FROM ({}) WHERE trim(email) <> ''
+            );""".format(" UNION ".join(sources)),
+            {
+                "project": project_id,
+                "subject": subject,
+                "body": body,
+                "reply_to": reply_to,
+                "now": time.time(),
+            },
+        )
+    return cursor.rowcount
+
+
+def mail_status(connection, message_id):
+    """
+        Returns (status, attempts, last error) of a queued message or None
+    """
+    return connection.execute(
+        "SELECT status, attempts, last_error FROM MAIL_QUEUE WHERE id = ?;", (message_id,)
+    ).fetchone()
+
+
+def mail_counts(connection, project_id=None):
+    """
+        Returns {status: number of messages}, of one project if given
+    """
+    if project_id is None:
+        rows = connection.execute("SELECT status, count(*) FROM MAIL_QUEUE GROUP BY status;")
+    else:
+        rows = connection.execute(
+            "SELECT status, count(*) FROM MAIL_QUEUE WHERE project_id = ? GROUP BY status;",
+            (project_id,),
+        )
+    return dict(rows.fetchall())
+
+
+class SmtpPool:
+    """
+        Thread-safe pool of open SMTP connections, reused across messages
+        so the handshake & login are paid once per connection
+    """
+
+    def __init__(self, settings, size=4):
+        self.settings = settings
+        self._idle = queue.LifoQueue()
+        self._slots = queue.Queue()
+        for _ in range(size):
+            self._slots.put(None)
+
+    def _connect(self):
+        settings = self.settings
+        smtp = smtplib.SMTP(settings.host, settings.port, timeout=settings.timeout)
+        if settings.starttls:
+            smtp.starttls()
+        if settings.username:
+            smtp.login(settings.username, settings.password or "")
+        return smtp
+
+    def send(self, message):
+        """
+            Sends an EmailMessage, blocking until a connection is free
+        """
+        self._slots.get()
+        try:
+            try:
+                smtp = self._idle.get_nowait()
+            except queue.Empty:
+                smtp = self._connect()
+            try:
+                try:
+                    smtp.send_message(message)
+                except smtplib.SMTPServerDisconnected:
+                    # idle connections time out server side, retry once on a fresh one
+                    smtp.close()
+                    smtp = self._connect()
+                    smtp.send_message(message)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException):
+                # rejected by the server, smtplib has reset the session for reuse
+                self._idle.put(smtp)
+                raise
+            except Exception:
+                smtp.close()
+                raise
+            self._idle.put(smtp)
+        finally:
+            self._slots.put(None)
+
+    def close(self):
+        while True:
+            try:
+                smtp = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                smtp.quit()
+            except smtplib.SMTPException:
+                smtp.close()
+
+
+class RateLimiter:
+    """
+        Token bucket allowing rate sends per second with bursts up to burst
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _is_permanent(error):
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+    else:
+        codes = [getattr(error, "smtp_code", None)]
+    return all(isinstance(code, int) and 500 <= code < 600 for code in codes)
+
+
+class MailWorker:
+    """
+        Asyncio worker draining MAIL_QUEUE.
+
+        Due messages are claimed in batches and sent concurrently through an
+        SmtpPool, smtplib calls run on a thread pool sized to the SMTP pool.
+        Sends are rate limited, transient failures are retried with
+        exponential backoff and permanent ones (5xx) fail right away.
+        Database access stays on one thread with its own connection.
+        Run one worker per database, a starting worker requeues messages
+        left in sending state.
+    """
+
+    def __init__(
+        self,
+        db_path=None,
+        settings=None,
+        pool_size=4,
+        rate=5.0,
+        batch_size=50,
+        max_attempts=MAX_ATTEMPTS,
+        backoff=BACKOFF,
+    ):
+        self.db_path = db_path or DB_PATH
+        self.settings = settings or SmtpSettings.from_env()
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.pool = SmtpPool(self.settings, pool_size)
+        self.limiter = RateLimiter(rate)
+        self._senders = ThreadPoolExecutor(pool_size, thread_name_prefix="corem-smtp")
+        self._db = ThreadPoolExecutor(1, thread_name_prefix="corem-mail-db")
+        self._conn = None
+
+    async def _call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._db, fn, *args)
+
+    def _open(self):
+        if self._conn is None:
+            self._conn = connect(self.db_path, check_same_thread=False)
+            ensure_schema(self._conn)
+            # messages claimed by a worker that died are sent again
+            with transaction(self._conn):
+                self._conn.execute(
+                    "UPDATE MAIL_QUEUE SET status = 'queued' WHERE status = 'sending';"
+                )
+
+    def _claim(self):
+        self._open()
+        with transaction(self._conn):
+            return self._conn.execute(
+                """UPDATE MAIL_QUEUE SET status = 'sending', attempts = attempts + 1
+                WHERE id IN (
+                  SELECT id FROM MAIL_QUEUE WHERE status = 'queued' AND next_attempt <= ?
+                  ORDER BY next_attempt LIMIT ?
+                ) RETURNING id, recipient, subject, body, reply_to, attempts;""",
+                (time.time(), self.batch_size),
+            ).fetchall()
+
+    def _record(self, results):
+        now = time.time()
+        with transaction(self._conn):
+            for message_id, attempts, error, permanent in results:
+                if error is None:
+                    self._conn.execute(
+                        "UPDATE MAIL_QUEUE SET status = 'sent', sent = ?, last_error = NULL WHERE id = ?;",
+                        (now, message_id),
+                    )
+                elif permanent or attempts >= self.max_attempts:
+                    self._conn.execute(
+                        "UPDATE MAIL_QUEUE SET status = 'failed', last_error = ? WHERE id = ?;",
+                        (error, message_id),
+                    )
+                else:
+                    delay = min(MAX_BACKOFF, self.backoff * 2 ** (attempts - 1))
+                    self._conn.execute(
+                        """UPDATE MAIL_QUEUE SET status = 'queued', last_error = ?, next_attempt = ?
+                        WHERE id = ?;""",
+                        (error, now + delay * random.uniform(0.8, 1.2), message_id),
+                    )
+
+    def _next_due(self):
+        row = self._conn.execute(
+            "SELECT min(next_attempt) FROM MAIL_QUEUE WHERE status = 'queued';"
+        ).fetchone()
+        return row[0]
+
+    def _message(self, recipient, subject, body, reply_to):
+        message = EmailMessage()
+        message["From"] = self.settings.sender
+        message["To"] = recipient
+        message["Subject"] = subject
+        if reply_to:
+            message["Reply-To"] = reply_to
+        message.set_content(body)
+        return message
+
+    async def _deliver(self, row):
+        message_id, recipient, subject, body, reply_to, attempts = row
+        await self.limiter.acquire()
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self._senders, self.pool.send, self._message(recipient, subject, body, reply_to)
+            )
+        except (smtplib.SMTPException, OSError) as e:
+            return message_id, attempts, "{}: {}".format(type(e).__name__, e), _is_permanent(e)
+        return message_id, attempts, None, False
+
+    async def run_once(self):
+        """
+            Sends one batch of due messages, returns how many were attempted
+        """
+        batch = await self._call(self._claim)
+        if batch:
+            results = await asyncio.gather(*(self._deliver(row) for row in batch))
+            await self._call(self._record, results)
+        return len(batch)
+
+    async def drain(self):
+        """
+            Sends due messages until none is left, retries scheduled later stay queued
+        """
+        total = 0
+        while True:
+            count = await self.run_once()
+            if not count:
+                return total
+            total += count
+
+    async def run(self, stop=None, poll=5.0):
+        """
+            Keeps sending until the stop event is set, sleeping until the next
+            retry is due or poll seconds pass without new messages
+        """
+        stop = stop or asyncio.Event()
+        while not stop.is_set():
+            await self.drain()
+            due = await self._call(self._next_due)
+            wait = poll if due is None else min(poll, max(0.0, due - time.time()))
+            try:
+                await asyncio.wait_for(stop.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def close(self):
+        self.pool.close()
+        self._senders.shutdown()
+        if self._conn is not None:
+            self._db.submit(self._conn.close).result()
+        self._db.shutdown()
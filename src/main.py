@@ -1,5 +1,7 @@
+import asyncio
+
 from database_utils import (
-    home_dir,
+    session_file,
     AccountManager,
     ProjectManager,
     TaskManager,
@@ -12,10 +14,16 @@ from database_utils import (
     ExternalsStructure,
     InternalsStructure,
 )
+from import_utils import import_tasks
+from migrations import migrate
+from connection_utils import connect
+from search_utils import search, rebuild_index
+from summary_utils import recompute_summaries
+from report_utils import write_report, write_reports
+from mail_utils import MailWorker, mail_counts
 
-import sqlite3
-
-conn = sqlite3.connect(home_dir + "/.corem/crator.db")
+conn = None
+ax = None
 
 
 def project_interface(projem, project_id, author):
@@ -27,7 +35,14 @@ def project_interface(projem, project_id, author):
                 2. Update Project
                 3. Delete Project
                 4. Start Externals Manager
-                5. Exit
+                5. Search
+                6. Rebuild search index
+                7. Project summary
+                8. HTML report
+                9. HTML reports of all projects
+                10. Attach files
+                11. Sync with remote
+                12. Exit
         """
         )
         ch = input("Enter action code: ").strip()
@@ -38,6 +53,21 @@ def project_interface(projem, project_id, author):
             projem.delete_project(project_id)
         elif ch == "4":
             external_contacts_interface(author, project_id)
+        elif ch == "5":
+            search_interface(conn)
+        elif ch == "6":
+            rebuild_index(conn)
+            print("[*] Search index rebuilt.")
+        elif ch == "7":
+            summary_interface(projem, project_id)
+        elif ch == "8":
+            report_interface(project_id)
+        elif ch == "9":
+            report_interface()
+        elif ch == "10":
+            projem.add_files(project_id)
+        elif ch == "11":
+            ax.publish_account()
         elif ch != "1":
             break
         else:
@@ -54,6 +84,8 @@ def task_interface(conn, author, project_id):
             3. Update task
             4. Delete task
             5. Add Internals
+            6. Import tasks (csv/jsonl)
+            7. Add reminder
         """
         )
         ch = input("Enter action code: ").strip()
@@ -66,6 +98,10 @@ def task_interface(conn, author, project_id):
             taskm.delete_task()
         elif ch == "5":
             internal_contacts_interface(project_id, author)
+        elif ch == "6":
+            import_interface(conn, author, project_id)
+        elif ch == "7":
+            taskm.add_reminder()
         elif ch != "1":
             break
         else:
@@ -73,6 +109,75 @@ def task_interface(conn, author, project_id):
     del taskm
 
 
+def summary_interface(projem, project_id):
+    summary = projem.project_summary(project_id)
+    if not summary:
+        print("[!] No summary found")
+        return
+
+    print("Tasks: {}  Logs: {}  Overdue: {}".format(summary.tasks, summary.logs, summary.overdue))
+    print("By status: " + ", ".join("{}={}".format(*x) for x in sorted(summary.by_status.items())))
+    print("By priority: " + ", ".join("{}={}".format(*x) for x in sorted(summary.by_priority.items())))
+
+    if input("Recompute to verify & repair? y/N: ").strip() in ("y", "yes"):
+        drift = recompute_summaries(conn, project_id)
+        for entry in drift:
+            print("    {} {} {!r}: stored {} expected {}".format(*entry))
+        print("[*] {} drifted entries repaired.".format(len(drift)))
+
+
+def report_interface(project_id=None):
+    force = input("Rebuild even if unchanged? y/N: ").strip() in ("y", "yes")
+    try:
+        if project_id is None:
+            written, skipped = write_reports(force=force)
+            print("[*] {} reports written, {} unchanged.".format(len(written), len(skipped)))
+        else:
+            path = write_report(conn, project_id, force=force)
+            print("[*] Report written to {}".format(path) if path else "[*] Report is up to date.")
+    except (OSError, ValueError) as e:
+        print("[!] {}".format(e))
+
+
+def search_interface(conn):
+    query = input("Search: ").strip()
+    if not query:
+        return
+
+    scope = input("Scope (projects, tasks, logs or return for all): ").strip()
+    try:
+        hits = search(conn, query, scope or ("projects", "tasks", "logs"))
+    except ValueError as e:
+        print("[!] {}".format(e))
+        return
+
+    if not hits:
+        print("No records found\n")
+
+    for hit in hits:
+        print(
+            "[{}] {}. {} (project {})\n    {}".format(
+                hit.scope, hit.key, hit.title, hit.project_id, hit.snippet
+            )
+        )
+
+
+def import_interface(conn, author, project_id):
+    path = input("Enter path of csv/jsonl file: ").strip()
+    if not path:
+        return
+
+    try:
+        report = import_tasks(conn, author, project_id, path)
+    except (OSError, ValueError) as e:
+        print("[!] {}".format(e))
+        return
+
+    print("[*] {}".format(report))
+    for line_no, reason in report.rejected:
+        print("    line {}: {}".format(line_no, reason))
+
+
 def internal_contacts_interface(project_id, author):
     intm = Internals(project_id, author, conn)
     while True:
@@ -102,7 +207,9 @@ def external_contacts_interface(author, project_id):
             """ 
             1. Add External
             2. Revoke Access
-            3. Return
+            3. Contact by mail
+            4. Send queued mail
+            5. Return
         """
         )
         ch = input(">> ").strip()
@@ -111,20 +218,41 @@ def external_contacts_interface(author, project_id):
             extm.add_external()
         elif ch == "2":
             extm.revoke_access()
+        elif ch == "3":
+            extm.make_contact()
+        elif ch == "4":
+            mail_interface(project_id)
         else:
             break
     del extm
 
 
+def mail_interface(project_id):
+    worker = MailWorker()
+    try:
+        sent = asyncio.run(worker.drain())
+    finally:
+        worker.close()
+    print("[*] {} mails attempted.".format(sent))
+    print(", ".join("{}={}".format(*x) for x in sorted(mail_counts(conn, project_id).items())))
+
+
 def abort():
     conn.close()
     exit(1)
 
 
-if __name__ == "__main__":
-    conn = sqlite3.connect(home_dir + "/.corem/crator.db")
+def run(db_path=None):
+    """
+        Interactive session on db_path (crator.db by default): login, pick
+        a project and work through menus
+    """
+    global conn, ax
+
+    conn = connect(db_path)
+    migrate(conn)
 
-    ax = AccountManager(conn)
+    ax = AccountManager(conn, session_file(db_path))
     xs = input("Enter any character for new account or press return to login: ").strip()
     if xs:
         print("\n\tRegistration Portal\n")
@@ -159,3 +287,7 @@ if __name__ == "__main__":
     ax.sign_out()
     conn.close()
     exit(0)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,1023 @@
+"""
+    Versioned schema migrations.
+
+    Schema version is kept in sqlite's PRAGMA user_version. Each migration
+    runs once, inside its own transaction, and bumps the version.
+"""
+import sqlite3
+
+# Statuses counted as finished by project summaries (compared lowercased)
+CLOSED_STATUSES = ("done", "complete", "completed", "closed", "cancelled")
+
+CLOSED_STATUSES_SQL = "({})".format(", ".join("'{}'".format(status) for status in CLOSED_STATUSES))
+
+# Expected summary rows computed from scratch, shared by migration & repair
+SUMMARY_TOTALS_SQL = """
+        SELECT p.ID,
+          (SELECT count(*) FROM TASKS t WHERE t.PROJECT_ID = p.ID),
+          (SELECT count(*) FROM TASKS t JOIN TASKLOGS l ON l.TASK_ID = t.ID
+           WHERE t.PROJECT_ID = p.ID)
+        FROM PROJECTS p {where}
+"""
+
+SUMMARY_COUNTS_SQL = """
+        SELECT PROJECT_ID, 'STATUS', STATUS, count(*) FROM TASKS {where}
+        GROUP BY PROJECT_ID, STATUS
+        UNION ALL
+        SELECT PROJECT_ID, 'PRIORITY', PRIORITY, count(*) FROM TASKS {where}
+        GROUP BY PROJECT_ID, PRIORITY
+        UNION ALL
+        SELECT PROJECT_ID, 'OPEN_END', END, count(*) FROM TASKS
+        WHERE lower(STATUS) NOT IN {closed} {also}
+        GROUP BY PROJECT_ID, END
+"""
+
+# Tables replicated through the CHANGES log as {table: (key, columns)},
+# parents before children so snapshots apply in order. Migration 11 logs
+# the columns as they were then, later migrations add theirs.
+_SYNC_TABLES_11 = {
+    "ACCOUNTS": ("MAIL", ("MAIL", "NAME", "SECURITYKEY", "SALT")),
+    "PROJECTS": (
+        "ID",
+        ("ID", "NAME", "CATEGORY", "TAGS", "DESCRIPTION", "START", "END", "CREATED_BY"),
+    ),
+    "TASKS": (
+        "ID",
+        (
+            "ID",
+            "PRIORITY",
+            "OBJECTIVE",
+            "DESCRIPTION",
+            "START",
+            "END",
+            "STATUS",
+            "STATUS_INFO",
+            "DEPENDENT_ON",
+            "PROJECT_ID",
+            "CREATED_BY",
+        ),
+    ),
+    "TASKLOGS": ("ID", ("ID", "STATUS", "STATUS_INFO", "TASK_ID", "CREATED_BY")),
+    "INTERNALS": ("ID", ("ID", "NAME", "EMAIL", "PHONE", "TASK_ID", "PROJECT_ID")),
+    "EXTERNALS": ("ID", ("ID", "NAME", "EMAIL", "PHONE", "PROJECT_ID")),
+}
+
+SYNC_TABLES = dict(
+    _SYNC_TABLES_11,
+    TASKLOGS=("ID", ("ID", "STATUS", "STATUS_INFO", "TASK_ID", "CREATED_BY", "TS")),
+)
+
+# Rows are only ever inserted or deleted, remote copies never overwrite them
+APPEND_ONLY_TABLES = ("TASKLOGS",)
+
+# Columns of synced tables holding ids of other synced tables' rows
+SYNC_REFERENCES = {
+    "TASKS": {"PROJECT_ID": "PROJECTS"},
+    "TASKLOGS": {"TASK_ID": "TASKS"},
+    "INTERNALS": {"TASK_ID": "TASKS", "PROJECT_ID": "PROJECTS"},
+    "EXTERNALS": {"PROJECT_ID": "PROJECTS"},
+}
+
+# Unix time with milliseconds, unixepoch('subsec') needs SQLite 3.42
+NOW_SQL = "((julianday('now') - 2440587.5) * 86400.0)"
+
+
+def _row_json(columns, row):
+    return "json_object({})".format(
+        ", ".join("'{0}', {1}.{0}".format(column, row) for column in columns)
+    )
+
+
+MIGRATIONS = [
+    (
+        1,
+        "Base tables",
+        [
+            """
+        CREATE TABLE IF NOT EXISTS ACCOUNTS (
+         MAIL           TEXT  PRIMARY KEY   NOT NULL,
+         NAME           TEXT                NOT NULL,
+         SECURITYKEY      TEXT                NOT NULL,
+         SALT           TEXT                NOT NULL);
+         """,
+            """
+        CREATE TABLE IF NOT EXISTS PROJECTS (
+         ID            INTEGER   PRIMARY KEY AUTOINCREMENT   NOT NULL ,
+         NAME           TEXT                        NOT NULL,
+         CATEGORY       TEXT                        NOT NULL,
+         TAGS           TEXT                        NOT NULL,
+         DESCRIPTION    TEXT                        NOT NULL,
+         START          TEXT                        NOT NULL,
+         END            TEXT                        NOT NULL,
+         CREATED_BY      TEXT                        NOT NULL
+         );
+         """,
+            """
+        CREATE TABLE IF NOT EXISTS TASKS (
+         ID            INTEGER   PRIMARY KEY  AUTOINCREMENT  NOT NULL,
+         PRIORITY       TEXT                        NOT NULL,
+         OBJECTIVE      TEXT                        NOT NULL,
+         DESCRIPTION    TEXT                        NOT NULL,
+         START          TEXT                        NOT NULL,
+         END            TEXT                        NOT NULL,
+         STATUS         TEXT                        NOT NULL,
+         STATUS_INFO    TEXT                        NOT NULL,
+         DEPENDENT_ON   TEXT                        NOT NULL,
+         PROJECT_ID     INTEGER                     NOT NULL,
+         CREATED_BY      TEXT                        NOT NULL
+         );
+         """,
+            """
+        CREATE TABLE IF NOT EXISTS TASKLOGS (
+         ID            INTEGER   PRIMARY KEY  AUTOINCREMENT  NOT NULL,
+         STATUS         TEXT                        NOT NULL,
+         STATUS_INFO    TEXT                        NOT NULL,
+         TASK_ID        INTEGER                        NOT NULL,
+         CREATED_BY     TEXT                        NOT NULL
+         );
+         """,
+            """
+        CREATE TABLE IF NOT EXISTS INTERNALS (
+         ID       INTEGER    PRIMARY KEY  AUTOINCREMENT  NOT NULL,
+         NAME      TEXT                                  NOT NULL,
+         EMAIL     TEXT                                  NOT NULL,
+         PHONE    INTEGER                                        ,
+         TASK_ID  INTEGER                                        ,
+         PROJECT_ID INTEGER                              NOT NULL
+        );
+        """,
+            """
+        CREATE TABLE IF NOT EXISTS EXTERNALS (
+         ID       INTEGER    PRIMARY KEY  AUTOINCREMENT  NOT NULL,
+         NAME      TEXT                                  NOT NULL,
+         EMAIL     TEXT                                  NOT NULL,
+         PHONE    INTEGER                                        ,
+         PROJECT_ID INTEGER                              NOT NULL
+        );
+        """,
+        ],
+    ),
+    (
+        2,
+        "Secondary indexes for project and task lookups",
+        [
+            "CREATE INDEX IF NOT EXISTS IDX_TASKS_PROJECT_ID ON TASKS(PROJECT_ID);",
+            "CREATE INDEX IF NOT EXISTS IDX_TASKLOGS_TASK_ID ON TASKLOGS(TASK_ID);",
+            "CREATE INDEX IF NOT EXISTS IDX_INTERNALS_PROJECT_TASK ON INTERNALS(PROJECT_ID, TASK_ID);",
+            "CREATE INDEX IF NOT EXISTS IDX_EXTERNALS_PROJECT_ID ON EXTERNALS(PROJECT_ID);",
+        ],
+    ),
+    (
+        3,
+        "Foreign keys with ON DELETE CASCADE, orphaned rows are dropped",
+        [
+            """
+        CREATE TABLE TASKS_NEW (
+         ID            INTEGER   PRIMARY KEY  AUTOINCREMENT  NOT NULL,
+         PRIORITY       TEXT                        NOT NULL,
+         OBJECTIVE      TEXT                        NOT NULL,
+         DESCRIPTION    TEXT                        NOT NULL,
+         START          TEXT                        NOT NULL,
+         END            TEXT                        NOT NULL,
+         STATUS         TEXT                        NOT NULL,
+         STATUS_INFO    TEXT                        NOT NULL,
+         DEPENDENT_ON   TEXT                        NOT NULL,
+         PROJECT_ID     INTEGER                     NOT NULL
+                        REFERENCES PROJECTS(ID) ON DELETE CASCADE,
+         CREATED_BY      TEXT                        NOT NULL
+         );
+         """,
+            """
+        INSERT INTO TASKS_NEW
+        SELECT * FROM TASKS WHERE PROJECT_ID IN (SELECT ID FROM PROJECTS);
+        """,
+            """
+        CREATE TABLE TASKLOGS_NEW (
+         ID            INTEGER   PRIMARY KEY  AUTOINCREMENT  NOT NULL,
+         STATUS         TEXT                        NOT NULL,
+         STATUS_INFO    TEXT                        NOT NULL,
+         TASK_ID        INTEGER                        NOT NULL
+                        REFERENCES TASKS(ID) ON DELETE CASCADE,
+         CREATED_BY     TEXT                        NOT NULL
+         );
+         """,
+            """
+        INSERT INTO TASKLOGS_NEW
+        SELECT * FROM TASKLOGS WHERE TASK_ID IN (SELECT ID FROM TASKS_NEW);
+        """,
+            """
+        CREATE TABLE INTERNALS_NEW (
+         ID       INTEGER    PRIMARY KEY  AUTOINCREMENT  NOT NULL,
+         NAME      TEXT                                  NOT NULL,
+         EMAIL     TEXT                                  NOT NULL,
+         PHONE    INTEGER                                        ,
+         TASK_ID  INTEGER    REFERENCES TASKS(ID) ON DELETE SET NULL,
+         PROJECT_ID INTEGER                              NOT NULL
+                    REFERENCES PROJECTS(ID) ON DELETE CASCADE
+        );
+        """,
+            """
+        INSERT INTO INTERNALS_NEW
+        SELECT ID, NAME, EMAIL, PHONE,
+               CASE WHEN TASK_ID IN (SELECT ID FROM TASKS_NEW) THEN TASK_ID END,
+               PROJECT_ID
+        FROM INTERNALS WHERE PROJECT_ID IN (SELECT ID FROM PROJECTS);
+        """,
+            """
+        CREATE TABLE EXTERNALS_NEW (
+         ID       INTEGER    PRIMARY KEY  AUTOINCREMENT  NOT NULL,
+         NAME      TEXT                                  NOT NULL,
+         EMAIL     TEXT                                  NOT NULL,
+         PHONE    INTEGER                                        ,
+         PROJECT_ID INTEGER                              NOT NULL
+                    REFERENCES PROJECTS(ID) ON DELETE CASCADE
+        );
+        """,
+            """
+        INSERT INTO EXTERNALS_NEW
+        SELECT * FROM EXTERNALS WHERE PROJECT_ID IN (SELECT ID FROM PROJECTS);
+        """,
+        ]
+        + [
+            statement.format(table=table)
+            for table in ("TASKS", "TASKLOGS", "INTERNALS", "EXTERNALS")
+            for statement in (
+                # carry AUTOINCREMENT counters over so deleted ids are not reused
+                "DELETE FROM sqlite_sequence WHERE name = '{table}_NEW';",
+                "UPDATE sqlite_sequence SET name = '{table}_NEW' WHERE name = '{table}';",
+                "DROP TABLE {table};",
+                "ALTER TABLE {table}_NEW RENAME TO {table};",
+            )
+        ]
+        + [
+            "CREATE INDEX IDX_TASKS_PROJECT_ID ON TASKS(PROJECT_ID);",
+            "CREATE INDEX IDX_TASKLOGS_TASK_ID ON TASKLOGS(TASK_ID);",
+            "CREATE INDEX IDX_INTERNALS_PROJECT_TASK ON INTERNALS(PROJECT_ID, TASK_ID);",
+            "CREATE INDEX IDX_INTERNALS_TASK_ID ON INTERNALS(TASK_ID);",
+            "CREATE INDEX IDX_EXTERNALS_PROJECT_ID ON EXTERNALS(PROJECT_ID);",
+        ],
+    ),
+    (
+        4,
+        "Indexes for filtered, keyset paginated listings",
+        [
+            "CREATE INDEX IDX_PROJECTS_CREATED_BY ON PROJECTS(CREATED_BY);",
+            "CREATE INDEX IDX_PROJECTS_CATEGORY ON PROJECTS(CATEGORY);",
+            "CREATE INDEX IDX_TASKS_PROJECT_STATUS ON TASKS(PROJECT_ID, STATUS);",
+            "CREATE INDEX IDX_TASKS_PROJECT_PRIORITY ON TASKS(PROJECT_ID, PRIORITY);",
+        ],
+    ),
+    (
+        5,
+        "FTS5 full-text indexes over projects, tasks & task logs",
+        [
+            statement.format(table=table, columns=columns, new=new, old=old)
+            for table, columns, new, old in (
+                (
+                    "PROJECTS",
+                    "NAME, CATEGORY, TAGS, DESCRIPTION",
+                    "new.NAME, new.CATEGORY, new.TAGS, new.DESCRIPTION",
+                    "old.NAME, old.CATEGORY, old.TAGS, old.DESCRIPTION",
+                ),
+                (
+                    "TASKS",
+                    "OBJECTIVE, DESCRIPTION, STATUS_INFO",
+                    "new.OBJECTIVE, new.DESCRIPTION, new.STATUS_INFO",
+                    "old.OBJECTIVE, old.DESCRIPTION, old.STATUS_INFO",
+                ),
+                ("TASKLOGS", "STATUS_INFO", "new.STATUS_INFO", "old.STATUS_INFO"),
+            )
+            for statement in (
+                """
+        CREATE VIRTUAL TABLE {table}_FTS USING fts5(
+         {columns}, content='{table}', content_rowid='ID'
+        );
+        """,
+                """
+        CREATE TRIGGER {table}_FTS_INSERT AFTER INSERT ON {table} BEGIN
+         INSERT INTO {table}_FTS(rowid, {columns}) VALUES (new.ID, {new});
+        END;
+        """,
+                """
+        CREATE TRIGGER {table}_FTS_DELETE AFTER DELETE ON {table} BEGIN
+         INSERT INTO {table}_FTS({table}_FTS, rowid, {columns})
+         VALUES ('delete', old.ID, {old});
+        END;
+        """,
+                """
+        CREATE TRIGGER {table}_FTS_UPDATE AFTER UPDATE OF {columns} ON {table} BEGIN
+         INSERT INTO {table}_FTS({table}_FTS, rowid, {columns})
+         VALUES ('delete', old.ID, {old});
+         INSERT INTO {table}_FTS(rowid, {columns}) VALUES (new.ID, {new});
+        END;
+        """,
+                "INSERT INTO {table}_FTS({table}_FTS) VALUES ('rebuild');",
+            )
+        ],
+    ),
+    (
+        6,
+        "Normalized TASK_DEPENDENCIES edges parsed from DEPENDENT_ON",
+        [
+            """
+        CREATE TABLE TASK_DEPENDENCIES (
+         TASK_ID     INTEGER   NOT NULL   REFERENCES TASKS(ID) ON DELETE CASCADE,
+         DEPENDS_ON  INTEGER   NOT NULL   REFERENCES TASKS(ID) ON DELETE CASCADE,
+         PRIMARY KEY (TASK_ID, DEPENDS_ON)
+        ) WITHOUT ROWID;
+        """,
+            "CREATE INDEX IDX_TASK_DEPENDENCIES_DEPENDS_ON ON TASK_DEPENDENCIES(DEPENDS_ON, TASK_ID);",
+            # DEPENDENT_ON "3, 7" is read as json array [3, 7], unknown ids are skipped
+            """
+        CREATE TRIGGER TASKS_DEPENDENCIES_INSERT AFTER INSERT ON TASKS BEGIN
+         INSERT OR IGNORE INTO TASK_DEPENDENCIES(TASK_ID, DEPENDS_ON)
+         SELECT new.ID, j.value FROM json_each(
+           CASE WHEN json_valid('[' || new.DEPENDENT_ON || ']')
+           THEN '[' || new.DEPENDENT_ON || ']' ELSE '[]' END
+         ) j
+         WHERE j.type = 'integer' AND j.value <> new.ID
+           AND j.value IN (SELECT ID FROM TASKS);
+        END;
+        """,
+            """
+        CREATE TRIGGER TASKS_DEPENDENCIES_UPDATE AFTER UPDATE OF DEPENDENT_ON ON TASKS BEGIN
+         DELETE FROM TASK_DEPENDENCIES WHERE TASK_ID = new.ID;
+         INSERT OR IGNORE INTO TASK_DEPENDENCIES(TASK_ID, DEPENDS_ON)
+         SELECT new.ID, j.value FROM json_each(
+           CASE WHEN json_valid('[' || new.DEPENDENT_ON || ']')
+           THEN '[' || new.DEPENDENT_ON || ']' ELSE '[]' END
+         ) j
+         WHERE j.type = 'integer' AND j.value <> new.ID
+           AND j.value IN (SELECT ID FROM TASKS);
+        END;
+        """,
+            """
+        INSERT OR IGNORE INTO TASK_DEPENDENCIES(TASK_ID, DEPENDS_ON)
+        SELECT t.ID, j.value FROM TASKS t, json_each(
+          CASE WHEN json_valid('[' || t.DEPENDENT_ON || ']')
+          THEN '[' || t.DEPENDENT_ON || ']' ELSE '[]' END
+        ) j
+        WHERE j.type = 'integer' AND j.value <> t.ID
+          AND j.value IN (SELECT ID FROM TASKS);
+        """,
+        ],
+    ),
+    (
+        7,
+        "Tag dictionary & project-tag join table",
+        [
+            """
+        CREATE TABLE TAGS (
+         ID     INTEGER   PRIMARY KEY  AUTOINCREMENT  NOT NULL,
+         NAME   TEXT      UNIQUE                      NOT NULL
+        );
+        """,
+            """
+        CREATE TABLE PROJECT_TAGS (
+         TAG_ID      INTEGER   NOT NULL   REFERENCES TAGS(ID) ON DELETE CASCADE,
+         PROJECT_ID  INTEGER   NOT NULL   REFERENCES PROJECTS(ID) ON DELETE CASCADE,
+         PRIMARY KEY (TAG_ID, PROJECT_ID)
+        ) WITHOUT ROWID;
+        """,
+            "CREATE INDEX IDX_PROJECT_TAGS_PROJECT_ID ON PROJECT_TAGS(PROJECT_ID, TAG_ID);",
+            # TAGS "moon, nasa" is read as json array ["moon", " nasa"],
+            # afterwards ProjectManager keeps PROJECT_TAGS in sync
+            """
+        CREATE TEMP TABLE SPLIT_TAGS AS
+        SELECT q.ID AS PROJECT_ID, lower(trim(j.value)) AS NAME
+        FROM (
+          SELECT ID,
+            '["' || replace(replace(replace(TAGS, '\\', '\\\\'), '"', '\\"'), ',', '","') || '"]'
+            AS TAGS_JSON
+          FROM PROJECTS
+        ) q, json_each(
+          CASE WHEN json_valid(q.TAGS_JSON) THEN q.TAGS_JSON ELSE '[]' END
+        ) j
+        WHERE trim(j.value) <> '';
+        """,
+            "INSERT OR IGNORE INTO TAGS(NAME) SELECT NAME FROM SPLIT_TAGS;",
+            """
+        INSERT OR IGNORE INTO PROJECT_TAGS(TAG_ID, PROJECT_ID)
+        SELECT t.ID, s.PROJECT_ID FROM SPLIT_TAGS s JOIN TAGS t ON t.NAME = s.NAME;
+        """,
+            "DROP TABLE SPLIT_TAGS;",
+        ],
+    ),
+    (
+        8,
+        "Incrementally maintained project summaries",
+        [
+            statement.format(closed=CLOSED_STATUSES_SQL)
+            for statement in [
+            """
+        CREATE TABLE PROJECT_SUMMARY (
+         PROJECT_ID  INTEGER   PRIMARY KEY   REFERENCES PROJECTS(ID) ON DELETE CASCADE,
+         TASKS       INTEGER   NOT NULL      DEFAULT 0,
+         LOGS        INTEGER   NOT NULL      DEFAULT 0
+        );
+        """,
+            # DIMENSION is STATUS, PRIORITY or OPEN_END (END date of tasks not closed)
+            """
+        CREATE TABLE PROJECT_SUMMARY_COUNTS (
+         PROJECT_ID  INTEGER   NOT NULL   REFERENCES PROJECTS(ID) ON DELETE CASCADE,
+         DIMENSION   TEXT      NOT NULL,
+         VALUE       TEXT      NOT NULL,
+         COUNT       INTEGER   NOT NULL,
+         PRIMARY KEY (PROJECT_ID, DIMENSION, VALUE)
+        ) WITHOUT ROWID;
+        """,
+            """
+        CREATE TRIGGER PROJECTS_SUMMARY_INSERT AFTER INSERT ON PROJECTS BEGIN
+         INSERT INTO PROJECT_SUMMARY(PROJECT_ID) VALUES (new.ID);
+        END;
+        """,
+            """
+        CREATE TRIGGER TASKS_SUMMARY_INSERT AFTER INSERT ON TASKS BEGIN
+         UPDATE PROJECT_SUMMARY SET TASKS = TASKS + 1 WHERE PROJECT_ID = new.PROJECT_ID;
+         INSERT INTO PROJECT_SUMMARY_COUNTS(PROJECT_ID, DIMENSION, VALUE, COUNT)
+         SELECT new.PROJECT_ID, 'STATUS', new.STATUS, 1
+         UNION ALL SELECT new.PROJECT_ID, 'PRIORITY', new.PRIORITY, 1
+         UNION ALL SELECT new.PROJECT_ID, 'OPEN_END', new.END, 1
+          WHERE lower(new.STATUS) NOT IN {closed}
+         ON CONFLICT(PROJECT_ID, DIMENSION, VALUE) DO UPDATE SET COUNT = COUNT + 1;
+        END;
+        """,
+            # runs before cascades remove the task's logs, while they can still be counted
+            """
+        CREATE TRIGGER TASKS_SUMMARY_DELETE BEFORE DELETE ON TASKS BEGIN
+         UPDATE PROJECT_SUMMARY
+         SET TASKS = TASKS - 1,
+             LOGS = LOGS - (SELECT count(*) FROM TASKLOGS WHERE TASK_ID = old.ID)
+         WHERE PROJECT_ID = old.PROJECT_ID;
+         UPDATE PROJECT_SUMMARY_COUNTS SET COUNT = COUNT - 1
+         WHERE PROJECT_ID = old.PROJECT_ID AND (
+           (DIMENSION = 'STATUS' AND VALUE = old.STATUS)
+           OR (DIMENSION = 'PRIORITY' AND VALUE = old.PRIORITY)
+           OR (DIMENSION = 'OPEN_END' AND VALUE = old.END AND lower(old.STATUS) NOT IN {closed})
+         );
+         DELETE FROM PROJECT_SUMMARY_COUNTS WHERE PROJECT_ID = old.PROJECT_ID AND COUNT <= 0;
+        END;
+        """,
+            """
+        CREATE TRIGGER TASKS_SUMMARY_UPDATE AFTER UPDATE OF STATUS, PRIORITY, END, PROJECT_ID ON TASKS BEGIN
+         UPDATE PROJECT_SUMMARY SET TASKS = TASKS - 1 WHERE PROJECT_ID = old.PROJECT_ID;
+         UPDATE PROJECT_SUMMARY SET TASKS = TASKS + 1 WHERE PROJECT_ID = new.PROJECT_ID;
+         UPDATE PROJECT_SUMMARY_COUNTS SET COUNT = COUNT - 1
+         WHERE PROJECT_ID = old.PROJECT_ID AND (
+           (DIMENSION = 'STATUS' AND VALUE = old.STATUS)
+           OR (DIMENSION = 'PRIORITY' AND VALUE = old.PRIORITY)
+           OR (DIMENSION = 'OPEN_END' AND VALUE = old.END AND lower(old.STATUS) NOT IN {closed})
+         );
+         DELETE FROM PROJECT_SUMMARY_COUNTS WHERE PROJECT_ID = old.PROJECT_ID AND COUNT <= 0;
+         INSERT INTO PROJECT_SUMMARY_COUNTS(PROJECT_ID, DIMENSION, VALUE, COUNT)
+         SELECT new.PROJECT_ID, 'STATUS', new.STATUS, 1
+         UNION ALL SELECT new.PROJECT_ID, 'PRIORITY', new.PRIORITY, 1
+         UNION ALL SELECT new.PROJECT_ID, 'OPEN_END', new.END, 1
+          WHERE lower(new.STATUS) NOT IN {closed}
+         ON CONFLICT(PROJECT_ID, DIMENSION, VALUE) DO UPDATE SET COUNT = COUNT + 1;
+        END;
+        """,
+            """
+        CREATE TRIGGER TASKLOGS_SUMMARY_INSERT AFTER INSERT ON TASKLOGS BEGIN
+         UPDATE PROJECT_SUMMARY SET LOGS = LOGS + 1
+         WHERE PROJECT_ID = (SELECT PROJECT_ID FROM TASKS WHERE ID = new.TASK_ID);
+        END;
+        """,
+            """
+        CREATE TRIGGER TASKLOGS_SUMMARY_DELETE AFTER DELETE ON TASKLOGS BEGIN
+         UPDATE PROJECT_SUMMARY SET LOGS = LOGS - 1
+         WHERE PROJECT_ID = (SELECT PROJECT_ID FROM TASKS WHERE ID = old.TASK_ID);
+        END;
+        """,
+            "INSERT INTO PROJECT_SUMMARY(PROJECT_ID, TASKS, LOGS) "
+            + SUMMARY_TOTALS_SQL.format(where="")
+            + ";",
+            "INSERT INTO PROJECT_SUMMARY_COUNTS(PROJECT_ID, DIMENSION, VALUE, COUNT) "
+            + SUMMARY_COUNTS_SQL.format(where="", also="", closed="{closed}")
+            + ";",
+            ]
+        ],
+    ),
+    (
+        9,
+        "Per-project data version bumped on every change to project data",
+        [
+            "ALTER TABLE PROJECT_SUMMARY ADD COLUMN VERSION INTEGER NOT NULL DEFAULT 0;",
+            """
+        CREATE TRIGGER PROJECTS_VERSION_UPDATE AFTER UPDATE ON PROJECTS BEGIN
+         UPDATE PROJECT_SUMMARY SET VERSION = VERSION + 1 WHERE PROJECT_ID = new.ID;
+        END;
+        """,
+        ]
+        + [
+            """
+        CREATE TRIGGER {table}_VERSION_{event} AFTER {event} ON {table} BEGIN
+         UPDATE PROJECT_SUMMARY SET VERSION = VERSION + 1 WHERE PROJECT_ID {match};
+        END;
+        """.format(table=table, event=event, match=match)
+            for table in ("TASKS", "INTERNALS", "EXTERNALS")
+            for event, match in (
+                ("INSERT", "= new.PROJECT_ID"),
+                ("UPDATE", "IN (old.PROJECT_ID, new.PROJECT_ID)"),
+                ("DELETE", "= old.PROJECT_ID"),
+            )
+        ]
+        + [
+            """
+        CREATE TRIGGER TASKLOGS_VERSION_{event} AFTER {event} ON TASKLOGS BEGIN
+         UPDATE PROJECT_SUMMARY SET VERSION = VERSION + 1
+         WHERE PROJECT_ID = (SELECT PROJECT_ID FROM TASKS WHERE ID = {row}.TASK_ID);
+        END;
+        """.format(event=event, row=row)
+            for event, row in (("INSERT", "new"), ("UPDATE", "new"), ("DELETE", "old"))
+        ],
+    ),
+    (
+        10,
+        "Content-addressed BLOBS & PROJECT_FILES attachments",
+        [
+            # CACHED is 0 once the local copy is evicted & must be fetched again
+            """
+        CREATE TABLE BLOBS (
+         HASH       TEXT      PRIMARY KEY   NOT NULL,
+         SIZE       INTEGER   NOT NULL,
+         CACHED     INTEGER   NOT NULL      DEFAULT 1,
+         LAST_USED  REAL      NOT NULL
+        ) WITHOUT ROWID;
+        """,
+            "CREATE INDEX IDX_BLOBS_CACHED_LAST_USED ON BLOBS(CACHED, LAST_USED);",
+            """
+        CREATE TABLE PROJECT_FILES (
+         ID          INTEGER   PRIMARY KEY  AUTOINCREMENT  NOT NULL,
+         PROJECT_ID  INTEGER   NOT NULL     REFERENCES PROJECTS(ID) ON DELETE CASCADE,
+         TASK_ID     INTEGER                REFERENCES TASKS(ID) ON DELETE CASCADE,
+         NAME        TEXT      NOT NULL,
+         HASH        TEXT      NOT NULL     REFERENCES BLOBS(HASH),
+         CREATED_BY  TEXT      NOT NULL
+        );
+        """,
+            "CREATE INDEX IDX_PROJECT_FILES_PROJECT_TASK ON PROJECT_FILES(PROJECT_ID, TASK_ID);",
+            "CREATE INDEX IDX_PROJECT_FILES_TASK_ID ON PROJECT_FILES(TASK_ID);",
+            "CREATE INDEX IDX_PROJECT_FILES_HASH ON PROJECT_FILES(HASH);",
+        ]
+        + [
+            """
+        CREATE TRIGGER PROJECT_FILES_VERSION_{event} AFTER {event} ON PROJECT_FILES BEGIN
+         UPDATE PROJECT_SUMMARY SET VERSION = VERSION + 1 WHERE PROJECT_ID = {row}.PROJECT_ID;
+        END;
+        """.format(event=event, row=row)
+            for event, row in (("INSERT", "new"), ("DELETE", "old"))
+        ],
+    ),
+    (
+        11,
+        "CHANGES log of every write to synced tables",
+        [
+            """
+        CREATE TABLE SYNC_STATE (
+         KEY    TEXT   PRIMARY KEY   NOT NULL,
+         VALUE  TEXT
+        ) WITHOUT ROWID;
+        """,
+            # node identifies this database as ORIGIN of its changes, applying
+            # is set while the sync engine writes remote changes so they are not
+            # logged as local ones
+            """
+        INSERT INTO SYNC_STATE(KEY, VALUE) VALUES
+         ('node', lower(hex(randomblob(8)))),
+         ('applying', '0'),
+         ('pushed', '0'),
+         ('pushed_ts', '0'),
+         ('pulled', '{}');
+        """,
+            """
+        CREATE TABLE CHANGES (
+         SEQ      INTEGER   PRIMARY KEY  AUTOINCREMENT  NOT NULL,
+         TBL      TEXT      NOT NULL,
+         ROW_KEY  TEXT      NOT NULL,
+         OP       TEXT      NOT NULL,
+         DATA     TEXT      NOT NULL,
+         TS       REAL      NOT NULL,
+         ORIGIN   TEXT      NOT NULL
+        );
+        """,
+            "CREATE INDEX IDX_CHANGES_ROW ON CHANGES(TBL, ROW_KEY, TS);",
+        ]
+        + [
+            """
+        CREATE TRIGGER {table}_CHANGES_{event} AFTER {event} ON {table}
+        WHEN (SELECT VALUE FROM SYNC_STATE WHERE KEY = 'applying') = '0'
+        BEGIN
+         INSERT INTO CHANGES(TBL, ROW_KEY, OP, DATA, TS, ORIGIN)
+         VALUES ('{table}', {row}.{key}, '{op}', {data}, {now},
+                 (SELECT VALUE FROM SYNC_STATE WHERE KEY = 'node'));
+        END;
+        """.format(
+                table=table,
+                event=event,
+                row=row,
+                key=key,
+                op=op,
+                data=_row_json(columns if op == "upsert" else (key,), row),
+                now=NOW_SQL,
+            )
+            for table, (key, columns) in _SYNC_TABLES_11.items()
+            for event, row, op in (
+                ("INSERT", "new", "upsert"),
+                ("UPDATE", "new", "upsert"),
+                ("DELETE", "old", "delete"),
+            )
+        ]
+        + [
+            # existing rows are the baseline a first push publishes
+            """
+        INSERT INTO CHANGES(TBL, ROW_KEY, OP, DATA, TS, ORIGIN)
+        SELECT '{table}', {key}, 'upsert', {data}, {now},
+               (SELECT VALUE FROM SYNC_STATE WHERE KEY = 'node')
+        FROM {table} ORDER BY {key};
+        """.format(
+                table=table,
+                key=key,
+                data=_row_json(columns, table),
+                now=NOW_SQL,
+            )
+            for table, (key, columns) in _SYNC_TABLES_11.items()
+        ],
+    ),
+    (
+        12,
+        "Persistent outbound MAIL_QUEUE",
+        [
+            # STATUS is queued, sending, sent or failed
+            """
+        CREATE TABLE MAIL_QUEUE (
+         ID            INTEGER   PRIMARY KEY  AUTOINCREMENT  NOT NULL,
+         PROJECT_ID    INTEGER                REFERENCES PROJECTS(ID) ON DELETE SET NULL,
+         RECIPIENT     TEXT      NOT NULL,
+         SUBJECT       TEXT      NOT NULL,
+         BODY          TEXT      NOT NULL,
+         REPLY_TO      TEXT,
+         STATUS        TEXT      NOT NULL     DEFAULT 'queued',
+         ATTEMPTS      INTEGER   NOT NULL     DEFAULT 0,
+         NEXT_ATTEMPT  REAL      NOT NULL,
+         LAST_ERROR    TEXT,
+         CREATED       REAL      NOT NULL,
+         SENT          REAL
+        );
+        """,
+            "CREATE INDEX IDX_MAIL_QUEUE_STATUS_NEXT ON MAIL_QUEUE(STATUS, NEXT_ATTEMPT);",
+            "CREATE INDEX IDX_MAIL_QUEUE_PROJECT_ID ON MAIL_QUEUE(PROJECT_ID, STATUS);",
+        ],
+    ),
+    (
+        13,
+        "Task REMINDERS indexed on due time",
+        [
+            # DUE & FIRED are unix timestamps, CHANNEL is notify, log or mail
+            """
+        CREATE TABLE REMINDERS (
+         ID          INTEGER   PRIMARY KEY  AUTOINCREMENT  NOT NULL,
+         TASK_ID     INTEGER   NOT NULL     REFERENCES TASKS(ID) ON DELETE CASCADE,
+         DUE         REAL      NOT NULL,
+         MESSAGE     TEXT      NOT NULL,
+         CHANNEL     TEXT      NOT NULL     DEFAULT 'notify',
+         RECIPIENT   TEXT,
+         CREATED_BY  TEXT      NOT NULL,
+         FIRED       REAL,
+         LAST_ERROR  TEXT
+        );
+        """,
+            # only pending reminders are ever looked up by due time
+            "CREATE INDEX IDX_REMINDERS_DUE ON REMINDERS(DUE) WHERE FIRED IS NULL;",
+            "CREATE INDEX IDX_REMINDERS_TASK_ID ON REMINDERS(TASK_ID);",
+        ],
+    ),
+    (
+        14,
+        "Timestamped append-only TASKLOGS with daily status rollups",
+        [
+            # TS is unix time, existing logs get the time their insert was
+            # logged to CHANGES, or now
+            """
+        CREATE TABLE TASKLOGS_NEW (
+         ID            INTEGER   PRIMARY KEY  AUTOINCREMENT  NOT NULL,
+         STATUS         TEXT                        NOT NULL,
+         STATUS_INFO    TEXT                        NOT NULL,
+         TASK_ID        INTEGER                        NOT NULL
+                        REFERENCES TASKS(ID) ON DELETE CASCADE,
+         CREATED_BY     TEXT                        NOT NULL,
+         TS             REAL                        NOT NULL    DEFAULT ({now})
+         );
+         """.format(now=NOW_SQL),
+            """
+        INSERT INTO TASKLOGS_NEW(ID, STATUS, STATUS_INFO, TASK_ID, CREATED_BY, TS)
+        SELECT l.ID, l.STATUS, l.STATUS_INFO, l.TASK_ID, l.CREATED_BY,
+               coalesce(
+                 (SELECT min(c.TS) FROM CHANGES c
+                  WHERE c.TBL = 'TASKLOGS' AND c.ROW_KEY = CAST(l.ID AS TEXT)),
+                 {now})
+        FROM TASKLOGS l;
+        """.format(now=NOW_SQL),
+            "DELETE FROM sqlite_sequence WHERE name = 'TASKLOGS_NEW';",
+            "UPDATE sqlite_sequence SET name = 'TASKLOGS_NEW' WHERE name = 'TASKLOGS';",
+            "DROP TABLE TASKLOGS;",
+            # TASKS_SUMMARY_DELETE names TASKLOGS, which a checked rename finds missing
+            "PRAGMA legacy_alter_table = ON;",
+            "ALTER TABLE TASKLOGS_NEW RENAME TO TASKLOGS;",
+            "PRAGMA legacy_alter_table = OFF;",
+            # serves per task lookups & cascades as well as time windows
+            "CREATE INDEX IDX_TASKLOGS_TASK_TS ON TASKLOGS(TASK_ID, TS);",
+            """
+        CREATE TRIGGER TASKLOGS_APPEND_ONLY BEFORE UPDATE ON TASKLOGS BEGIN
+         SELECT RAISE(ABORT, 'TASKLOGS is append-only');
+        END;
+        """,
+            # DAY is the UTC date, COUNT the logs that moved tasks of the
+            # project into STATUS that day. Rollups are history, deleting or
+            # compacting logs leaves them as they are.
+            """
+        CREATE TABLE TASKLOG_ROLLUPS (
+         PROJECT_ID  INTEGER   NOT NULL   REFERENCES PROJECTS(ID) ON DELETE CASCADE,
+         DAY         TEXT      NOT NULL,
+         STATUS      TEXT      NOT NULL,
+         COUNT       INTEGER   NOT NULL,
+         PRIMARY KEY (PROJECT_ID, DAY, STATUS)
+        ) WITHOUT ROWID;
+        """,
+            """
+        INSERT INTO TASKLOG_ROLLUPS(PROJECT_ID, DAY, STATUS, COUNT)
+        SELECT t.PROJECT_ID, date(l.TS, 'unixepoch'), l.STATUS, count(*)
+        FROM TASKLOGS l JOIN TASKS t ON t.ID = l.TASK_ID
+        GROUP BY t.PROJECT_ID, date(l.TS, 'unixepoch'), l.STATUS;
+        """,
+            # triggers went with the old table, updates need none now
+            """
+        CREATE TRIGGER TASKLOGS_ROLLUP_INSERT AFTER INSERT ON TASKLOGS BEGIN
+         INSERT INTO TASKLOG_ROLLUPS(PROJECT_ID, DAY, STATUS, COUNT)
+         SELECT PROJECT_ID, date(new.TS, 'unixepoch'), new.STATUS, 1 FROM TASKS
+         WHERE ID = new.TASK_ID
+         ON CONFLICT(PROJECT_ID, DAY, STATUS) DO UPDATE SET COUNT = COUNT + 1;
+        END;
+        """,
+            """
+        CREATE TRIGGER TASKLOGS_FTS_INSERT AFTER INSERT ON TASKLOGS BEGIN
+         INSERT INTO TASKLOGS_FTS(rowid, STATUS_INFO) VALUES (new.ID, new.STATUS_INFO);
+        END;
+        """,
+            """
+        CREATE TRIGGER TASKLOGS_FTS_DELETE AFTER DELETE ON TASKLOGS BEGIN
+         INSERT INTO TASKLOGS_FTS(TASKLOGS_FTS, rowid, STATUS_INFO)
+         VALUES ('delete', old.ID, old.STATUS_INFO);
+        END;
+        """,
+            """
+        CREATE TRIGGER TASKLOGS_SUMMARY_INSERT AFTER INSERT ON TASKLOGS BEGIN
+         UPDATE PROJECT_SUMMARY SET LOGS = LOGS + 1
+         WHERE PROJECT_ID = (SELECT PROJECT_ID FROM TASKS WHERE ID = new.TASK_ID);
+        END;
+        """,
+            """
+        CREATE TRIGGER TASKLOGS_SUMMARY_DELETE AFTER DELETE ON TASKLOGS BEGIN
+         UPDATE PROJECT_SUMMARY SET LOGS = LOGS - 1
+         WHERE PROJECT_ID = (SELECT PROJECT_ID FROM TASKS WHERE ID = old.TASK_ID);
+        END;
+        """,
+        ]
+        + [
+            """
+        CREATE TRIGGER TASKLOGS_VERSION_{event} AFTER {event} ON TASKLOGS BEGIN
+         UPDATE PROJECT_SUMMARY SET VERSION = VERSION + 1
+         WHERE PROJECT_ID = (SELECT PROJECT_ID FROM TASKS WHERE ID = {row}.TASK_ID);
+        END;
+        """.format(event=event, row=row)
+            for event, row in (("INSERT", "new"), ("DELETE", "old"))
+        ]
+        + [
+            """
+        CREATE TRIGGER TASKLOGS_CHANGES_{event} AFTER {event} ON TASKLOGS
+        WHEN (SELECT VALUE FROM SYNC_STATE WHERE KEY = 'applying') = '0'
+        BEGIN
+         INSERT INTO CHANGES(TBL, ROW_KEY, OP, DATA, TS, ORIGIN)
+         VALUES ('TASKLOGS', {row}.ID, '{op}', {data}, {now},
+                 (SELECT VALUE FROM SYNC_STATE WHERE KEY = 'node'));
+        END;
+        """.format(
+                event=event,
+                row=row,
+                op=op,
+                data=_row_json(SYNC_TABLES["TASKLOGS"][1] if op == "upsert" else ("ID",), row),
+                now=NOW_SQL,
+            )
+            for event, row, op in (("INSERT", "new", "upsert"), ("DELETE", "old", "delete"))
+        ],
+    ),
+    (
+        15,
+        "SYNC_KEYS mapping ids of rows from other nodes to local ids",
+        [
+            # Synced rows are known across nodes as "<origin node>:<id at origin>",
+            # rows created here are "<node>:<ID>" and need no entry
+            """
+        CREATE TABLE SYNC_KEYS (
+         TBL       TEXT      NOT NULL,
+         GID       TEXT      NOT NULL,
+         LOCAL_ID  INTEGER   NOT NULL,
+         PRIMARY KEY (TBL, GID)
+        ) WITHOUT ROWID;
+        """,
+            "CREATE UNIQUE INDEX IDX_SYNC_KEYS_LOCAL ON SYNC_KEYS(TBL, LOCAL_ID);",
+            # rows pulled before kept the id of their origin, their first change tells which
+            """
+        INSERT OR IGNORE INTO SYNC_KEYS(TBL, GID, LOCAL_ID)
+        SELECT c.TBL, c.ORIGIN || ':' || c.ROW_KEY, CAST(c.ROW_KEY AS INTEGER)
+        FROM CHANGES c
+        WHERE c.TBL <> 'ACCOUNTS'
+        AND c.ORIGIN <> (SELECT VALUE FROM SYNC_STATE WHERE KEY = 'node')
+        AND c.SEQ = (SELECT f.SEQ FROM CHANGES f WHERE f.TBL = c.TBL AND f.ROW_KEY = c.ROW_KEY
+                     ORDER BY f.TS, f.SEQ LIMIT 1);
+        """,
+        ],
+    ),
+    (
+        16,
+        "SESSIONS of random expiring keys replacing keys derived from the account",
+        [
+            # KEY is secure_hash(session key, mail), the key itself is only known to the client
+            """
+        CREATE TABLE SESSIONS (
+         KEY       TEXT      PRIMARY KEY   NOT NULL,
+         MAIL      TEXT      NOT NULL      REFERENCES ACCOUNTS(MAIL) ON DELETE CASCADE,
+         CREATED   REAL      NOT NULL,
+         EXPIRES   REAL      NOT NULL
+        ) WITHOUT ROWID;
+        """,
+            "CREATE INDEX IDX_SESSIONS_MAIL ON SESSIONS(MAIL);",
+            """
+        CREATE TRIGGER ACCOUNTS_SESSIONS_REVOKE AFTER UPDATE OF SECURITYKEY ON ACCOUNTS
+        WHEN old.SECURITYKEY <> new.SECURITYKEY
+        BEGIN
+         DELETE FROM SESSIONS WHERE MAIL = new.MAIL;
+        END;
+        """,
+        ],
+    ),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Queries on hot paths of the managers, each must be served by an index.
+HOT_QUERIES = [
+    ("Select * from Tasks where project_id=?;", (1,)),
+    ("DELETE FROM TASKLOGS WHERE task_id = ?;", (1,)),
+    (
+        "DELETE FROM TASKLOGS WHERE task_id IN (SELECT id FROM TASKS WHERE project_id=?) ;",
+        (1,),
+    ),
+    ("Select * from Internals where project_id=?;", (1,)),
+    ("Select * from Internals where project_id=? and task_id=?;", (1, 1)),
+    ("Select * from Externals where project_id=?;", (1,)),
+    (
+        "SELECT t.ID, t.OBJECTIVE, t.STATUS FROM TASK_DEPENDENCIES d JOIN TASKS t ON t.ID = d.TASK_ID WHERE d.DEPENDS_ON = ?;",
+        (1,),
+    ),
+    (
+        "SELECT t.ID, t.OBJECTIVE, t.STATUS FROM TASK_DEPENDENCIES d JOIN TASKS t ON t.ID = d.DEPENDS_ON WHERE d.TASK_ID = ?;",
+        (1,),
+    ),
+    (
+        "SELECT p.ID FROM PROJECT_TAGS pt JOIN TAGS t ON t.ID = pt.TAG_ID JOIN PROJECTS p ON p.ID = pt.PROJECT_ID WHERE t.NAME IN (?, ?) GROUP BY p.ID HAVING count(*) = 2;",
+        ("moon", "nasa"),
+    ),
+    (
+        "SELECT id, objective, status FROM TASKS WHERE project_id = ? AND status = ? AND id > ? ORDER BY id ASC LIMIT ?;",
+        (1, "open", 0, 50),
+    ),
+    (
+        "SELECT id, objective, priority FROM TASKS WHERE project_id = ? AND (priority, id) > (?, ?) ORDER BY priority ASC, id ASC LIMIT ?;",
+        (1, "1", 0, 50),
+    ),
+    ("SELECT * FROM PROJECT_FILES WHERE project_id = ? ORDER BY id;", (1,)),
+    ("SELECT count(*) FROM PROJECT_FILES WHERE hash = ?;", ("0" * 64,)),
+    (
+        "SELECT id FROM MAIL_QUEUE WHERE status = 'queued' AND next_attempt <= ? ORDER BY next_attempt LIMIT ?;",
+        (0.0, 50),
+    ),
+    ("SELECT status, count(*) FROM MAIL_QUEUE WHERE project_id = ? GROUP BY status;", (1,)),
+    (
+        "SELECT id, due FROM REMINDERS WHERE fired IS NULL AND due >= ? AND due < ? AND id <= ?;",
+        (0.0, 3600.0, 100),
+    ),
+    ("SELECT * FROM REMINDERS WHERE task_id = ? ORDER BY due;", (1,)),
+    (
+        "SELECT l.TS, l.ID FROM TASKS t JOIN TASKLOGS l ON l.TASK_ID = t.ID WHERE t.PROJECT_ID = ? AND l.TS >= ? AND l.TS < ? ORDER BY l.TS, l.ID;",
+        (1, 0.0, 86400.0),
+    ),
+    ("SELECT TS, ID FROM TASKLOGS WHERE TASK_ID = ? AND TS >= ? ORDER BY TS;", (1, 0.0)),
+    ("SELECT LOCAL_ID FROM SYNC_KEYS WHERE TBL = ? AND GID = ?;", ("TASKS", "ab:1")),
+    ("SELECT GID FROM SYNC_KEYS WHERE TBL = ? AND LOCAL_ID = ?;", ("TASKS", 1)),
+    (
+        "SELECT s.EXPIRES FROM SESSIONS s WHERE s.KEY = ? AND s.MAIL = ? AND s.EXPIRES > ?;",
+        ("0" * 128, "a@example.com", 0.0),
+    ),
+    ("DELETE FROM SESSIONS WHERE MAIL = ?;", ("a@example.com",)),
+    (
+        "SELECT DAY, STATUS, sum(COUNT) FROM TASKLOG_ROLLUPS WHERE PROJECT_ID = ? AND DAY >= ? GROUP BY DAY, STATUS;",
+        (1, "2026-01-01"),
+    ),
+]
+
+
+def schema_version(connection):
+    return connection.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def migrate(connection):
+    """
+        Applies pending migrations, returns list of applied versions
+    """
+    applied = []
+    current = schema_version(connection)
+
+    if current >= LATEST_VERSION:
+        return applied
+
+    if connection.in_transaction:
+        connection.commit()
+
+    # Tables are rebuilt to change constraints, which must not trigger cascades
+    foreign_keys = connection.execute("PRAGMA foreign_keys;").fetchone()[0]
+    connection.execute("PRAGMA foreign_keys = OFF;")
+
+    try:
+        for version, _, statements in MIGRATIONS:
+            if version <= current:
+                continue
+
+            try:
+                # takes the write lock up front, another connection may have
+                # applied this version while this one waited for it
+                connection.execute("BEGIN IMMEDIATE;")
+                current = schema_version(connection)
+                if version <= current:
+                    connection.rollback()
+                    continue
+                for statement in statements:
+                    connection.execute(statement)
+                violations = connection.execute("PRAGMA foreign_key_check;").fetchall()
+                if violations:
+                    raise sqlite3.IntegrityError(
+                        "Migration {} leaves {} foreign key violations".format(
+                            version, len(violations)
+                        )
+                    )
+                connection.execute("PRAGMA user_version = {};".format(int(version)))
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+
+            applied.append(version)
+    finally:
+        connection.execute("PRAGMA foreign_keys = {};".format(int(foreign_keys)))
+
+    return applied
+
+
+def ensure_schema(connection):
+    """
+        Cheap check used by managers, migrates only if schema is behind
+    """
+    if schema_version(connection) < LATEST_VERSION:
+        migrate(connection)
+
+    if not connection.in_transaction:
+        connection.execute("PRAGMA foreign_keys = ON;")
+
+
+def query_plan(connection, sql, params=()):
+    return [
+        row[3]
+        for row in connection.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    ]
+
+
+def uses_index(plan):
+    """
+        True if no step of the plan is a full table scan
+    """
+    for detail in plan:
+        if detail.startswith("SCAN") and "USING" not in detail:
+            return False
+    return True
+
+
+def check_query_plans(connection):
+    """
+        Returns {sql: plan} for every hot query that does a full table scan
+    """
+    failures = {}
+    for sql, params in HOT_QUERIES:
+        plan = query_plan(connection, sql, params)
+        if not uses_index(plan):
+            failures[sql] = plan
+    return failures
@@ -0,0 +1,408 @@
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict
+from datetime import date
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from core_utils import secure_hash
+from migrations import ensure_schema
+from connection_utils import DB_PATH, connect
+from paging_utils import (
+    PAGE_SIZE,
+    PROJECT_COLUMNS,
+    TASK_COLUMNS,
+    TASKLOG_COLUMNS,
+    INTERNAL_COLUMNS,
+    EXTERNAL_COLUMNS,
+    keyset_pages,
+)
+from summary_utils import read_summary
+
+HOST = "127.0.0.1"
+PORT = 8080
+
+# Read connections shared by the request threads
+CONNECTIONS = 4
+
+MAX_PAGE_SIZE = 500
+
+logger = logging.getLogger("corem.http")
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class DataVersions:
+    """
+        What a request may answer from memory: the VERSION of projects from
+        PROJECT_SUMMARY and the sessions already verified, with their expiry.
+
+        Everything is dropped as soon as PRAGMA data_version of the watch
+        connection moves, which it does on every commit of any other
+        connection or process, so a conditional request of an unchanged
+        project costs one pragma and no reads. The generation counts those
+        moves and versions listings that are not of one project.
+    """
+
+    def __init__(self, connection):
+        self._conn = connection
+        self._lock = threading.Lock()
+        self._seen = None
+        self.generation = 0
+        self.projects = {}
+        self.sessions = {}
+
+    def check(self):
+        with self._lock:
+            seen = self._conn.execute("PRAGMA data_version;").fetchone()[0]
+            if seen != self._seen:
+                self._seen = seen
+                self.generation += 1
+                self.projects.clear()
+                self.sessions.clear()
+            return self.generation
+
+    def remember(self, cache, key, value, generation):
+        """
+            Caches value read at generation in projects or sessions, unless
+            data changed since, so a read that raced a commit is not kept
+        """
+        with self._lock:
+            if generation == self.generation:
+                cache[key] = value
+
+
+class ApiServer(ThreadingHTTPServer):
+    """
+        Read-only HTTP/JSON API over a database, a thread per request drawing
+        from a pool of query_only connections
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, db_path=None, connections=CONNECTIONS):
+        self.db_path = db_path or DB_PATH
+        self._pool = queue.LifoQueue()
+        self._opened = []
+        for _ in range(connections):
+            connection = self._open()
+            self._pool.put(connection)
+        self.versions = DataVersions(self._open())
+        # ETags of listings outlive a generation only within this process
+        self.boot = os.urandom(4).hex()
+        super().__init__(address, ApiHandler)
+
+    def _open(self):
+        connection = connect(self.db_path, "server", check_same_thread=False)
+        ensure_schema(connection)
+        connection.execute("PRAGMA query_only = ON;")
+        self._opened.append(connection)
+        return connection
+
+    @contextmanager
+    def connection(self):
+        connection = self._pool.get()
+        try:
+            yield connection
+        finally:
+            self._pool.put(connection)
+
+    def server_close(self):
+        super().server_close()
+        for connection in self._opened:
+            connection.close()
+
+
+def _page_args(query):
+    try:
+        limit = int(query.get("limit", PAGE_SIZE))
+        after = query.get("after")
+        after = int(after) if after is not None else None
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST, "limit & after must be integers")
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise HttpError(
+            HTTPStatus.BAD_REQUEST, "limit must be between 1 and {}".format(MAX_PAGE_SIZE)
+        )
+    return limit, after
+
+
+def _page(connection, table, columns, filters, query):
+    """
+        One keyset page as {"items": [...], "next": id to pass as after or null}
+    """
+    limit, after = _page_args(query)
+    pages = keyset_pages(
+        connection,
+        table,
+        columns,
+        columns,
+        filters,
+        page_size=limit,
+        after=(after,) if after is not None else None,
+    )
+    items = [dict(zip(columns, row)) for row in next(pages, [])]
+    return {
+        "items": items,
+        "next": items[-1]["id"] if len(items) == limit else None,
+    }
+
+
+def _one(connection, table, columns, filters):
+    row = connection.execute(
+        "SELECT {} FROM {} WHERE {};".format(
+            ", ".join(columns), table, " AND ".join("{} = ?".format(name) for name in filters)
+        ),
+        list(filters.values()),
+    ).fetchone()
+    if row is None:
+        raise HttpError(HTTPStatus.NOT_FOUND, "No such {}".format(table.lower()[:-1]))
+    return dict(zip(columns, row))
+
+
+def list_projects(connection, query):
+    return _page(connection, "PROJECTS", PROJECT_COLUMNS, {}, query)
+
+
+def show_project(connection, query, project_id):
+    return _one(connection, "PROJECTS", PROJECT_COLUMNS, {"id": project_id})
+
+
+def project_summary(connection, query, project_id):
+    return asdict(read_summary(connection, project_id))
+
+
+def list_tasks(connection, query, project_id):
+    filters = {"project_id": project_id, "status": query.get("status")}
+    return _page(connection, "TASKS", TASK_COLUMNS, filters, query)
+
+
+def show_task(connection, query, project_id, task_id):
+    return _one(connection, "TASKS", TASK_COLUMNS, {"id": task_id, "project_id": project_id})
+
+
+def list_task_logs(connection, query, project_id, task_id):
+    _one(connection, "TASKS", ("id",), {"id": task_id, "project_id": project_id})
+    return _page(connection, "TASKLOGS", TASKLOG_COLUMNS, {"task_id": task_id}, query)
+
+
+def list_internals(connection, query, project_id):
+    filters = {"project_id": project_id, "task_id": query.get("task_id")}
+    return _page(connection, "INTERNALS", INTERNAL_COLUMNS, filters, query)
+
+
+def list_externals(connection, query, project_id):
+    return _page(connection, "EXTERNALS", EXTERNAL_COLUMNS, {"project_id": project_id}, query)
+
+
+# (path pattern, handler), captured ids are passed after the query
+ROUTES = [
+    (r"/projects", list_projects),
+    (r"/projects/(\d+)", show_project),
+    (r"/projects/(\d+)/summary", project_summary),
+    (r"/projects/(\d+)/tasks", list_tasks),
+    (r"/projects/(\d+)/tasks/(\d+)", show_task),
+    (r"/projects/(\d+)/tasks/(\d+)/logs", list_task_logs),
+    (r"/projects/(\d+)/internals", list_internals),
+    (r"/projects/(\d+)/externals", list_externals),
+]
+ROUTES = [(re.compile(pattern + "/?"), handler) for pattern, handler in ROUTES]
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """
+        Routes of ROUTES for GET, POST /session to open a session and
+        DELETE /session to revoke it.
+
+        Requests carry an open session, as X-Session-Id (the account mail)
+        & X-Session-Key headers. Sessions expire and are revoked by sign
+        out or a password change; a revoked session is refused from the
+        next request on since revoking commits, which resets what
+        DataVersions remembers. Every response of a project
+        is tagged with the project's data version, a matching If-None-Match
+        gets 304 Not Modified.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # headers & body go out in separate writes, keep-alive clients would wait on delayed acks
+    disable_nagle_algorithm = True
+    server_version = "corem"
+
+    def log_message(self, format, *args):
+        logger.debug("%s " + format, self.address_string(), *args)
+
+    def _send(self, status, body=None, etag=None):
+        data = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _fail(self):
+        logger.exception("%s %s failed", self.command, self.path)
+        self._send(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal server error"})
+
+    def _session(self):
+        mail = self.headers.get("X-Session-Id", "").strip().lower()
+        key = self.headers.get("X-Session-Key", "")
+        if not mail or not key:
+            raise HttpError(HTTPStatus.UNAUTHORIZED, "X-Session-Id & X-Session-Key required")
+        return mail, key
+
+    def _authorize(self, generation):
+        """
+            Mail of the request's session, generation is what
+            DataVersions.check returned for this request, so sessions
+            revoked since are not served from memory
+        """
+        mail, key = self._session()
+        now = time.time()
+        versions = self.server.versions
+        expires = versions.sessions.get((mail, key))
+        if expires is None:
+            with self.server.connection() as connection:
+                row = connection.execute(
+                    "SELECT s.EXPIRES FROM SESSIONS s WHERE s.KEY = ? AND s.MAIL = ? AND s.EXPIRES > ?;",
+                    (secure_hash(key, mail), mail, now),
+                ).fetchone()
+            if row is None:
+                raise HttpError(HTTPStatus.UNAUTHORIZED, "Invalid session")
+            expires = row[0]
+            versions.remember(versions.sessions, (mail, key), expires, generation)
+        if expires <= now:
+            raise HttpError(HTTPStatus.UNAUTHORIZED, "Session expired")
+        return mail
+
+    def _etag(self, handler, ids, generation):
+        versions = self.server.versions
+        if not ids:
+            return 'W/"{}.{}"'.format(self.server.boot, generation)
+
+        project_id = ids[0]
+        version = versions.projects.get(project_id)
+        if version is None:
+            with self.server.connection() as connection:
+                row = connection.execute(
+                    "SELECT VERSION FROM PROJECT_SUMMARY WHERE PROJECT_ID = ?;", (project_id,)
+                ).fetchone()
+            if row is None:
+                raise HttpError(HTTPStatus.NOT_FOUND, "No such project")
+            version = row[0]
+            versions.remember(versions.projects, project_id, version, generation)
+        if handler is project_summary:
+            # overdue counts change with the date alone
+            return '"{}.{}.{}"'.format(project_id, version, date.today().isoformat())
+        return '"{}.{}"'.format(project_id, version)
+
+    def do_GET(self):
+        try:
+            url = urlsplit(self.path)
+            for pattern, handler in ROUTES:
+                match = pattern.fullmatch(url.path)
+                if match:
+                    break
+            else:
+                raise HttpError(HTTPStatus.NOT_FOUND, "No such resource")
+
+            generation = self.server.versions.check()
+            self._authorize(generation)
+            ids = [int(value) for value in match.groups()]
+            etag = self._etag(handler, ids, generation)
+            if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+                self._send(HTTPStatus.NOT_MODIFIED, etag=etag)
+                return
+
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            with self.server.connection() as connection:
+                body = handler(connection, query, *ids)
+            self._send(HTTPStatus.OK, body, etag)
+        except HttpError as e:
+            self._send(e.status, {"error": str(e)})
+        except ValueError as e:
+            self._send(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+        except Exception:
+            self._fail()
+
+    def do_POST(self):
+        """
+            POST /session {"mail", "password"} opens a session of the
+            account and returns its data, as login stores it in session.data
+        """
+        try:
+            if urlsplit(self.path).path.rstrip("/") != "/session":
+                raise HttpError(HTTPStatus.NOT_FOUND, "No such resource")
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                data = json.loads(self.rfile.read(length) or b"{}")
+                mail, password = data["mail"].strip().lower(), data["password"]
+            except (ValueError, KeyError, TypeError, AttributeError):
+                raise HttpError(HTTPStatus.BAD_REQUEST, "mail & password required")
+
+            from database_utils import AccountManager
+
+            # login may upgrade the stored key, so it takes a writable connection
+            connection = connect(self.server.db_path, "server")
+            try:
+                accounts = AccountManager(connection)
+                if accounts.authenticate(mail, password) is None:
+                    raise HttpError(HTTPStatus.UNAUTHORIZED, "Invalid credentials")
+                session = accounts.open_session()
+            finally:
+                connection.close()
+            self._send(HTTPStatus.OK, session)
+        except HttpError as e:
+            self._send(e.status, {"error": str(e)})
+        except Exception:
+            self._fail()
+
+    def do_DELETE(self):
+        """
+            DELETE /session signs the session of the request out
+        """
+        try:
+            if urlsplit(self.path).path.rstrip("/") != "/session":
+                raise HttpError(HTTPStatus.NOT_FOUND, "No such resource")
+            mail, key = self._session()
+
+            from database_utils import AccountManager
+
+            connection = connect(self.server.db_path, "server")
+            try:
+                revoked = AccountManager(connection).close_session(mail, key)
+            finally:
+                connection.close()
+            if not revoked:
+                raise HttpError(HTTPStatus.UNAUTHORIZED, "Invalid session")
+            self._send(HTTPStatus.NO_CONTENT)
+        except HttpError as e:
+            self._send(e.status, {"error": str(e)})
+        except Exception:
+            self._fail()
+
+
+def serve(db_path=None, host=HOST, port=PORT, connections=CONNECTIONS):
+    """
+        Serves the API until interrupted
+    """
+    server = ApiServer((host, port), db_path, connections)
+    logger.info("Serving %s on http://%s:%s", server.db_path, *server.server_address[:2])
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
@@ -0,0 +1,122 @@
+import sqlite3
+
+PAGE_SIZE = 50
+
+PROJECT_COLUMNS = (
+    "id",
+    "name",
+    "category",
+    "tags",
+    "description",
+    "start",
+    "end",
+    "created_by",
+)
+
+TASK_COLUMNS = (
+    "id",
+    "priority",
+    "objective",
+    "description",
+    "start",
+    "end",
+    "status",
+    "status_info",
+    "dependent_on",
+    "project_id",
+    "created_by",
+)
+
+TASKLOG_COLUMNS = ("id", "status", "status_info", "task_id", "created_by", "ts")
+
+INTERNAL_COLUMNS = ("id", "name", "email", "phone", "task_id", "project_id")
+
+EXTERNAL_COLUMNS = ("id", "name", "email", "phone", "project_id")
+
+
+def _check_columns(names, allowed):
+    for name in names:
+        if name not in allowed:
+            raise ValueError(
+                "Unknown column {}, choose from {}".format(name, ", ".join(allowed))
+            )
+
+
+def keyset_pages(
+    connection,
+    table,
+    allowed,
+    columns=("id", "name"),
+    filters=None,
+    order_by="id",
+    descending=False,
+    page_size=PAGE_SIZE,
+    after=None,
+):
+    """
+        Yields pages (lists of sqlite3.Row) of a table using keyset pagination.
+
+        Only the requested columns are fetched, filters are equality matches.
+        Each page seeks past the (order_by, id) of the previous page's last row,
+        so every page costs the same no matter how deep the listing goes.
+        after resumes a listing past such a key, (id,) when ordered by id.
+    """
+    filters = {name: value for name, value in (filters or {}).items() if value is not None}
+    _check_columns(columns, allowed)
+    _check_columns(filters, allowed)
+    _check_columns([order_by], allowed)
+
+    selected = list(columns)
+    for name in (order_by, "id"):
+        if name not in selected:
+            selected.append(name)
+
+    direction = "DESC" if descending else "ASC"
+    comparison = "<" if descending else ">"
+
+    if order_by == "id":
+        order = "id {}".format(direction)
+        seek = "id {} ?".format(comparison)
+    else:
+        order = "{0} {1}, id {1}".format(order_by, direction)
+        seek = "({}, id) {} (?, ?)".format(order_by, comparison)
+
+    conditions = ["{} = ?".format(name) for name in filters]
+    params = list(filters.values())
+
+    cursor = connection.cursor()
+    cursor.row_factory = sqlite3.Row
+    last = tuple(after) if after is not None else None
+
+    while True:
+        where = list(conditions)
+        page_params = list(params)
+        if last is not None:
+            where.append(seek)
+            page_params.extend(last)
+
+        sql = "SELECT {} FROM {}{} ORDER BY {} LIMIT ?;".format(
+            ", ".join(selected),
+            table,
+            " WHERE " + " AND ".join(where) if where else "",
+            order,
+        )
+        page = cursor.execute(sql, page_params + [page_size]).fetchall()
+        if not page:
+            return
+
+        yield page
+
+        if len(page) < page_size:
+            return
+
+        tail = page[-1]
+        last = (tail["id"],) if order_by == "id" else (tail[order_by], tail["id"])
+
+
+def iter_rows(pages):
+    """
+        Flattens pages into a stream of rows
+    """
+    for page in pages:
+        yield from page
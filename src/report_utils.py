@@ -0,0 +1,321 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from html import escape
+
+from migrations import ensure_schema, CLOSED_STATUSES_SQL
+from connection_utils import DB_PATH, connect
+from summary_utils import read_summary, data_version
+
+REPORT_DIR = os.path.join(os.path.dirname(DB_PATH), "reports")
+
+MANIFEST = "manifest.json"
+
+# Bump when the rendered layout changes so existing reports are regenerated
+REPORT_FORMAT = 4
+
+FETCH_SIZE = 500
+
+_STYLE = """
+body { font-family: sans-serif; margin: 2em; color: #222; }
+table { border-collapse: collapse; width: 100%; margin-bottom: 2em; }
+th, td { border: 1px solid #ccc; padding: 4px 8px; text-align: left; vertical-align: top; }
+th { background: #f0f0f0; }
+"""
+
+_TASKS_SQL = """
+    SELECT t.ID, t.PRIORITY, t.OBJECTIVE, t.START, t.END, t.STATUS, t.STATUS_INFO,
+           (SELECT group_concat(d.DEPENDS_ON || ' (' || dt.STATUS || ')', ', ')
+            FROM TASK_DEPENDENCIES d JOIN TASKS dt ON dt.ID = d.DEPENDS_ON
+            WHERE d.TASK_ID = t.ID),
+           (SELECT count(*)
+            FROM TASK_DEPENDENCIES d JOIN TASKS dt ON dt.ID = d.DEPENDS_ON
+            WHERE d.TASK_ID = t.ID AND lower(dt.STATUS) NOT IN {closed})
+    FROM TASKS t WHERE t.PROJECT_ID = ? ORDER BY t.ID;
+""".format(closed=CLOSED_STATUSES_SQL)
+
+_LOGS_SQL = """
+    SELECT l.TASK_ID, t.OBJECTIVE, l.ID, strftime('%Y-%m-%d %H:%M', l.TS, 'unixepoch'),
+           l.STATUS, l.STATUS_INFO, l.CREATED_BY
+    FROM TASKS t JOIN TASKLOGS l ON l.TASK_ID = t.ID
+    WHERE t.PROJECT_ID = ? ORDER BY l.TASK_ID, l.TS, l.ID;
+"""
+
+
+def _stream(cursor, size=FETCH_SIZE):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield from rows
+
+
+def _cell(value):
+    return "<td>{}</td>".format(escape("" if value is None else str(value)))
+
+
+def _table(title, headers, rows):
+    yield "<h2>{}</h2>\n<table>\n<tr>{}</tr>\n".format(
+        escape(title), "".join("<th>{}</th>".format(escape(header)) for header in headers)
+    )
+    empty = True
+    for row in rows:
+        empty = False
+        yield "<tr>{}</tr>\n".format("".join(_cell(value) for value in row))
+    if empty:
+        yield '<tr><td colspan="{}">None</td></tr>\n'.format(len(headers))
+    yield "</table>\n"
+
+
+def _tasks(cursor):
+    for row in cursor:
+        blockers = row[-1]
+        yield row[:-2] + (
+            row[-2] or "-",
+            "Blocked by {}".format(blockers) if blockers else "Ready",
+        )
+
+
+def render_project(connection, project_id):
+    """
+        Yields HTML of a project report chunk by chunk.
+        Tasks, logs and contacts are streamed from their cursors,
+        so memory stays flat however large the project is.
+    """
+    project = connection.execute(
+        "SELECT NAME, CATEGORY, TAGS, DESCRIPTION, START, END, CREATED_BY FROM PROJECTS WHERE ID = ?;",
+        (project_id,),
+    ).fetchone()
+    if not project:
+        raise ValueError("Project {} does not exist".format(project_id))
+
+    name, category, tags, description, start, end, created_by = project
+    yield (
+        "<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n"
+        "<title>{0}</title>\n<style>{1}</style>\n</head>\n<body>\n<h1>{0}</h1>\n"
+    ).format(escape(name), _STYLE)
+    yield from _table(
+        "Project",
+        ("Category", "Tags", "Description", "Start", "End", "Created by"),
+        [(category, tags, description, start, end, created_by)],
+    )
+
+    summary = read_summary(connection, project_id)
+    if summary:
+        yield from _table(
+            "Summary",
+            ("Tasks", "Logs", "Overdue", "By status", "By priority"),
+            [
+                (
+                    summary.tasks,
+                    summary.logs,
+                    summary.overdue,
+                    ", ".join("{}={}".format(*x) for x in sorted(summary.by_status.items())),
+                    ", ".join("{}={}".format(*x) for x in sorted(summary.by_priority.items())),
+                )
+            ],
+        )
+
+    yield from _table(
+        "Tasks",
+        ("ID", "Priority", "Objective", "Start", "End", "Status", "Status info", "Depends on", "State"),
+        _tasks(_stream(connection.execute(_TASKS_SQL, (project_id,)))),
+    )
+    yield from _table(
+        "Task logs",
+        ("Task", "Objective", "Log", "Time (UTC)", "Status", "Status info", "Created by"),
+        _stream(connection.execute(_LOGS_SQL, (project_id,))),
+    )
+    yield from _table(
+        "Internals",
+        ("ID", "Name", "Email", "Phone", "Task"),
+        _stream(
+            connection.execute(
+                "SELECT ID, NAME, EMAIL, PHONE, TASK_ID FROM INTERNALS WHERE PROJECT_ID = ? ORDER BY ID;",
+                (project_id,),
+            )
+        ),
+    )
+    yield from _table(
+        "Externals",
+        ("ID", "Name", "Email", "Phone"),
+        _stream(
+            connection.execute(
+                "SELECT ID, NAME, EMAIL, PHONE FROM EXTERNALS WHERE PROJECT_ID = ? ORDER BY ID;",
+                (project_id,),
+            )
+        ),
+    )
+    yield from _table(
+        "Files",
+        ("ID", "Name", "Task", "SHA-256", "Added by"),
+        _stream(
+            connection.execute(
+                "SELECT ID, NAME, TASK_ID, HASH, CREATED_BY FROM PROJECT_FILES WHERE PROJECT_ID = ? ORDER BY ID;",
+                (project_id,),
+            )
+        ),
+    )
+    yield "</body>\n</html>\n"
+
+
+def report_path(out_dir, project_id):
+    return os.path.join(out_dir, "project-{}.html".format(project_id))
+
+
+def load_manifest(out_dir):
+    """
+        Stamps of reports last written to out_dir as {project_id: stamp}
+    """
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("format") != REPORT_FORMAT:
+        return {}
+    return {int(key): value for key, value in manifest.get("projects", {}).items()}
+
+
+def save_manifest(out_dir, versions):
+    temp = os.path.join(out_dir, MANIFEST + ".tmp")
+    with open(temp, "w") as f:
+        json.dump({"format": REPORT_FORMAT, "projects": versions}, f, indent=1)
+    os.replace(temp, os.path.join(out_dir, MANIFEST))
+
+
+def _stamp(version):
+    """
+        Manifest entry of a report rendered at a data version today, overdue
+        counts change with the date alone
+    """
+    return "{}.{}".format(version, date.today().isoformat())
+
+
+def _is_current(out_dir, project_id, version, manifest):
+    return manifest.get(project_id) == _stamp(version) and os.path.exists(
+        report_path(out_dir, project_id)
+    )
+
+
+def _write(connection, project_id, out_dir):
+    """
+        Renders a report inside one read transaction so the file matches
+        the returned stamp of its data version, then swaps it in atomically.
+    """
+    path = report_path(out_dir, project_id)
+    temp = path + ".tmp"
+    own = not connection.in_transaction
+    if own:
+        connection.execute("BEGIN;")
+    try:
+        version = data_version(connection, project_id)
+        with open(temp, "w", encoding="utf-8") as f:
+            f.writelines(render_project(connection, project_id))
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    finally:
+        if own:
+            connection.rollback()
+    os.replace(temp, path)
+    return _stamp(version)
+
+
+def write_report(connection, project_id, out_dir=REPORT_DIR, force=False):
+    """
+        Writes the HTML report of a project to out_dir, returns its path.
+        Returns None when the report on disk was rendered today at the
+        project's current data version, unless force is set.
+    """
+    ensure_schema(connection)
+    os.makedirs(out_dir, 0o755, exist_ok=True)
+
+    version = data_version(connection, project_id)
+    if version is None:
+        raise ValueError("Project {} does not exist".format(project_id))
+
+    manifest = load_manifest(out_dir)
+    if not force and _is_current(out_dir, project_id, version, manifest):
+        return None
+
+    manifest[project_id] = _write(connection, project_id, out_dir)
+    save_manifest(out_dir, manifest)
+    return report_path(out_dir, project_id)
+
+
+def _render_worker(db_path, project_id, out_dir):
+    connection = connect(db_path)
+    try:
+        return project_id, _write(connection, project_id, out_dir)
+    finally:
+        connection.close()
+
+
+def write_reports(db_path=None, out_dir=REPORT_DIR, project_ids=None, force=False, workers=None):
+    """
+        Batch mode, renders reports of all (or given) projects in parallel
+        over a process pool, each worker on its own connection.
+        Projects unchanged since their report of today are skipped.
+        Returns (written, skipped) lists of project ids. When a report
+        fails the others are still written & kept in the manifest, then
+        the first error is raised.
+    """
+    db_path = db_path or DB_PATH
+    os.makedirs(out_dir, 0o755, exist_ok=True)
+
+    connection = connect(db_path)
+    try:
+        ensure_schema(connection)
+        versions = dict(
+            connection.execute("SELECT PROJECT_ID, VERSION FROM PROJECT_SUMMARY ORDER BY PROJECT_ID;")
+        )
+    finally:
+        connection.close()
+
+    if project_ids is not None:
+        wanted = {int(project_id) for project_id in project_ids}
+        missing = wanted - set(versions)
+        if missing:
+            raise ValueError(
+                "Projects do not exist: {}".format(", ".join(map(str, sorted(missing))))
+            )
+        versions = {key: value for key, value in versions.items() if key in wanted}
+
+    manifest = load_manifest(out_dir)
+    stale = [
+        project_id
+        for project_id, version in versions.items()
+        if force or not _is_current(out_dir, project_id, version, manifest)
+    ]
+    skipped = [project_id for project_id in versions if project_id not in stale]
+
+    # reports that were written stay in the manifest when others fail
+    errors = []
+    if len(stale) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_render_worker, str(db_path), project_id, out_dir)
+                for project_id in stale
+            ]
+            for project_id, future in zip(stale, futures):
+                try:
+                    manifest[project_id] = future.result()[1]
+                except Exception as e:
+                    errors.append(e)
+    else:
+        for project_id in stale:
+            try:
+                manifest[project_id] = _render_worker(str(db_path), project_id, out_dir)[1]
+            except Exception as e:
+                errors.append(e)
+
+    # drop reports of deleted projects from the manifest
+    if project_ids is None:
+        manifest = {key: value for key, value in manifest.items() if key in versions}
+    save_manifest(out_dir, manifest)
+    if errors:
+        raise errors[0]
+    return stale, skipped
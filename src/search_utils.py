@@ -0,0 +1,131 @@
+from dataclasses import dataclass
+
+from migrations import ensure_schema
+from connection_utils import transaction
+
+SCOPES = ("projects", "tasks", "logs")
+
+FTS_TABLES = ("PROJECTS_FTS", "TASKS_FTS", "TASKLOGS_FTS")
+
+_QUERIES = {
+    "projects": """
+        SELECT p.ID, p.ID, p.NAME,
+               snippet(PROJECTS_FTS, -1, ?, ?, '...', 12), bm25(PROJECTS_FTS)
+        FROM PROJECTS_FTS JOIN PROJECTS p ON p.ID = PROJECTS_FTS.rowid
+        WHERE PROJECTS_FTS MATCH ? {project}
+        ORDER BY bm25(PROJECTS_FTS) LIMIT ?;
+    """,
+    "tasks": """
+        SELECT t.ID, t.PROJECT_ID, t.OBJECTIVE,
+               snippet(TASKS_FTS, -1, ?, ?, '...', 12), bm25(TASKS_FTS)
+        FROM TASKS_FTS JOIN TASKS t ON t.ID = TASKS_FTS.rowid
+        WHERE TASKS_FTS MATCH ? {project}
+        ORDER BY bm25(TASKS_FTS) LIMIT ?;
+    """,
+    "logs": """
+        SELECT l.ID, t.PROJECT_ID, t.OBJECTIVE || ' - ' || l.STATUS,
+               snippet(TASKLOGS_FTS, -1, ?, ?, '...', 12), bm25(TASKLOGS_FTS)
+        FROM TASKLOGS_FTS
+        JOIN TASKLOGS l ON l.ID = TASKLOGS_FTS.rowid
+        JOIN TASKS t ON t.ID = l.TASK_ID
+        WHERE TASKLOGS_FTS MATCH ? {project}
+        ORDER BY bm25(TASKLOGS_FTS) LIMIT ?;
+    """,
+}
+
+_PROJECT_FILTERS = {
+    "projects": "AND p.ID = ?",
+    "tasks": "AND t.PROJECT_ID = ?",
+    "logs": "AND t.PROJECT_ID = ?",
+}
+
+
+@dataclass
+class SearchHit:
+    scope: str
+    key: int
+    project_id: int
+    title: str
+    snippet: str
+    rank: float
+
+
+def fts_query(text):
+    """
+        Turns free text into an FTS5 query matching all words,
+        a trailing * on a word keeps prefix matching.
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*")
+        if not word:
+            continue
+        terms.append('"{}"{}'.format(word.replace('"', '""'), "*" if prefix else ""))
+    return " ".join(terms)
+
+
+def search(
+    connection,
+    query,
+    scope=SCOPES,
+    project_id=None,
+    limit=20,
+    highlight=("[", "]"),
+    raw=False,
+):
+    """
+        Ranked full-text search over projects, tasks and task logs.
+        scope is a name or tuple of names from SCOPES, raw passes query
+        straight to FTS5 MATCH syntax. Returns SearchHits best first, rank
+        is bm25 within the hit's own scope.
+    """
+    ensure_schema(connection)
+
+    if isinstance(scope, str):
+        scope = (scope,)
+    for name in scope:
+        if name not in SCOPES:
+            raise ValueError(
+                "Unknown scope {}, choose from {}".format(name, ", ".join(SCOPES))
+            )
+
+    match = query if raw else fts_query(query)
+    if not match:
+        return []
+
+    hits = []
+    for name in scope:
+        sql = _QUERIES[name].format(
+            project=_PROJECT_FILTERS[name] if project_id is not None else ""
+        )
+        params = [highlight[0], highlight[1], match]
+        if project_id is not None:
+            params.append(project_id)
+        params.append(limit)
+
+        for row in connection.execute(sql, params):
+            hits.append(SearchHit(name, *row))
+
+    # bm25 depends on each table's row count & lengths, scopes only compare
+    # relative to their own best hit, which comes first
+    best = {}
+    for hit in hits:
+        best.setdefault(hit.scope, hit.rank)
+    hits.sort(key=lambda hit: -hit.rank / best[hit.scope] if best[hit.scope] else 0.0)
+    return hits[:limit]
+
+
+def rebuild_index(connection):
+    """
+        Rebuilds full-text indexes from their content tables
+    """
+    ensure_schema(connection)
+    with transaction(connection):
+        for table in FTS_TABLES:
+            connection.execute(
+                "INSERT INTO {0}({0}) VALUES ('rebuild');".format(table)
+            )
+            connection.execute(
+                "INSERT INTO {0}({0}) VALUES ('optimize');".format(table)
+            )
@@ -0,0 +1,136 @@
+from dataclasses import dataclass, field
+from datetime import date
+
+from migrations import (
+    ensure_schema,
+    CLOSED_STATUSES_SQL,
+    SUMMARY_TOTALS_SQL,
+    SUMMARY_COUNTS_SQL,
+)
+from connection_utils import transaction
+from graph_utils import parse_date
+
+
+@dataclass
+class ProjectSummary:
+    project_id: int
+    tasks: int = 0
+    logs: int = 0
+    by_status: dict = field(default_factory=dict)
+    by_priority: dict = field(default_factory=dict)
+    overdue: int = 0
+
+
+def read_summary(connection, project_id, today=None):
+    """
+        Reads maintained summary of a project, None if project does not exist.
+        Overdue counts open tasks whose END date is before today.
+    """
+    ensure_schema(connection)
+    today = today or date.today()
+
+    row = connection.execute(
+        "SELECT TASKS, LOGS FROM PROJECT_SUMMARY WHERE PROJECT_ID = ?;", (project_id,)
+    ).fetchone()
+    if not row:
+        return None
+
+    summary = ProjectSummary(project_id, row[0], row[1])
+    for dimension, value, count in connection.execute(
+        "SELECT DIMENSION, VALUE, COUNT FROM PROJECT_SUMMARY_COUNTS WHERE PROJECT_ID = ?;",
+        (project_id,),
+    ):
+        if dimension == "STATUS":
+            summary.by_status[value] = count
+        elif dimension == "PRIORITY":
+            summary.by_priority[value] = count
+        else:
+            end = parse_date(value)
+            if end and end < today:
+                summary.overdue += count
+
+    return summary
+
+
+def recompute_summaries(connection, project_id=None, repair=True):
+    """
+        Recomputes summaries from TASKS & TASKLOGS and compares with maintained ones.
+        Returns drift as [(project_id, dimension, value, stored, expected)],
+        rewrites drifted projects when repair is set.
+    """
+    ensure_schema(connection)
+
+    if project_id is None:
+        totals_where, where, also, params = "", "", "", ()
+    else:
+        totals_where, where, also = "WHERE p.ID = ?", "WHERE PROJECT_ID = ?", "AND PROJECT_ID = ?"
+        params = (project_id,)
+
+    expected = {}
+    for key, tasks, logs in connection.execute(
+        SUMMARY_TOTALS_SQL.format(where=totals_where), params
+    ):
+        expected[(key, "TASKS", "")] = tasks
+        expected[(key, "LOGS", "")] = logs
+    for key, dimension, value, count in connection.execute(
+        SUMMARY_COUNTS_SQL.format(where=where, also=also, closed=CLOSED_STATUSES_SQL), params * 3
+    ):
+        expected[(key, dimension, value)] = count
+
+    stored = {}
+    filter_sql = "" if project_id is None else "WHERE PROJECT_ID = ?"
+    for key, tasks, logs in connection.execute(
+        "SELECT PROJECT_ID, TASKS, LOGS FROM PROJECT_SUMMARY {};".format(filter_sql), params
+    ):
+        stored[(key, "TASKS", "")] = tasks
+        stored[(key, "LOGS", "")] = logs
+    for key, dimension, value, count in connection.execute(
+        "SELECT PROJECT_ID, DIMENSION, VALUE, COUNT FROM PROJECT_SUMMARY_COUNTS {};".format(
+            filter_sql
+        ),
+        params,
+    ):
+        stored[(key, dimension, value)] = count
+
+    drift = [
+        key + (stored.get(key), expected.get(key))
+        for key in sorted(set(stored) | set(expected), key=str)
+        if stored.get(key) != expected.get(key)
+    ]
+
+    if repair and drift:
+        projects = sorted({entry[0] for entry in drift})
+        with transaction(connection):
+            for key in projects:
+                connection.execute(
+                    "DELETE FROM PROJECT_SUMMARY_COUNTS WHERE PROJECT_ID = ?;", (key,)
+                )
+                # a repaired summary is new data, VERSION moves on rather than restarting
+                connection.execute(
+                    """INSERT INTO PROJECT_SUMMARY(PROJECT_ID, TASKS, LOGS) VALUES (?, ?, ?)
+                    ON CONFLICT(PROJECT_ID) DO UPDATE SET
+                     TASKS = excluded.TASKS, LOGS = excluded.LOGS, VERSION = VERSION + 1;""",
+                    (key, expected.get((key, "TASKS", ""), 0), expected.get((key, "LOGS", ""), 0)),
+                )
+            connection.executemany(
+                "INSERT INTO PROJECT_SUMMARY_COUNTS(PROJECT_ID, DIMENSION, VALUE, COUNT) VALUES (?, ?, ?, ?);",
+                [
+                    key + (count,)
+                    for key, count in expected.items()
+                    if key[1] not in ("TASKS", "LOGS") and key[0] in projects
+                ],
+            )
+
+    return drift
+
+
+def data_version(connection, project_id):
+    """
+        Version of a project's data, bumped by triggers on every write to the
+        project, its tasks, logs, internals & externals. None if no project.
+    """
+    ensure_schema(connection)
+    row = connection.execute(
+        "SELECT VERSION FROM PROJECT_SUMMARY WHERE PROJECT_ID = ?;", (project_id,)
+    ).fetchone()
+    return row[0] if row else None
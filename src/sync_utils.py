@@ -0,0 +1,354 @@
+import json
+import os
+import sqlite3
+from dataclasses import dataclass, field
+
+from core_utils import write_tags
+from migrations import ensure_schema, SYNC_TABLES, APPEND_ONLY_TABLES, SYNC_REFERENCES
+from connection_utils import transaction
+from graph_utils import parse_dependencies
+
+SYNC_URI = os.environ.get("COREM_SYNC_URI", "mongodb://localhost:27017")
+
+SYNC_BATCH = 500
+
+
+def mongo_collection(uri=SYNC_URI, database="corem", name="changes"):
+    """
+        Opens the remote change collection, pymongo is only needed for sync
+    """
+    import pymongo
+
+    collection = pymongo.MongoClient(uri)[database][name]
+    prepare_collection(collection)
+    return collection
+
+
+def prepare_collection(collection):
+    """
+        Indexes pulls seek on, works with pymongo & mongomock collections
+    """
+    collection.create_index([("origin", 1), ("seq", 1)], unique=True)
+    collection.create_index([("ts", 1), ("origin", 1), ("seq", 1)])
+
+
+def _gid(value, origin):
+    """
+        Node independent id of a row, changes pushed before ids were
+        translated carry the plain id at their origin
+    """
+    value = str(value)
+    return value if ":" in value else "{}:{}".format(origin, value)
+
+
+@dataclass
+class SyncReport:
+    pushed: int = 0
+    pulled: int = 0
+    applied: int = 0
+    conflicts: int = 0
+    rejected: list = field(default_factory=list)
+
+    def __str__(self):
+        return "Pushed {} changes, pulled {} ({} applied, {} lost to newer writes, {} rejected)".format(
+            self.pushed, self.pulled, self.applied, self.conflicts, len(self.rejected)
+        )
+
+
+class SyncEngine:
+    """
+        Incremental sync of the CHANGES log with a MongoDB-compatible collection.
+
+        Push sends local changes past the last acknowledged sequence, pull
+        fetches changes of other nodes past the last sequence applied from
+        each of them, both in batches. Progress is stored in SYNC_STATE after
+        every batch, so an interrupted sync resumes where it stopped.
+        Conflicting writes to a row resolve last writer wins on (ts, origin).
+        A rejected change is retried on the next pull, later changes of its
+        origin wait for it.
+
+        Local ids differ between nodes, so rows travel as "<origin>:<id at
+        origin>", references to other rows included. Rows of other nodes
+        get a local id when first pulled, kept in SYNC_KEYS.
+    """
+
+    def __init__(self, connection, collection, batch_size=SYNC_BATCH):
+        self._conn = connection
+        self.collection = collection
+        self.batch_size = batch_size
+        ensure_schema(connection)
+        self.node = self._state("node")
+
+    def _state(self, key):
+        return self._conn.execute(
+            "SELECT value FROM SYNC_STATE WHERE key = ?;", (key,)
+        ).fetchone()[0]
+
+    def _set_state(self, key, value):
+        self._conn.execute(
+            "UPDATE SYNC_STATE SET value = ? WHERE key = ?;", (str(value), key)
+        )
+
+    def pending(self):
+        """
+            Number of local changes not pushed yet
+        """
+        return self._conn.execute(
+            "SELECT count(*) FROM CHANGES WHERE seq > ? AND origin = ?;",
+            (int(self._state("pushed")), self.node),
+        ).fetchone()[0]
+
+    def push(self, report=None):
+        report = report or SyncReport()
+        while True:
+            pushed = int(self._state("pushed"))
+            last_ts = float(self._state("pushed_ts"))
+            rows = self._conn.execute(
+                """SELECT seq, tbl, row_key, op, data, ts FROM CHANGES
+                WHERE seq > ? AND origin = ? ORDER BY seq LIMIT ?;""",
+                (pushed, self.node, self.batch_size),
+            ).fetchall()
+            if not rows:
+                return report
+
+            documents = []
+            for seq, table, key, op, data, ts in rows:
+                # pulls seek per origin in ts order, which must follow seq
+                last_ts = max(last_ts, ts)
+                key, data = self._export(table, key, json.loads(data))
+                documents.append(
+                    {
+                        "_id": "{}:{}".format(self.node, seq),
+                        "origin": self.node,
+                        "seq": seq,
+                        "table": table,
+                        "key": key,
+                        "op": op,
+                        "data": data,
+                        "ts": last_ts,
+                    }
+                )
+
+            # a batch cut short by an interruption is sent again whole
+            self.collection.delete_many({"origin": self.node, "seq": {"$gt": pushed}})
+            self.collection.insert_many(documents, ordered=True)
+
+            with transaction(self._conn):
+                self._set_state("pushed", rows[-1][0])
+                self._set_state("pushed_ts", last_ts)
+            report.pushed += len(rows)
+
+    def pull(self, report=None):
+        report = report or SyncReport()
+        # an origin stops at its first rejected change until the next pull,
+        # its later changes may depend on it
+        held = set()
+        while True:
+            pulled = json.loads(self._state("pulled"))
+            known = [
+                {"origin": origin, "seq": {"$gt": seq}}
+                for origin, seq in pulled.items()
+                if origin not in held
+            ]
+            known.append({"origin": {"$nin": list(pulled) + list(held) + [self.node]}})
+            documents = list(
+                self.collection.find({"$or": known})
+                .sort([("ts", 1), ("origin", 1), ("seq", 1)])
+                .limit(self.batch_size)
+            )
+            if not documents:
+                return report
+
+            with transaction(self._conn):
+                self._set_state("applying", 1)
+                try:
+                    for document in documents:
+                        origin = document["origin"]
+                        if origin in held:
+                            continue
+                        report.pulled += 1
+                        if not self._apply(document, report):
+                            held.add(origin)
+                            continue
+                        pulled[origin] = max(pulled.get(origin, 0), document["seq"])
+                finally:
+                    self._set_state("applying", 0)
+                self._set_state("pulled", json.dumps(pulled))
+
+    def _global(self, table, local_id):
+        row = self._conn.execute(
+            "SELECT GID FROM SYNC_KEYS WHERE TBL = ? AND LOCAL_ID = ?;", (table, int(local_id))
+        ).fetchone()
+        return row[0] if row else "{}:{}".format(self.node, local_id)
+
+    def _local(self, table, gid):
+        """
+            Local id of a row known as gid, None for rows not pulled yet
+        """
+        origin, _, origin_id = gid.rpartition(":")
+        if origin == self.node:
+            return int(origin_id)
+        row = self._conn.execute(
+            "SELECT LOCAL_ID FROM SYNC_KEYS WHERE TBL = ? AND GID = ?;", (table, gid)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _export(self, table, key, data):
+        """
+            Row key & data of a local change as other nodes know them
+        """
+        if SYNC_TABLES[table][0] != "ID":
+            return key, data
+        data = {column: value for column, value in data.items() if column != "ID"}
+        for column, parent in SYNC_REFERENCES.get(table, {}).items():
+            if data.get(column) is not None:
+                data[column] = self._global(parent, data[column])
+        if "DEPENDENT_ON" in data:
+            dependencies = parse_dependencies(data["DEPENDENT_ON"], strict=False)
+            data["DEPENDENT_ON"] = ",".join(
+                self._global("TASKS", task_id) for task_id in sorted(dependencies)
+            ) or "-1"
+        return self._global(table, key), data
+
+    def _import(self, table, data, origin):
+        """
+            Remote row data with references turned into local ids, raises
+            ValueError for rows referring to rows not known here
+        """
+        data = dict(data)
+        for column, parent in SYNC_REFERENCES.get(table, {}).items():
+            if data.get(column) is not None:
+                local = self._local(parent, _gid(data[column], origin))
+                if local is None:
+                    raise ValueError("Unknown {} {}".format(parent.lower(), data[column]))
+                data[column] = local
+        if "DEPENDENT_ON" in data:
+            dependencies = []
+            for token in str(data["DEPENDENT_ON"]).split(","):
+                token = token.strip()
+                if not token or token == "-1":
+                    continue
+                local = self._local("TASKS", _gid(token, origin))
+                if local is None:
+                    raise ValueError("Unknown dependency {}".format(token))
+                dependencies.append(str(local))
+            data["DEPENDENT_ON"] = ",".join(dependencies) or "-1"
+        return data
+
+    def _apply(self, document, report):
+        """
+            Applies a pulled change, False if it was rejected
+        """
+        table, op, data = document["table"], document["op"], document["data"]
+        if table not in SYNC_TABLES:
+            report.rejected.append((document["_id"], "Unknown table {}".format(table)))
+            return False
+
+        key, columns = SYNC_TABLES[table]
+        if key == "ID":
+            gid = _gid(document["key"], document["origin"])
+            local = self._local(table, gid)
+        else:
+            local = str(document["key"])
+
+        if local is not None:
+            latest = self._conn.execute(
+                """SELECT ts, origin FROM CHANGES WHERE tbl = ? AND row_key = ?
+                ORDER BY ts DESC, origin DESC LIMIT 1;""",
+                (table, str(local)),
+            ).fetchone()
+            # a tie is an earlier change of the same origin, pulled in seq order
+            if latest and tuple(latest) > (document["ts"], document["origin"]):
+                report.conflicts += 1
+                return True
+        elif op == "delete":
+            # never pulled here, nothing to delete
+            report.applied += 1
+            return True
+
+        try:
+            with transaction(self._conn):
+                if op == "delete":
+                    self._conn.execute(
+                        "DELETE FROM {} WHERE {} = ?;".format(table, key), (local,)
+                    )
+                    data = {key: local}
+                else:
+                    if key == "ID":
+                        data = self._import(table, data, document["origin"])
+                        data.pop("ID", None)
+                        if local is not None:
+                            data["ID"] = local
+                    # changes logged before a column existed lack it, its default applies
+                    present = [column for column in columns if column in data]
+                    if local is None:
+                        # first seen here, the row gets a local id
+                        local = self._conn.execute(
+                            "INSERT INTO {}({}) VALUES ({});".format(
+                                table, ", ".join(present), ", ".join("?" * len(present))
+                            ),
+                            [data[column] for column in present],
+                        ).lastrowid
+                        self._conn.execute(
+                            "INSERT INTO SYNC_KEYS(TBL, GID, LOCAL_ID) VALUES (?, ?, ?);",
+                            (table, gid, local),
+                        )
+                        data = dict(data, ID=local)
+                    else:
+                        if table in APPEND_ONLY_TABLES:
+                            conflict = "DO NOTHING"
+                        else:
+                            conflict = "DO UPDATE SET " + ", ".join(
+                                "{0} = excluded.{0}".format(c) for c in present if c != key
+                            )
+                        self._conn.execute(
+                            "INSERT INTO {0}({1}) VALUES ({2}) ON CONFLICT({3}) {4};".format(
+                                table,
+                                ", ".join(present),
+                                ", ".join("?" * len(present)),
+                                key,
+                                conflict,
+                            ),
+                            [data[column] for column in present],
+                        )
+                    if table == "PROJECTS":
+                        write_tags(self._conn.cursor(), local, data.get("TAGS"))
+
+                # remote changes are kept too, later conflicts compare against them
+                self._conn.execute(
+                    """INSERT INTO CHANGES(tbl, row_key, op, data, ts, origin)
+                    VALUES (?, ?, ?, ?, ?, ?);""",
+                    (table, str(local), op, json.dumps(data), document["ts"], document["origin"]),
+                )
+        except (sqlite3.IntegrityError, ValueError) as e:
+            report.rejected.append((document["_id"], str(e)))
+            return False
+        report.applied += 1
+        return True
+
+    def sync(self):
+        """
+            Pulls remote changes then pushes local ones, returns SyncReport
+        """
+        report = SyncReport()
+        self.pull(report)
+        self.push(report)
+        return report
+
+    def prune(self):
+        """
+            Drops synced changes superseded by a later change of the same row,
+            the latest change per row is kept for conflict checks
+        """
+        with transaction(self._conn):
+            cursor = self._conn.execute(
+                """DELETE FROM CHANGES
+                WHERE (origin <> ? OR seq <= ?)
+                AND EXISTS (
+                  SELECT 1 FROM CHANGES c
+                  WHERE c.tbl = CHANGES.tbl AND c.row_key = CHANGES.row_key
+                  AND (c.ts, c.origin) > (CHANGES.ts, CHANGES.origin)
+                );""",
+                (self.node, int(self._state("pushed"))),
+            )
+        return cursor.rowcount
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
+
+from connection_utils import connect  # noqa: E402
+from migrations import ensure_schema  # noqa: E402
+
+
+@pytest.fixture
+def open_db(tmp_path):
+    """
+        Opens migrated databases in tmp_path by name, closed after the test
+    """
+    opened = []
+
+    def open_db(name="crator.db"):
+        connection = connect(str(tmp_path / name))
+        ensure_schema(connection)
+        opened.append(connection)
+        return connection
+
+    yield open_db
+    for connection in opened:
+        connection.close()
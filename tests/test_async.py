@@ -0,0 +1,74 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from async_utils import AsyncDatabase
+from database_utils import ProjectManager, TaskManager
+from graph_utils import DependencyGraph
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / "crator.db")
+    database = AsyncDatabase(path, readers=3)
+    yield database
+    database.close()
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_writes_apply_in_submission_order(database):
+    async def scenario():
+        projects = database.manager(ProjectManager, "alice")
+        project = await projects.create_project(
+            "Async", "ops", "async", "async", "01-01-2026", "31-12-2026"
+        )
+        tasks = database.manager(TaskManager, "alice", project.key)
+        task = await tasks.create_task(
+            "mid", "ship", "", "01-01-2026", "31-12-2026", "open", "new", "-1"
+        )
+        # submitted together, not awaited one by one
+        logs = await asyncio.gather(
+            *(tasks.create_task_log(task.key, "open", "step {}".format(i)) for i in range(20))
+        )
+        history = await tasks.task_history(task.key)
+        return logs, history
+
+    logs, history = run(scenario())
+
+    assert [log.key for log in logs] == sorted(log.key for log in logs)
+    assert [change.status_info for change in history] == ["step {}".format(i) for i in range(20)]
+
+
+def test_reads_run_in_parallel_on_read_only_connections(database):
+    barrier = threading.Barrier(3, timeout=5)
+
+    def meet(connection):
+        # only returns once all three reads run at the same time
+        barrier.wait()
+        return connection.execute("PRAGMA query_only;").fetchone()[0]
+
+    def insert(connection):
+        connection.execute("INSERT INTO TAGS(name) VALUES ('read only');")
+
+    async def scenario():
+        flags = await asyncio.gather(*(database.read(meet) for _ in range(3)))
+        with pytest.raises(sqlite3.OperationalError):
+            await database.read(insert)
+        return flags
+
+    assert run(scenario()) == [1, 1, 1]
+
+
+def test_only_listed_methods_are_exposed(database):
+    tasks = database.manager(TaskManager, "alice", 1)
+    with pytest.raises(AttributeError):
+        tasks.add_task_log
+    with pytest.raises(ValueError):
+        database.manager(DependencyGraph)
+    with pytest.raises(ValueError):
+        AsyncDatabase(":memory:")
@@ -0,0 +1,79 @@
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "benchmarks")
+)
+
+import suite  # noqa: E402
+import synthetic  # noqa: E402
+
+TINY = synthetic.scale(accounts=3, projects=4, tasks=3, logs=2, contacts=1)
+
+
+def dump(path):
+    connection = sqlite3.connect(path)
+    try:
+        return {
+            table: connection.execute(
+                "SELECT * FROM {} ORDER BY 1;".format(table)
+            ).fetchall()
+            for table in ("PROJECTS", "TASKS", "INTERNALS", "EXTERNALS")
+        }
+    finally:
+        connection.close()
+
+
+def test_synthetic_databases_follow_scale_and_seed(tmp_path):
+    paths = [str(tmp_path / name) for name in ("a.db", "b.db", "c.db")]
+    synthetic.populate(paths[0], TINY)
+    synthetic.populate(paths[1], TINY)
+    synthetic.populate(paths[2], TINY, seed=8)
+
+    first = dump(paths[0])
+    assert {table: len(rows) for table, rows in first.items()} == {
+        "PROJECTS": 4, "TASKS": 12, "INTERNALS": 4, "EXTERNALS": 4
+    }
+    assert first == dump(paths[1])
+    assert first != dump(paths[2])
+
+    with pytest.raises(ValueError):
+        synthetic.scale(users=3)
+
+
+def test_every_operation_is_timed(capsys):
+    results = suite.run(TINY, runs=2)
+
+    assert set(results["operations"]) == {name for name, _, _ in suite.OPERATIONS}
+    for stats in results["operations"].values():
+        assert 0 < stats["min_us"] <= stats["median_us"] <= stats["p95_us"]
+    assert results["scale"] == TINY
+    suite.report(results)
+    assert "delete_project" in capsys.readouterr().out
+
+
+def test_compare_flags_regressions_past_the_threshold(tmp_path, monkeypatch, capsys):
+    def results(**medians):
+        return {
+            "format": suite.RESULTS_FORMAT,
+            "scale": TINY,
+            "operations": {name: {"median_us": value} for name, value in medians.items()},
+        }
+
+    baseline = results(login=100.0, add_task=10.0)
+    current = results(login=105.0, add_task=20.0, select_task=1.0)
+    assert suite.compare(baseline, current, 0.1) == ["add_task"]
+    assert suite.compare(baseline, current, 1.5) == []
+
+    paths = []
+    for name, data in (("base.json", baseline), ("run.json", current)):
+        path = tmp_path / name
+        path.write_text(json.dumps(data))
+        paths.append(str(path))
+    monkeypatch.setattr(sys, "argv", ["suite.py", "--compare"] + paths)
+    assert suite.main() == 1
+    assert "add_task slower" in capsys.readouterr().out
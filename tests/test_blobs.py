@@ -0,0 +1,95 @@
+import os
+import shutil
+
+import pytest
+
+from blob_utils import BlobStore, file_digest
+from database_utils import ProjectManager
+
+
+@pytest.fixture
+def store(open_db, tmp_path):
+    connection = open_db()
+    return BlobStore(connection, root=str(tmp_path / "blobs"), limit=100)
+
+
+def write(directory, name, content):
+    path = directory / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def cached(store):
+    return dict(store._conn.execute("SELECT hash, cached FROM BLOBS;").fetchall())
+
+
+def test_attachments_share_one_blob(open_db, tmp_path):
+    connection = open_db()
+    blobs = BlobStore(connection, root=str(tmp_path / "blobs"))
+    projects = ProjectManager(connection, "alice", blobs=blobs)
+    keys = [
+        projects.create_project(name, "ops", "files", name, "01-01-2026", "31-12-2026").key
+        for name in ("First", "Second")
+    ]
+    spec = write(tmp_path, "spec.md", b"# spec\n")
+    for project_id in keys:
+        projects.attach_file(project_id, spec)
+
+    assert connection.execute("SELECT count(*) FROM BLOBS;").fetchone()[0] == 1
+    files = projects.list_files(keys[1])
+    assert [f.name for f in files] == ["spec.md"]
+    with open(projects.file_path(files[0].key), "rb") as f:
+        assert f.read() == b"# spec\n"
+
+    with pytest.raises(ValueError):
+        projects.attach_file(keys[0], write(tmp_path, "run.sh", b"rm -rf /"))
+    with pytest.raises(ValueError):
+        projects.attach_file(99, spec)
+
+
+def test_least_recently_used_unreferenced_blobs_go_first(store, tmp_path):
+    old = store.put(write(tmp_path, "old.md", b"o" * 40))
+    new = store.put(write(tmp_path, "new.md", b"n" * 40))
+    store.path(old)
+    store.put(write(tmp_path, "big.md", b"b" * 40))
+
+    assert store.evict() == [new]
+    assert store.cached_size() == 80
+    assert new not in cached(store)
+    assert not os.path.exists(store._path(new))
+    assert file_digest(store.path(old)) == (old, 40)
+
+
+def test_referenced_blobs_are_fetched_again(open_db, tmp_path):
+    connection = open_db()
+    remote = tmp_path / "remote"
+    remote.mkdir()
+    fetched = []
+
+    def fetch(digest, target):
+        fetched.append(digest)
+        shutil.copyfile(str(remote / digest), target)
+
+    blobs = BlobStore(connection, root=str(tmp_path / "blobs"), limit=50, fetch=fetch)
+    projects = ProjectManager(connection, "alice", blobs=blobs)
+    project_id = projects.create_project(
+        "Files", "ops", "files", "files", "01-01-2026", "31-12-2026"
+    ).key
+    first, second = (
+        projects.attach_file(project_id, write(remote, name, name.encode() * 10))
+        for name in ("a.md", "b.md")
+    )
+    for attached in (first, second):
+        os.rename(str(remote / attached.name), str(remote / attached.hash))
+
+    # attaching b pushed a past the limit, it is fetched back on use
+    assert cached(blobs) == {first.hash: 0, second.hash: 1}
+    with open(projects.file_path(first.key), "rb") as f:
+        assert f.read() == b"a.md" * 10
+    assert fetched == [first.hash]
+    assert cached(blobs) == {first.hash: 1, second.hash: 0}
+
+    # unreferenced blobs are collected, referenced ones stay
+    projects.remove_file(second.key)
+    assert blobs.collect() == [second.hash]
+    assert list(cached(blobs)) == [first.hash]
@@ -0,0 +1,87 @@
+import pytest
+
+from cache_utils import StructureCache
+from connection_utils import transaction
+from database_utils import ProjectManager, TaskManager
+
+
+@pytest.fixture
+def project(open_db):
+    connection = open_db()
+    manager = ProjectManager(connection, "alice")
+    project = manager.create_project(
+        "Cached", "ops", "cache", "first", "01-01-2026", "31-12-2026"
+    )
+    return manager, project.key
+
+
+def test_reads_are_served_from_memory(project):
+    manager, project_id = project
+    manager.cache.clear()
+    before = manager.cache.stats()
+
+    first = manager.fetch_project(project_id)
+    # another manager of the connection shares the identity map
+    assert ProjectManager(manager._conn, "bob").fetch_project(project_id) is first
+    assert manager.fetch_project(999) is None
+
+    stats = manager.cache.stats()
+    assert (stats.hits - before.hits, stats.misses - before.misses) == (1, 2)
+
+
+def test_manager_writes_update_entries_in_place(project):
+    manager, project_id = project
+    manager.fetch_project(project_id)
+    flushes = manager.cache.stats().invalidations
+
+    edited = manager.edit_project(project_id, description="second")
+
+    assert manager.fetch_project(project_id) is edited
+    assert edited.description == "second"
+    assert manager.cache.stats().invalidations == flushes
+
+
+def test_writes_on_another_connection_invalidate(project, open_db):
+    manager, project_id = project
+    assert manager.fetch_project(project_id).description == "first"
+
+    other = open_db()
+    ProjectManager(other, "bob").edit_project(project_id, description="from elsewhere")
+
+    assert manager.fetch_project(project_id).description == "from elsewhere"
+
+
+def test_raw_writes_and_rollbacks_are_not_served_stale(project):
+    manager, project_id = project
+    connection = manager._conn
+    tasks = TaskManager(connection, "alice", project_id)
+    task = tasks.create_task(
+        "mid", "cached", "", "01-01-2026", "31-12-2026", "open", "new", "-1"
+    )
+    assert tasks.fetch_task(task.key).status == "open"
+
+    # not through a manager, noticed by total_changes
+    with transaction(connection):
+        connection.execute("UPDATE TASKS SET STATUS = 'done' WHERE ID = ?;", (task.key,))
+    assert tasks.fetch_task(task.key).status == "done"
+
+    with pytest.raises(RuntimeError):
+        with transaction(connection):
+            connection.execute("UPDATE TASKS SET STATUS = 'gone' WHERE ID = ?;", (task.key,))
+            assert tasks.fetch_task(task.key).status == "gone"
+            raise RuntimeError("rolled back")
+    assert tasks.fetch_task(task.key).status == "done"
+
+
+def test_least_recently_used_entries_are_evicted(open_db):
+    cache = StructureCache(open_db(), maxsize=2)
+    cache.validate()
+    for key in (1, 2):
+        cache.put("task", key, "task {}".format(key))
+    cache.get("task", 1)
+    cache.put("task", 3, "task 3")
+
+    assert cache.get("task", 2) is None
+    assert cache.get("task", 1) == "task 1"
+    stats = cache.stats()
+    assert (stats.size, stats.evictions, stats.hits, stats.misses) == (2, 1, 2, 1)
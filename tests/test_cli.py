@@ -0,0 +1,43 @@
+import json
+
+import cli
+import main
+
+
+def test_author_comes_from_the_session_next_to_db(tmp_path, monkeypatch, capsys):
+    monkeypatch.delenv("COREM_AUTHOR", raising=False)
+    path = str(tmp_path / "other.db")
+    (tmp_path / "session.data").write_text(
+        json.dumps(
+            {"session-type": "local", "session-id": "alice@example.com", "session-key": "k"}
+        )
+    )
+
+    add = ["--db", path, "project", "add", "Moon", "--category", "ops", "--tags", "moon"]
+    assert cli.main(add + ["--description", "landing", "--start", "01-01-2026"]) == 0
+    project_id = capsys.readouterr().out.strip()
+    assert cli.main(["--db", path, "--json", "project", "list"]) == 0
+    project = json.loads(capsys.readouterr().out)
+    assert (str(project["id"]), project["created_by"]) == (project_id, "alice@example.com")
+
+
+def test_interactive_session_opens_db(tmp_path, monkeypatch):
+    opened = []
+    monkeypatch.setattr(main, "run", opened.append)
+    path = str(tmp_path / "other.db")
+    assert cli.main(["--db", path]) == 0
+    assert opened == [path]
+
+
+def test_unknown_ids_and_database_errors_are_reported(tmp_path, capsys):
+    common = ["--db", str(tmp_path / "other.db"), "--author", "alice@example.com"]
+    task = ["task", "add", "999", "obj", "--priority", "1", "--start", "01-01-2026"]
+    assert cli.main(common + task) == 1
+    assert cli.main(common + ["log", "add", "7", "done", "ok"]) == 1
+    # a directory is no database
+    assert cli.main(["--db", str(tmp_path), "project", "list"]) == 1
+    assert capsys.readouterr().err.splitlines() == [
+        "corem: No project with id: 999",
+        "corem: No task with id: 7",
+        "corem: unable to open database file",
+    ]
@@ -0,0 +1,72 @@
+from array import array
+
+import pytest
+
+from column_utils import Categorical, read_columns
+from database_utils import ProjectManager, TaskManager, TaskStructure, read_structures
+
+
+@pytest.fixture
+def tasks(open_db):
+    connection = open_db()
+    manager = None
+    for name in ("First", "Second"):
+        project = ProjectManager(connection, "alice").create_project(
+            name, "ops", "columns", name, "01-01-2026", "31-12-2026"
+        )
+        manager = TaskManager(connection, "alice", project.key)
+        for i in range(5):
+            task = manager.create_task(
+                ("low", "mid", "high")[i % 3],
+                "{} task {}".format(name, i),
+                "",
+                "01-01-2026",
+                "31-12-2026",
+                "open",
+                "new",
+                "-1",
+            )
+            manager.create_task_log(task.key, "done" if i % 2 else "blocked", "step")
+    return manager
+
+
+def test_columns_round_trip_the_rows(tasks):
+    connection = tasks._conn
+    rows = read_structures(
+        connection, TaskStructure, "SELECT * FROM TASKS ORDER BY id;"
+    ).fetchall()
+
+    columns = read_columns(connection, "TASKS")
+
+    assert isinstance(columns["id"], array) and columns["id"].typecode == "q"
+    assert isinstance(columns["status"], Categorical)
+    assert list(zip(*columns.values())) == [
+        tuple(getattr(row, field) for field in TaskStructure.__slots__) for row in rows
+    ]
+
+
+def test_text_columns_store_each_value_once(tasks):
+    columns = read_columns(tasks._conn, "TASKLOGS", ("task_id", "status", "ts"))
+
+    assert columns["status"].categories == ["blocked", "done"]
+    assert columns["status"].counts() == {"blocked": 6, "done": 4}
+    assert len(columns["status"].codes) == len(columns["ts"]) == 10
+    assert columns["ts"].typecode == "d"
+    assert list(columns["task_id"]) == sorted(columns["task_id"])
+
+    mine = read_columns(tasks._conn, "TASKS", ("objective",), {"project_id": tasks.project_id})
+    assert [objective.split()[0] for objective in mine["objective"]] == ["Second"] * 5
+
+
+def test_structures_are_slotted_and_read_directly(tasks):
+    task = tasks.list_tasks()[0]
+    assert isinstance(task, TaskStructure)
+    assert not hasattr(task, "__dict__")
+    assert task.project_id == tasks.project_id
+
+
+def test_unknown_tables_and_columns_are_refused(tasks):
+    with pytest.raises(ValueError):
+        read_columns(tasks._conn, "ACCOUNTS")
+    with pytest.raises(ValueError):
+        read_columns(tasks._conn, "TASKS", ("id", "secret"))
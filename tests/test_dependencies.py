@@ -0,0 +1,79 @@
+import pytest
+
+from database_utils import ProjectManager, TaskManager
+
+
+@pytest.fixture
+def tasks(open_db):
+    connection = open_db()
+    projects = ProjectManager(connection, "alice")
+    first, second = (
+        projects.create_project(name, "ops", "graph", "graph", "01-01-2026", "31-12-2026").key
+        for name in ("First", "Second")
+    )
+    return (
+        connection,
+        TaskManager(connection, "alice", first),
+        TaskManager(connection, "alice", second),
+    )
+
+
+def add(manager, objective, dependent_on="-1", start="01-01-2026", end="10-01-2026"):
+    return manager.create_task("mid", objective, "", start, end, "open", "new", dependent_on)
+
+
+def count(connection):
+    return connection.execute("SELECT count(*) FROM TASKS;").fetchone()[0]
+
+
+def test_unknown_and_foreign_dependencies_are_refused(tasks):
+    connection, first, second = tasks
+    elsewhere = add(second, "elsewhere")
+    before = count(connection)
+
+    for dependent_on in ("2", "999", str(elsewhere.key)):
+        with pytest.raises(ValueError, match="No task with id"):
+            add(first, "build", dependent_on)
+    assert count(connection) == before
+
+
+def test_dependencies_are_kept_in_the_edge_table(tasks):
+    connection, first, _ = tasks
+    design = add(first, "design")
+    build = add(first, "build", str(design.key))
+    ship = add(first, "ship", "{}, {}".format(design.key, build.key))
+
+    assert [task.key for task in first.dependents_of(design.key)] == [build.key, ship.key]
+    graph = first.dependency_graph()
+    assert graph.blocked_by(ship.key, transitive=True) == {design.key, build.key}
+
+
+def test_critical_path_follows_the_longest_chain(tasks):
+    _, first, _ = tasks
+    design = add(first, "design", end="20-01-2026")
+    build = add(first, "build", str(design.key), "21-01-2026", "31-01-2026")
+    add(first, "docs", str(design.key), "21-01-2026", "22-01-2026")
+
+    _, path = first.dependency_graph().critical_path()
+    assert path == [design.key, build.key]
+
+
+def test_edits_stay_in_the_project_and_acyclic(tasks):
+    connection, first, second = tasks
+    design = add(first, "design")
+    build = add(first, "build", str(design.key))
+    elsewhere = add(second, "elsewhere")
+
+    with pytest.raises(ValueError, match="No task with id"):
+        first.edit_task(elsewhere.key, "high", "31-12-2026", "-1")
+    with pytest.raises(ValueError, match="No task with id"):
+        first.edit_task(design.key, "high", "31-12-2026", str(elsewhere.key))
+    with pytest.raises(ValueError, match="Dependency cycle"):
+        first.edit_task(design.key, "high", "31-12-2026", str(build.key))
+    assert connection.execute(
+        "SELECT PRIORITY, DEPENDENT_ON FROM TASKS WHERE ID IN (?, ?) ORDER BY ID;",
+        (design.key, elsewhere.key),
+    ).fetchall() == [("mid", "-1"), ("mid", "-1")]
+
+    first.edit_task(build.key, "high", "31-12-2026", "-1")
+    assert first.dependents_of(design.key) == []
@@ -0,0 +1,111 @@
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+from connection_utils import transaction
+from database_utils import ProjectManager, TaskManager
+from history_utils import compact_logs, status_changes, status_rollups, to_timestamp
+
+
+def at(day, hour=12):
+    return datetime(2026, 3, day, hour, tzinfo=timezone.utc).timestamp()
+
+
+@pytest.fixture
+def tasks(open_db):
+    connection = open_db()
+    projects = ProjectManager(connection, "alice")
+    manager = None
+    for name in ("Other", "History"):
+        project = projects.create_project(
+            name, "ops", "history", name, "01-01-2026", "31-12-2026"
+        )
+        manager = TaskManager(connection, "alice", project.key)
+        first, second = (
+            manager.create_task(
+                "mid", objective, "", "01-01-2026", "31-12-2026", "open", "new", "-1"
+            ).key
+            for objective in ("design", "build")
+        )
+        # 2 march 2026 is a monday
+        logs = [
+            (second, "open", at(2, 9)),
+            (first, "open", at(2, 8)),
+            (first, "review", at(3)),
+            (first, "done", at(10)),
+            (second, "done", at(31)),
+        ]
+        with transaction(connection):
+            connection.executemany(
+                """INSERT INTO TASKLOGS(STATUS, STATUS_INFO, TASK_ID, CREATED_BY, TS)
+                VALUES (?, 'history', ?, 'alice', ?);""",
+                [(status, task_id, ts) for task_id, status, ts in logs],
+            )
+    return manager, first, second
+
+
+def test_range_queries_come_in_time_order(tasks):
+    manager, first, second = tasks
+
+    week = manager.task_history(start="02-03-2026", end="09-03-2026")
+    assert [(change.task_id, change.status) for change in week] == [
+        (first, "open"), (second, "open"), (first, "review")
+    ]
+    assert {change.project_id for change in week} == {manager.project_id}
+
+    assert [change.status for change in manager.task_history(first)] == [
+        "open", "review", "done"
+    ]
+    everywhere = status_changes(manager._conn, statuses=["done"], limit=3)
+    assert [change.ts for change in everywhere] == [at(10), at(10), at(31)]
+
+
+def test_rollups_per_day_week_and_month(tasks):
+    manager, _, _ = tasks
+    connection, project_id = manager._conn, manager.project_id
+
+    assert status_rollups(connection, project_id, end="04-03-2026") == [
+        ("2026-03-02", "open", 2), ("2026-03-03", "review", 1)
+    ]
+    assert status_rollups(connection, project_id, period="week") == [
+        ("2026-03-02", "open", 2),
+        ("2026-03-02", "review", 1),
+        ("2026-03-09", "done", 1),
+        ("2026-03-30", "done", 1),
+    ]
+    assert status_rollups(connection, project_id, period="month") == [
+        ("2026-03-01", "done", 2), ("2026-03-01", "open", 2), ("2026-03-01", "review", 1)
+    ]
+    with pytest.raises(ValueError):
+        status_rollups(connection, project_id, period="year")
+
+
+def test_compacted_logs_keep_counting_in_rollups(tasks):
+    manager, first, _ = tasks
+    connection, project_id = manager._conn, manager.project_id
+    before = status_rollups(connection, project_id, period="month")
+
+    assert compact_logs(connection, "09-03-2026", project_id, batch_size=2) == 3
+
+    assert [change.status for change in manager.task_history()] == ["done", "done"]
+    assert status_rollups(connection, project_id, period="month") == before
+    assert connection.execute(
+        "SELECT LOGS FROM PROJECT_SUMMARY WHERE PROJECT_ID = ?;", (project_id,)
+    ).fetchone()[0] == 2
+    # other projects keep their logs
+    assert len(status_changes(connection)) == 7
+
+    with pytest.raises(ValueError):
+        compact_logs(connection, datetime(2999, 1, 1))
+
+
+def test_task_logs_are_append_only(tasks):
+    manager, first, _ = tasks
+    log = manager.create_task_log(first, "blocked", "waiting")
+    assert manager.task_history(first)[-1].log_id == log.key
+
+    with pytest.raises(sqlite3.IntegrityError):
+        with transaction(manager._conn):
+            manager._conn.execute("UPDATE TASKLOGS SET STATUS = 'done' WHERE ID = ?;", (log.key,))
+    assert to_timestamp("02-03-2026") == at(2, 0)
@@ -0,0 +1,39 @@
+from database_utils import ProjectManager, TaskManager
+from import_utils import import_tasks
+
+
+def new_project(connection, name):
+    return ProjectManager(connection, "alice").create_project(
+        name, "ops", "import", "import", "01-01-2026", "31-12-2026"
+    ).key
+
+
+def test_rows_with_invalid_dependencies_are_rejected(open_db, tmp_path):
+    connection = open_db()
+    project_id, other_id = new_project(connection, "Import"), new_project(connection, "Other")
+    design = TaskManager(connection, "alice", project_id).create_task(
+        "mid", "design", "", "01-01-2026", "31-12-2026", "open", "new"
+    )
+    elsewhere = TaskManager(connection, "alice", other_id).create_task(
+        "mid", "elsewhere", "", "01-01-2026", "31-12-2026", "open", "new"
+    )
+    path = tmp_path / "tasks.csv"
+    path.write_text(
+        "priority,objective,start,status,status_info,dependent_on\n"
+        "mid,build,01-01-2026,open,new,{}\n"
+        "mid,ship,01-01-2026,open,new,\"1,two\"\n"
+        "mid,test,01-01-2026,open,new,{}\n"
+        "mid,launch,01-01-2026,open,new,999\n".format(design.key, elsewhere.key)
+    )
+
+    report = import_tasks(connection, "alice", project_id, str(path))
+
+    assert report.imported == 1
+    assert report.rejected == [
+        (3, "Invalid task id in dependencies: two"),
+        (4, "No task with id {} in this project".format(elsewhere.key)),
+        (5, "No task with id 999 in this project"),
+    ]
+    assert connection.execute("SELECT TASK_ID, DEPENDS_ON FROM TASK_DEPENDENCIES;").fetchall() == [
+        (design.key + 2, design.key)
+    ]
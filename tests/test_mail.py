@@ -0,0 +1,121 @@
+import asyncio
+import socket
+import time
+
+import pytest
+
+from database_utils import Externals, ProjectManager
+from mail_utils import MailWorker, SmtpSettings, enqueue_mail, mail_counts, mail_status
+
+
+@pytest.fixture
+def project(open_db):
+    connection = open_db()
+    project = ProjectManager(connection, "alice").create_project(
+        "Mail", "ops", "mail", "mail", "01-01-2026", "31-12-2026"
+    )
+    externals = Externals(connection, "alice", project.key)
+    externals.create_external("Bob", "bob@example.com", 5550001)
+    externals.create_external("Eve", "eve@example.com", 5550002)
+    return connection, externals
+
+
+def test_notify_needs_a_selection(project):
+    connection, externals = project
+    with pytest.raises(ValueError):
+        externals.notify("Hello", "Hi there", [])
+    assert mail_counts(connection) == {}
+
+    assert externals.notify("Hello", "Hi there") == 2
+    bob = externals.list_externals()[0]
+    assert externals.notify("Hello", "Just you", [str(bob.key)]) == 1
+
+
+class Mailbox:
+    """
+        aiosmtpd handler keeping accepted messages, recipients at
+        busy.example.com are deferred with 450 & at gone.example.com
+        refused with 550
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        domain = address.rpartition("@")[2]
+        if domain == "busy.example.com":
+            return "450 Mailbox busy, try later"
+        if domain == "gone.example.com":
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((envelope.rcpt_tos, envelope.content))
+        return "250 Message accepted"
+
+
+@pytest.fixture
+def smtp():
+    controller_module = pytest.importorskip("aiosmtpd.controller")
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    mailbox = Mailbox()
+    controller = controller_module.Controller(mailbox, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield mailbox, SmtpSettings(host="127.0.0.1", port=port, sender="corem@example.com")
+    controller.stop()
+
+
+def test_worker_sends_retries_and_fails(open_db, tmp_path, smtp):
+    mailbox, settings = smtp
+    connection = open_db()
+    enqueue_mail(
+        connection,
+        ["a@example.com", "b@example.com", "x@busy.example.com", "y@gone.example.com"],
+        "Status",
+        "All good",
+    )
+    busy, gone = [
+        row[0]
+        for row in connection.execute(
+            "SELECT id FROM MAIL_QUEUE WHERE recipient LIKE '%busy%' OR recipient LIKE '%gone%' ORDER BY recipient;"
+        )
+    ]
+
+    async def drain():
+        worker = MailWorker(
+            str(tmp_path / "crator.db"), settings, pool_size=2, rate=100, max_attempts=2, backoff=60
+        )
+        try:
+            return await worker.drain()
+        finally:
+            worker.close()
+
+    assert asyncio.run(drain()) == 4
+    assert sorted(rcpt for rcpts, _ in mailbox.messages for rcpt in rcpts) == [
+        "a@example.com",
+        "b@example.com",
+    ]
+    assert mail_counts(connection) == {"sent": 2, "queued": 1, "failed": 1}
+
+    # 5xx fails on the first attempt
+    status, attempts, error = mail_status(connection, gone)
+    assert (status, attempts) == ("failed", 1) and "550" in error
+
+    # 4xx is retried, not before its backoff
+    status, attempts, error = mail_status(connection, busy)
+    assert (status, attempts) == ("queued", 1) and "450" in error
+    next_attempt, = connection.execute(
+        "SELECT next_attempt FROM MAIL_QUEUE WHERE id = ?;", (busy,)
+    ).fetchone()
+    assert next_attempt > time.time() + 60 * 0.8 - 5
+    assert asyncio.run(drain()) == 0
+
+    # until max_attempts is reached
+    connection.execute("UPDATE MAIL_QUEUE SET next_attempt = 0 WHERE id = ?;", (busy,))
+    connection.commit()
+    assert asyncio.run(drain()) == 1
+    assert mail_status(connection, busy)[:2] == ("failed", 2)
+    assert len(mailbox.messages) == 2
@@ -0,0 +1,107 @@
+import sqlite3
+import threading
+
+from connection_utils import connect
+from core_utils import secure_hash
+from database_utils import AccountManager
+from migrations import (
+    LATEST_VERSION,
+    MIGRATIONS,
+    check_query_plans,
+    ensure_schema,
+    migrate,
+    schema_version,
+)
+from summary_utils import recompute_summaries
+
+
+def baseline(path):
+    """
+        Database as the first release left it, tables without a schema version
+    """
+    connection = sqlite3.connect(path)
+    for statement in MIGRATIONS[0][2]:
+        connection.execute(statement)
+    connection.execute(
+        "INSERT INTO ACCOUNTS VALUES (?, 'Old', ?, 'salt');",
+        ("old@example.com", secure_hash("old password", "salt")),
+    )
+    connection.execute(
+        """INSERT INTO PROJECTS VALUES
+        (1, 'Legacy', 'ops', 'moon,nasa', 'kept', '01-01-2026', '31-12-2026', 'old@example.com');"""
+    )
+    connection.executemany(
+        """INSERT INTO TASKS VALUES
+        (?, 'mid', ?, '', '01-01-2026', '31-12-2026', ?, 'new', ?, ?, 'old@example.com');""",
+        [
+            (1, "design", "done", "-1", 1),
+            (2, "build", "open", "1", 1),
+            # orphan of a project deleted before foreign keys existed
+            (3, "lost", "open", "-1", 99),
+        ],
+    )
+    connection.executemany(
+        "INSERT INTO TASKLOGS VALUES (?, ?, 'step', ?, 'old@example.com');",
+        [(1, "open", 1), (2, "done", 1), (3, "open", 2), (4, "open", 3)],
+    )
+    connection.execute("INSERT INTO INTERNALS VALUES (1, 'Ann', 'ann@example.com', 1, 2, 1);")
+    connection.execute("INSERT INTO EXTERNALS VALUES (1, 'Bob', 'bob@example.com', 2, 1);")
+    connection.commit()
+    connection.close()
+
+
+def test_latest_schema_serves_hot_queries_from_indexes():
+    connection = connect(":memory:")
+    ensure_schema(connection)
+    assert schema_version(connection) == LATEST_VERSION
+    assert check_query_plans(connection) == {}
+
+
+def test_baseline_database_migrates_to_latest(tmp_path):
+    path = str(tmp_path / "crator.db")
+    baseline(path)
+    connection = connect(path)
+
+    assert migrate(connection) == [version for version, _, _ in MIGRATIONS]
+    assert schema_version(connection) == LATEST_VERSION
+    assert migrate(connection) == []
+    assert connection.execute("PRAGMA foreign_key_check;").fetchall() == []
+    assert check_query_plans(connection) == {}
+
+    assert connection.execute("SELECT ID FROM TASKS ORDER BY ID;").fetchall() == [(1,), (2,)]
+    assert connection.execute("SELECT count(*) FROM TASKLOGS;").fetchone() == (3,)
+    assert connection.execute("SELECT TASK_ID, DEPENDS_ON FROM TASK_DEPENDENCIES;").fetchall() == [
+        (2, 1)
+    ]
+    assert recompute_summaries(connection, repair=False) == []
+
+    # legacy sha3 keys still log in, and are upgraded doing so
+    assert AccountManager(connection).authenticate("old@example.com", "old password")
+    key, = connection.execute("SELECT SECURITYKEY FROM ACCOUNTS;").fetchone()
+    assert key.startswith("scrypt$")
+    connection.close()
+
+
+def test_concurrent_connections_apply_each_migration_once(tmp_path):
+    path = str(tmp_path / "crator.db")
+    barrier = threading.Barrier(4)
+    applied, errors = [], []
+
+    def run():
+        connection = connect(path)
+        try:
+            barrier.wait()
+            applied.extend(migrate(connection))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sorted(applied) == [version for version, _, _ in MIGRATIONS]
@@ -0,0 +1,90 @@
+import pytest
+
+from database_utils import ProjectManager, TaskManager
+from paging_utils import TASK_COLUMNS, iter_rows, keyset_pages
+
+
+@pytest.fixture
+def tasks(open_db):
+    connection = open_db()
+    project = ProjectManager(connection, "alice").create_project(
+        "Paging", "ops", "paging", "paging", "01-01-2026", "31-12-2026"
+    )
+    other = ProjectManager(connection, "bob").create_project(
+        "Other", "ops", "paging", "paging", "01-01-2026", "31-12-2026"
+    )
+    manager = TaskManager(connection, "alice", project.key)
+    for i in range(23):
+        manager.create_task(
+            ("low", "mid", "high")[i % 3],
+            "task {:02}".format(i),
+            "long description " * 20,
+            "01-01-2026",
+            "31-12-2026",
+            "done" if i % 2 else "open",
+            "new",
+            "-1",
+        )
+    TaskManager(connection, "bob", other.key).create_task(
+        "mid", "elsewhere", "", "01-01-2026", "31-12-2026", "open", "new", "-1"
+    )
+    return manager
+
+
+def test_pages_cover_every_row_once_with_only_the_requested_columns(tasks):
+    pages = list(tasks.iter_tasks(columns=("id", "objective"), page_size=10))
+
+    assert [len(page) for page in pages] == [10, 10, 3]
+    rows = [row for page in pages for row in page]
+    assert [name.lower() for name in rows[0].keys()] == ["id", "objective"]
+    assert [row["objective"] for row in rows] == ["task {:02}".format(i) for i in range(23)]
+
+
+def test_sorting_and_filters_hold_across_pages(tasks):
+    rows = list(
+        iter_rows(
+            tasks.iter_tasks(
+                columns=("objective",),
+                status="open",
+                order_by="priority",
+                descending=True,
+                page_size=4,
+            )
+        )
+    )
+
+    assert [name.lower() for name in rows[0].keys()] == ["objective", "priority", "id"]
+    assert len(rows) == 12
+    # ties on priority keep id order, descending like the sort
+    assert [(row["priority"], row["id"]) for row in rows] == sorted(
+        ((row["priority"], row["id"]) for row in rows), reverse=True
+    )
+    assert len({row["id"] for row in rows}) == 12
+
+    assert not list(tasks.iter_tasks(author="bob"))
+
+
+def test_listings_resume_after_a_key(tasks):
+    first = next(tasks.iter_tasks(page_size=5))
+    rest = list(iter_rows(tasks.iter_tasks(page_size=5)))[5:]
+
+    again = list(
+        iter_rows(
+            keyset_pages(
+                tasks._conn,
+                "TASKS",
+                TASK_COLUMNS,
+                ("id", "objective", "status"),
+                {"project_id": tasks.project_id},
+                after=(first[-1]["id"],),
+            )
+        )
+    )
+    assert [tuple(row) for row in again] == [tuple(row) for row in rest]
+
+
+def test_unknown_columns_are_refused(tasks):
+    with pytest.raises(ValueError):
+        next(tasks.iter_tasks(columns=("id", "password")))
+    with pytest.raises(ValueError):
+        next(tasks.iter_tasks(order_by="id; DROP TABLE TASKS"))
@@ -0,0 +1,27 @@
+import core_utils
+from core_utils import hash_password, verify_password
+
+
+def test_keys_verify_and_cheaper_ones_need_rehashing():
+    key = hash_password("secret", "salt", n=2 ** 10)
+    assert verify_password("secret", "salt", key) == (True, True)
+    assert verify_password("wrong", "salt", key) == (False, True)
+    assert verify_password("secret", "salt", hash_password("secret", "salt"))[1] is False
+
+
+def test_largest_calibrated_cost_stays_within_maxmem(monkeypatch):
+    limits = []
+
+    def scrypt(password, salt, n, r, p, maxmem, dklen):
+        limits.append(maxmem)
+        return b"\0" * dklen
+
+    monkeypatch.setattr(core_utils, "scrypt", scrypt)
+    # a machine fast enough for calibration to reach its limit
+    monkeypatch.setattr(core_utils.time, "perf_counter", lambda: 0.0)
+
+    n = core_utils.calibrate_kdf()
+    hash_password("secret", "salt", n)
+    assert n == 2 ** 20
+    assert max(limits) <= 2 ** 31 - 1
+    assert limits[-1] >= 128 * n * core_utils.KDF_R
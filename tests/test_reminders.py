@@ -0,0 +1,109 @@
+import os
+import queue
+import time
+
+import pytest
+
+from daemons import ReminderDaemon, signal_daemon, wake_socket
+from database_utils import ProjectManager, TaskManager
+
+
+@pytest.fixture
+def tasks(open_db, tmp_path):
+    connection = open_db()
+    project = ProjectManager(connection, "alice").create_project(
+        "Reminders", "ops", "remind", "reminders", "01-01-2026", "31-12-2026"
+    )
+    manager = TaskManager(connection, "alice", project.key)
+    task = manager.create_task(
+        "mid", "remind me", "", "01-01-2026", "31-12-2026", "open", "new", "-1"
+    )
+    return manager, task.key, str(tmp_path / "crator.db")
+
+
+@pytest.fixture
+def daemon(tasks):
+    """
+        Running daemon of the tasks database, every fired reminder is put
+        on daemon.fired_ids
+    """
+    _, _, path = tasks
+    fired = queue.Queue()
+    daemon = ReminderDaemon(
+        path, callbacks={"log": lambda connection, reminder: fired.put(reminder["ID"])}
+    )
+    daemon.fired_ids = fired
+    daemon.start()
+    # the listener binds while the daemon starts up
+    deadline = time.time() + 5
+    while not os.path.exists(wake_socket(path)) and time.time() < deadline:
+        time.sleep(0.01)
+    yield daemon
+    daemon.stop(timeout=5)
+
+
+def take(fired, count, timeout=5):
+    return [fired.get(timeout=timeout) for _ in range(count)]
+
+
+def settle(daemon, fired, timeout=5):
+    """
+        Waits for the daemon to record fired reminders
+    """
+    deadline = time.time() + timeout
+    while daemon.fired < fired and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_reminders_fire_in_due_order(tasks, daemon):
+    manager, task_id, _ = tasks
+    now = time.time()
+    # scheduled after the daemon started, signalled rather than polled
+    late = manager.create_reminder(task_id, now + 0.6, "late", "log")
+    early = manager.create_reminder(task_id, now + 0.2, "early", "log")
+    middle = manager.create_reminder(task_id, now + 0.4, "middle", "log")
+
+    assert take(daemon.fired_ids, 3) == [early.key, middle.key, late.key]
+    settle(daemon, 3)
+    assert all(reminder.fired for reminder in manager.list_reminders(task_id))
+    assert daemon.fired_ids.empty()
+
+
+def test_rescheduled_reminders_fire_at_their_new_time(tasks, daemon):
+    manager, task_id, _ = tasks
+    now = time.time()
+    sooner = manager.create_reminder(task_id, now + 600, "moved sooner", "log")
+    later = manager.create_reminder(task_id, now + 0.2, "moved later", "log")
+
+    manager.reschedule_reminder(sooner.key, now + 0.3)
+    manager.reschedule_reminder(later.key, now + 600)
+    assert take(daemon.fired_ids, 1) == [sooner.key]
+    time.sleep(0.3)
+    assert daemon.fired_ids.empty()
+    pending = [reminder.key for reminder in manager.list_reminders(task_id) if not reminder.fired]
+    assert pending == [later.key]
+
+    with pytest.raises(ValueError):
+        manager.reschedule_reminder(sooner.key, now)
+
+
+def test_stop_ends_the_daemon_and_leaves_reminders_pending(tasks, daemon):
+    manager, task_id, path = tasks
+    manager.create_reminder(task_id, time.time() + 600, "after shutdown", "log")
+    thread = daemon._thread
+
+    started = time.time()
+    daemon.stop(timeout=5)
+    assert time.time() - started < 1
+    assert not thread.is_alive()
+    assert not os.path.exists(wake_socket(path))
+
+    # nobody listens any more
+    signal_daemon(manager._conn, 1)
+    reminder = manager.create_reminder(task_id, time.time(), "queued", "log")
+    assert daemon.fired_ids.empty()
+    assert not manager.list_reminders(task_id)[0].fired
+
+    # a later daemon picks it up
+    daemon.start()
+    assert take(daemon.fired_ids, 1) == [reminder.key]
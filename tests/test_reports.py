@@ -0,0 +1,74 @@
+import datetime
+import os
+
+import pytest
+
+import report_utils
+from database_utils import ProjectManager, TaskManager
+from summary_utils import data_version, recompute_summaries
+
+
+def new_project(connection):
+    project = ProjectManager(connection, "alice").create_project(
+        "Reports", "ops", "report", "reports", "01-01-2026", "31-12-2026"
+    )
+    TaskManager(connection, "alice", project.key).create_task(
+        "mid", "ship", "", "01-01-2026", "31-12-2026", "open", "new"
+    )
+    return project.key
+
+
+def test_repair_moves_version_on(open_db):
+    connection = open_db()
+    project_id = new_project(connection)
+    before = data_version(connection, project_id)
+    connection.execute("UPDATE PROJECT_SUMMARY SET TASKS = 7 WHERE PROJECT_ID = ?;", (project_id,))
+    connection.commit()
+
+    assert recompute_summaries(connection, project_id)
+    assert data_version(connection, project_id) > before
+    assert recompute_summaries(connection, project_id) == []
+
+
+def test_reports_are_rendered_again_the_next_day(open_db, tmp_path, monkeypatch):
+    connection = open_db()
+    project_id = new_project(connection)
+    out_dir = str(tmp_path / "reports")
+
+    assert report_utils.write_report(connection, project_id, out_dir)
+    assert report_utils.write_report(connection, project_id, out_dir) is None
+
+    class Tomorrow(datetime.date):
+        @classmethod
+        def today(cls):
+            return datetime.date.today() + datetime.timedelta(days=1)
+
+    monkeypatch.setattr(report_utils, "date", Tomorrow)
+    assert report_utils.write_report(connection, project_id, out_dir)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_keeps_written_reports_when_one_fails(open_db, tmp_path, monkeypatch, workers):
+    connection = open_db()
+    first, broken, last = new_project(connection), new_project(connection), new_project(connection)
+    out_dir = str(tmp_path / "reports")
+    render = report_utils.render_project
+
+    def render_project(connection, project_id):
+        if project_id == broken:
+            raise RuntimeError("renderer crashed")
+        return render(connection, project_id)
+
+    # forked workers inherit the patch
+    monkeypatch.setattr(report_utils, "render_project", render_project)
+    with pytest.raises(RuntimeError):
+        report_utils.write_reports(str(tmp_path / "crator.db"), out_dir, workers=workers)
+
+    assert sorted(report_utils.load_manifest(out_dir)) == [first, last]
+    assert not os.path.exists(report_utils.report_path(out_dir, broken) + ".tmp")
+
+    monkeypatch.setattr(report_utils, "render_project", render)
+    written, skipped = report_utils.write_reports(
+        str(tmp_path / "crator.db"), out_dir, workers=workers
+    )
+    assert (written, skipped) == ([broken], [first, last])
@@ -0,0 +1,80 @@
+import pytest
+
+from connection_utils import transaction
+from database_utils import ProjectManager, TaskManager
+from search_utils import rebuild_index, search
+
+
+@pytest.fixture
+def project(open_db):
+    connection = open_db()
+    project = ProjectManager(connection, "alice").create_project(
+        "Kickoff", "ops", "search", "launch planning", "01-01-2026", "31-12-2026"
+    )
+    tasks = TaskManager(connection, "alice", project.key)
+    for objective, description in (
+        ("venue", "book a venue for the launch launch launch"),
+        ("catering", "order food, the launch is on friday"),
+        ("slides", "prepare the deck"),
+    ):
+        tasks.create_task(
+            "mid", objective, description, "01-01-2026", "31-12-2026", "open", "new", "-1"
+        )
+    task_id = tasks.list_tasks()[-1].key
+    for i in range(40):
+        tasks.create_task_log(task_id, "open", "routine check {}".format(i))
+    tasks.create_task_log(task_id, "review", "deck reviewed after the kickoff")
+    return connection, project, tasks
+
+
+def test_hits_are_ranked_and_highlighted(project):
+    connection, _, _ = project
+
+    hits = search(connection, "launch", scope="tasks")
+
+    assert [hit.title for hit in hits] == ["venue", "catering"]
+    assert "[launch]" in hits[0].snippet
+    assert hits[0].rank < hits[1].rank
+    assert [hit.title for hit in search(connection, "lau*", scope="tasks")] == [
+        "venue", "catering"
+    ]
+
+
+def test_scopes_merge_on_their_own_scale(project):
+    connection, project, _ = project
+
+    hits = search(connection, "kickoff")
+
+    # the only project is the best of its scope, however its bm25 compares
+    # to the many task logs, the task carries the log's status info
+    assert [hit.scope for hit in hits] == ["projects", "tasks", "logs"]
+    assert hits[0].scope == "projects" and hits[0].key == project.key
+
+
+def test_index_follows_writes_and_rebuilds(project):
+    connection, project, tasks = project
+    venue = tasks.list_tasks()[0]
+
+    with transaction(connection):
+        connection.execute(
+            "UPDATE TASKS SET DESCRIPTION = 'book a hall' WHERE ID = ?;", (venue.key,)
+        )
+    assert [hit.title for hit in search(connection, "launch", scope="tasks")] == ["catering"]
+    tasks.remove_task(venue.key)
+    assert search(connection, "hall") == []
+
+    for table in ("PROJECTS_FTS", "TASKS_FTS", "TASKLOGS_FTS"):
+        connection.execute("INSERT INTO {0}({0}) VALUES ('delete-all');".format(table))
+    connection.commit()
+    assert search(connection, "kickoff") == []
+
+    rebuild_index(connection)
+    assert [hit.scope for hit in search(connection, "kickoff")] == ["projects", "tasks", "logs"]
+    assert search(connection, "routine", scope="logs", limit=5)[0].project_id == project.key
+
+
+def test_unknown_scopes_are_refused(project):
+    connection, _, _ = project
+    with pytest.raises(ValueError):
+        search(connection, "launch", scope="files")
+    assert search(connection, "  ") == []
@@ -0,0 +1,111 @@
+import http.client
+import json
+import sqlite3
+import threading
+
+import pytest
+
+import net_utils
+from database_utils import AccountManager
+from net_utils import ApiServer, DataVersions
+
+MAIL = "alice@example.com"
+PASSWORD = "correct horse"
+
+
+@pytest.fixture
+def accounts(open_db):
+    connection = open_db()
+    AccountManager(connection).create_account(MAIL, "Alice", PASSWORD)
+    return connection
+
+
+@pytest.fixture
+def server(accounts, tmp_path):
+    server = ApiServer(("127.0.0.1", 0), str(tmp_path / "crator.db"), connections=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def call(server, method, url, body=None, session=None):
+    connection = http.client.HTTPConnection(*server.server_address[:2])
+    headers = {}
+    if session is not None:
+        headers = {"X-Session-Id": session["session-id"], "X-Session-Key": session["session-key"]}
+    connection.request(method, url, body and json.dumps(body), headers)
+    response = connection.getresponse()
+    data = response.read()
+    connection.close()
+    return response.status, json.loads(data) if data else None
+
+
+def test_session_keys_are_random_and_revoked_on_sign_out(accounts):
+    first, second = AccountManager(accounts), AccountManager(accounts)
+    first.authenticate(MAIL, PASSWORD)
+    second.authenticate(MAIL, PASSWORD)
+    one, two = first.open_session(), second.open_session()
+    assert one["session-key"] != two["session-key"]
+
+    assert AccountManager(accounts).resume_session(MAIL, one["session-key"])
+    assert first.close_session(MAIL, one["session-key"])
+    assert AccountManager(accounts).resume_session(MAIL, one["session-key"]) is None
+    assert AccountManager(accounts).resume_session(MAIL, two["session-key"])
+
+
+def test_sessions_expire_and_end_with_the_password(accounts):
+    manager = AccountManager(accounts)
+    manager.authenticate(MAIL, PASSWORD)
+    expired = manager.open_session(ttl=-1)
+    live = manager.open_session()
+    assert manager.resume_session(MAIL, expired["session-key"]) is None
+
+    manager.change_account("Alice", "new password")
+    assert AccountManager(accounts).resume_session(MAIL, live["session-key"]) is None
+
+
+def test_api_requires_an_open_session(server):
+    status, _ = call(server, "POST", "/session", {"mail": MAIL, "password": "wrong"})
+    assert status == 401
+    status, session = call(server, "POST", "/session", {"mail": MAIL, "password": PASSWORD})
+    assert status == 200
+
+    assert call(server, "GET", "/projects", session=session)[0] == 200
+    forged = dict(session, **{"session-key": "0" * 43})
+    assert call(server, "GET", "/projects", session=forged)[0] == 401
+
+    assert call(server, "DELETE", "/session", session=session)[0] == 204
+    assert call(server, "GET", "/projects", session=session)[0] == 401
+
+
+def test_reads_racing_a_commit_are_not_cached(accounts, open_db):
+    versions = DataVersions(open_db())
+    generation = versions.check()
+    versions.remember(versions.projects, 1, 5, generation)
+    assert versions.projects == {1: 5}
+
+    # a read made at generation, then another connection commits before it is stored
+    AccountManager(accounts).create_account("bob@example.com", "Bob", PASSWORD)
+    assert versions.check() != generation
+    versions.remember(versions.sessions, ("bob@example.com", "key"), 1.0, generation)
+    versions.remember(versions.projects, 1, 5, generation)
+    assert versions.sessions == {} and versions.projects == {}
+
+
+def test_unexpected_errors_are_json_500(server, monkeypatch):
+    def broken(connection, query):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    routes = [
+        (pattern, broken if handler is net_utils.list_projects else handler)
+        for pattern, handler in net_utils.ROUTES
+    ]
+    monkeypatch.setattr(net_utils, "ROUTES", routes)
+    status, session = call(server, "POST", "/session", {"mail": MAIL, "password": PASSWORD})
+    assert status == 200
+    assert call(server, "GET", "/projects", session=session) == (
+        500,
+        {"error": "Internal server error"},
+    )
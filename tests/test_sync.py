@@ -0,0 +1,138 @@
+import time
+
+import pytest
+
+from database_utils import ProjectManager, TaskManager
+from sync_utils import SyncEngine, prepare_collection
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def nodes(open_db):
+    collection = mongomock.MongoClient().db.changes
+    prepare_collection(collection)
+    a, b = open_db("a.db"), open_db("b.db")
+    return (a, SyncEngine(a, collection)), (b, SyncEngine(b, collection))
+
+
+def projects(connection):
+    return sorted(
+        connection.execute("SELECT NAME, CREATED_BY FROM PROJECTS;").fetchall()
+    )
+
+
+def tasks(connection):
+    return sorted(
+        connection.execute(
+            """SELECT p.NAME, t.OBJECTIVE, t.DEPENDENT_ON, count(l.ID)
+            FROM TASKS t JOIN PROJECTS p ON p.ID = t.PROJECT_ID
+            LEFT JOIN TASKLOGS l ON l.TASK_ID = t.ID GROUP BY t.ID;"""
+        ).fetchall()
+    )
+
+
+def new_project(connection, author, name):
+    return ProjectManager(connection, author).create_project(
+        name, "ops", "sync", "two nodes", "01-01-2026", "31-12-2026"
+    )
+
+
+def new_task(connection, author, project_id, objective, dependent_on="-1"):
+    return TaskManager(connection, author, project_id).create_task(
+        "mid", objective, "", "01-01-2026", "31-12-2026", "open", "new", dependent_on
+    )
+
+
+def test_rows_created_on_both_nodes_are_kept(nodes):
+    (a, sync_a), (b, sync_b) = nodes
+    alice = new_project(a, "alice", "Alice project")
+    first = new_task(a, "alice", alice.key, "design")
+    second = new_task(a, "alice", alice.key, "build", str(first.key))
+    TaskManager(a, "alice", alice.key).create_task_log(second.key, "blocked", "waiting")
+    bob = new_project(b, "bob", "Bob project")
+    new_task(b, "bob", bob.key, "review")
+
+    for engine in (sync_a, sync_b, sync_a):
+        report = engine.sync()
+        assert report.conflicts == 0 and not report.rejected
+
+    expected = [("Alice project", "alice"), ("Bob project", "bob")]
+    assert projects(a) == projects(b) == expected
+
+    # references follow the rows whatever their local ids
+    design_on_b = b.execute("SELECT ID FROM TASKS WHERE OBJECTIVE = 'design';").fetchone()[0]
+    assert tasks(b) == [
+        ("Alice project", "build", str(design_on_b), 1),
+        ("Alice project", "design", "-1", 0),
+        ("Bob project", "review", "-1", 0),
+    ]
+    assert b.execute(
+        "SELECT count(*) FROM TASK_DEPENDENCIES WHERE DEPENDS_ON = ?;", (design_on_b,)
+    ).fetchone()[0] == 1
+    assert [row[1:] for row in tasks(a)] == [
+        ("build", str(first.key), 1),
+        ("design", "-1", 0),
+        ("review", "-1", 0),
+    ]
+
+
+def test_edits_of_one_row_resolve_last_writer_wins(nodes):
+    (a, sync_a), (b, sync_b) = nodes
+    alice = new_project(a, "alice", "Alice project")
+    sync_a.sync()
+    sync_b.sync()
+    on_b = b.execute("SELECT ID FROM PROJECTS WHERE NAME = 'Alice project';").fetchone()[0]
+
+    ProjectManager(a, "alice").edit_project(alice.key, description="edited on a")
+    # change times have millisecond resolution, ties go to the larger node id
+    time.sleep(0.01)
+    ProjectManager(b, "bob").edit_project(on_b, description="edited on b")
+    sync_a.sync()
+    report = sync_b.sync()
+    sync_a.sync()
+
+    assert report.conflicts == 1
+    for connection in (a, b):
+        assert connection.execute("SELECT NAME, DESCRIPTION FROM PROJECTS;").fetchall() == [
+            ("Alice project", "edited on b")
+        ]
+
+
+def test_deletes_reach_rows_pulled_under_other_ids(nodes):
+    (a, sync_a), (b, sync_b) = nodes
+    new_project(b, "bob", "Bob project")
+    alice = new_project(a, "alice", "Alice project")
+    for engine in (sync_a, sync_b, sync_a):
+        engine.sync()
+
+    ProjectManager(a, "alice").remove_project(alice.key)
+    sync_a.sync()
+    sync_b.sync()
+
+    assert projects(a) == projects(b) == [("Bob project", "bob")]
+
+
+def test_rejected_changes_are_retried(nodes, open_db):
+    (a, sync_a), (b, sync_b) = nodes
+    c = open_db("c.db")
+    sync_c = SyncEngine(c, sync_a.collection)
+    new_project(a, "alice", "Alice project")
+    sync_a.sync()
+    sync_c.sync()
+    on_c = c.execute("SELECT ID FROM PROJECTS;").fetchone()[0]
+    new_task(c, "carol", on_c, "design")
+    sync_c.sync()
+    # a clock running behind puts the task before its project
+    sync_a.collection.update_many({"origin": sync_c.node}, {"$inc": {"ts": -3600}})
+
+    report = sync_b.sync()
+    assert len(report.rejected) == 1
+    assert tasks(b) == []
+
+    report = sync_b.sync()
+    assert not report.rejected
+    assert tasks(b) == [("Alice project", "design", "-1", 0)]
+    assert tasks(a) == []
+    sync_a.sync()
+    assert tasks(a) == [("Alice project", "design", "-1", 0)]
@@ -0,0 +1,53 @@
+import pytest
+
+from core_utils import parse_tags
+from database_utils import ProjectManager
+
+
+@pytest.fixture
+def projects(open_db):
+    manager = ProjectManager(open_db(), "alice")
+    for name, tags in (
+        ("Backend", "infra, python"),
+        ("Frontend", "web,Python"),
+        ("Pipeline", "infra,data"),
+        ("Plain", "pythonic"),
+    ):
+        manager.create_project(name, "ops", tags, name, "01-01-2026", "31-12-2026")
+    return manager
+
+
+def names(projects):
+    return [project.name for project in projects]
+
+
+def test_tags_are_parsed_once_and_lowercased():
+    assert parse_tags(" Infra, python,,INFRA ,web") == ["infra", "python", "web"]
+    assert parse_tags(None) == []
+
+
+def test_all_and_any_filters(projects):
+    assert names(projects.projects_with_tags("python")) == ["Backend", "Frontend"]
+    assert names(projects.projects_with_tags("infra, python")) == ["Backend"]
+    assert names(projects.projects_with_tags(["web", "data"], match="any")) == [
+        "Frontend", "Pipeline"
+    ]
+    # whole tags only, no LIKE false positives
+    assert names(projects.projects_with_tags("pyth")) == []
+    assert projects.projects_with_tags("") == []
+    with pytest.raises(ValueError):
+        projects.projects_with_tags("python", match="some")
+
+
+def test_counts_follow_edits_and_removals(projects):
+    assert projects.tag_counts() == [
+        ("infra", 2), ("python", 2), ("data", 1), ("pythonic", 1), ("web", 1)
+    ]
+
+    backend = projects.projects_with_tags("python")[0]
+    projects.edit_project(backend.key, tags="web")
+    frontend = projects.projects_with_tags("web", match="any")[-1]
+    projects.remove_project(frontend.key)
+
+    assert projects.tag_counts() == [("data", 1), ("infra", 1), ("pythonic", 1), ("web", 1)]
+    assert names(projects.projects_with_tags("web")) == ["Backend"]
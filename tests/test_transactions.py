@@ -0,0 +1,105 @@
+import pytest
+
+from connection_utils import transaction
+from database_utils import Externals, Internals, ProjectManager, TaskManager
+
+
+def new_project(connection, name):
+    return ProjectManager(connection, "alice").create_project(
+        name, "ops", "uow", "cascades", "01-01-2026", "31-12-2026"
+    )
+
+
+def new_task(manager, objective, dependent_on="-1"):
+    return manager.create_task(
+        "mid", objective, "", "01-01-2026", "31-12-2026", "open", "new", dependent_on
+    )
+
+
+def counts(connection, project_id):
+    return {
+        table: connection.execute(query, (project_id,)).fetchone()[0]
+        for table, query in (
+            ("TASKS", "SELECT count(*) FROM TASKS WHERE PROJECT_ID = ?;"),
+            (
+                "TASKLOGS",
+                """SELECT count(*) FROM TASKLOGS WHERE TASK_ID IN
+                (SELECT ID FROM TASKS WHERE PROJECT_ID = ?);""",
+            ),
+            ("INTERNALS", "SELECT count(*) FROM INTERNALS WHERE PROJECT_ID = ?;"),
+            ("EXTERNALS", "SELECT count(*) FROM EXTERNALS WHERE PROJECT_ID = ?;"),
+        )
+    }
+
+
+def populate(connection, name):
+    project = new_project(connection, name)
+    tasks = TaskManager(connection, "alice", project.key)
+    first = new_task(tasks, "design")
+    second = new_task(tasks, "build", str(first.key))
+    tasks.create_task_log(second.key, "blocked", "waiting on design")
+    Internals(project.key, "alice", connection).create_internal(
+        "Bob", "bob@example.com", 5550001, second.key
+    )
+    Externals(connection, "alice", project.key).create_external(
+        "Eve", "eve@example.com", 5550002
+    )
+    return project, tasks, first, second
+
+
+def test_removing_a_project_cascades_to_its_rows_only(open_db):
+    connection = open_db()
+    doomed, _, _, _ = populate(connection, "doomed")
+    kept, _, _, _ = populate(connection, "kept")
+    full = {"TASKS": 2, "TASKLOGS": 1, "INTERNALS": 1, "EXTERNALS": 1}
+    assert counts(connection, doomed.key) == full
+
+    ProjectManager(connection, "alice").remove_project(doomed.key)
+
+    assert counts(connection, doomed.key) == dict.fromkeys(full, 0)
+    assert counts(connection, kept.key) == full
+    assert connection.execute("SELECT count(*) FROM TASK_DEPENDENCIES;").fetchone()[0] == 1
+    assert connection.execute("PRAGMA foreign_key_check;").fetchall() == []
+
+
+def test_removing_a_task_keeps_its_internals(open_db):
+    connection = open_db()
+    project, tasks, first, second = populate(connection, "project")
+
+    tasks.remove_task(second.key)
+
+    assert counts(connection, project.key) == {
+        "TASKS": 1, "TASKLOGS": 0, "INTERNALS": 1, "EXTERNALS": 1
+    }
+    assert connection.execute("SELECT TASK_ID FROM INTERNALS;").fetchall() == [(None,)]
+    assert connection.execute("SELECT count(*) FROM TASK_DEPENDENCIES;").fetchone()[0] == 0
+
+
+def test_failed_units_of_work_leave_nothing_behind(open_db):
+    connection = open_db()
+    project = new_project(connection, "project")
+    tasks = TaskManager(connection, "alice", project.key)
+
+    with pytest.raises(RuntimeError):
+        with transaction(connection):
+            new_task(tasks, "written then undone")
+            raise RuntimeError("failed halfway")
+    assert not connection.in_transaction
+    assert counts(connection, project.key)["TASKS"] == 0
+
+    # a failed nested block only undoes its own statements
+    with transaction(connection):
+        kept = new_task(tasks, "kept")
+        with pytest.raises(ValueError):
+            with transaction(connection):
+                tasks.create_task_log(kept.key, "done", "undone")
+                raise ValueError("inner failure")
+        tasks.create_task_log(kept.key, "review", "kept")
+    assert connection.execute("SELECT STATUS FROM TASKLOGS;").fetchall() == [("review",)]
+
+
+def test_rows_of_unknown_parents_are_refused(open_db):
+    connection = open_db()
+    with pytest.raises(ValueError):
+        new_task(TaskManager(connection, "alice", 99), "orphan")
+    assert connection.execute("SELECT count(*) FROM TASKS;").fetchone()[0] == 0